@@ -1,5 +1,6 @@
 #include <tfhe/tfhe.h>
 #include <tfhe/tfhe_io.h>
+#include "container.h"
 #include <stdio.h>
 #include <iostream>
 #include <iomanip>
@@ -99,7 +100,7 @@ int main()
 
     read.close();
 
-    // Create 10 ciphertext blocks of 32 bits each
+    // Create the bit size block and one 32-bit block per limb
     LweSample* ciphertextbit = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
     LweSample* ciphertext1 = new_gate_bootstrapping_ciphertext_array(32, params);
     LweSample* ciphertext2 = new_gate_bootstrapping_ciphertext_array(32, params);
@@ -109,9 +110,7 @@ int main()
     LweSample* ciphertext6 = new_gate_bootstrapping_ciphertext_array(32, params);
     LweSample* ciphertext7 = new_gate_bootstrapping_ciphertext_array(32, params);
     LweSample* ciphertext8 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext9 = new_gate_bootstrapping_ciphertext_array(32, params);
 
-   int32_t plaintext3 = 0;
    
     for (int i=0; i<32; i++) { // line 0 negtivity
 	bootsSymEncrypt(&ciphertextnegative[i], (negative>>i)&1, nbitkey);
@@ -144,9 +143,6 @@ int main()
     for (int i=0; i<32; i++) { // line 9 value8
 	bootsSymEncrypt(&ciphertext8[i], (chunk8>>i)&1, key);
     }
-    for (int i=0; i<32; i++) { // line 10 carry
-	bootsSymEncrypt(&ciphertext9[i], (plaintext3>>i)&1, key);
-    }
    
     // export the secret key to file for later use
     FILE* secret_key = fopen("secret.key","wb");
@@ -163,31 +159,24 @@ int main()
     export_tfheGateBootstrappingSecretKeySet_toFile(nbit_key, nbitkey);
     fclose(nbit_key);
 
-    // export the 64 ciphertexts to a file (for the cloud)
+    // export negativity, bit size and one limb per 32 bits of the value as the
+    // sections of a container (for the cloud), which takes the other limbs and
+    // the carry as zeros
     FILE* cloud_data = fopen("cloud.data","wb");
-    for (int i=0; i<32; i++) // negative
-    export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextnegative[i], nbitparams);
-    for (int i = 0; i<32; i++) // bit
-    export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextbit[i], nbitparams);
-    for (int i=0; i<32; i++) // 1
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext1[i], params);
-    for (int i=0; i<32; i++) // 2
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext2[i], params);
-    for (int i = 0; i<32; i++) // 3
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext3[i], params);
-    for (int i = 0; i<32; i++) // 4
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext4[i], params);
-    for (int i = 0; i<32; i++) // 5
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext5[i], params);
-    for (int i = 0; i<32; i++) // 6
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext6[i], params);
-    for (int i = 0; i<32; i++) // 7
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext7[i], params);
-    for (int i = 0; i<32; i++) // 8
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext8[i], params);
-    for (int i = 0; i<32; i++) // 9
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext9[i], params);
+    Container container;
+    container_begin(&container, cloud_data);
+    container_write(&container, SECTION_SIGN, 0, ciphertextnegative, 32, nbitparams);
+    container_write(&container, SECTION_WIDTH, 0, ciphertextbit, 32, nbitparams);
+    container_write(&container, SECTION_LIMB, 0, ciphertext1, 32, params);
+    container_write(&container, SECTION_LIMB, 1, ciphertext2, 32, params);
+    container_write(&container, SECTION_LIMB, 2, ciphertext3, 32, params);
+    container_write(&container, SECTION_LIMB, 3, ciphertext4, 32, params);
+    container_write(&container, SECTION_LIMB, 4, ciphertext5, 32, params);
+    container_write(&container, SECTION_LIMB, 5, ciphertext6, 32, params);
+    container_write(&container, SECTION_LIMB, 6, ciphertext7, 32, params);
+    container_write(&container, SECTION_LIMB, 7, ciphertext8, 32, params);
 	
+    container_end(&container);
     fclose(cloud_data);
 
     // clean up all pointers
@@ -201,7 +190,6 @@ int main()
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
     
     delete_gate_bootstrapping_secret_keyset(key);
     delete_gate_bootstrapping_secret_keyset(nbitkey);
@@ -233,13 +221,7 @@ int main()
     LweSample* ciphertext2 = new_gate_bootstrapping_ciphertext_array(32, params);
     LweSample* ciphertext3 = new_gate_bootstrapping_ciphertext_array(32, params);
     LweSample* ciphertext4 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext5 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext6 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext7 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext8 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext9 = new_gate_bootstrapping_ciphertext_array(32, params);
     
-   int32_t plaintext3 = 0;
    
    for (int i=0; i<32; i++) {
 	bootsSymEncrypt(&ciphertextnegative[i], (negative>>i)&1, nbitkey);
@@ -259,21 +241,6 @@ int main()
     for (int i=0; i<32; i++) {
 	bootsSymEncrypt(&ciphertext4[i], (chunk4>>i)&1, key);
     }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext5[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext6[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext7[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext8[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext9[i], (plaintext3>>i)&1, key);
-    }
    
     // export the secret key to file for later use
     FILE* secret_key = fopen("secret.key","wb");
@@ -290,30 +257,19 @@ int main()
     export_tfheGateBootstrappingSecretKeySet_toFile(nbit_key, nbitkey);
     fclose(nbit_key);
 
-    // export the 64 ciphertexts to a file (for the cloud)
+    // export negativity, bit size and one limb per 32 bits of the value as the
+    // sections of a container (for the cloud), which takes the other limbs and
+    // the carry as zeros
     FILE* cloud_data = fopen("cloud.data","wb");
-    for (int i=0; i<32; i++)
-    export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextnegative[i], nbitparams);
-    for (int i = 0; i<32; i++)
-    export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextbit[i], nbitparams);
-    for (int i=0; i<32; i++)
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext1[i], params);
-    for (int i=0; i<32; i++)
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext2[i], params);
-    for (int i = 0; i<32; i++)
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext3[i], params);
-    for (int i = 0; i<32; i++)
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext4[i], params);
-    for (int i = 0; i<32; i++)
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext5[i], params);
-    for (int i = 0; i<32; i++) // 6
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext6[i], params);
-    for (int i = 0; i<32; i++) // 7
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext7[i], params);
-    for (int i = 0; i<32; i++) // 8
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext8[i], params);
-    for (int i = 0; i<32; i++) // 9
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext9[i], params);
+    Container container;
+    container_begin(&container, cloud_data);
+    container_write(&container, SECTION_SIGN, 0, ciphertextnegative, 32, nbitparams);
+    container_write(&container, SECTION_WIDTH, 0, ciphertextbit, 32, nbitparams);
+    container_write(&container, SECTION_LIMB, 0, ciphertext1, 32, params);
+    container_write(&container, SECTION_LIMB, 1, ciphertext2, 32, params);
+    container_write(&container, SECTION_LIMB, 2, ciphertext3, 32, params);
+    container_write(&container, SECTION_LIMB, 3, ciphertext4, 32, params);
+    container_end(&container);
     fclose(cloud_data);
 
     // clean up all pointers
@@ -323,11 +279,6 @@ int main()
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
     
     delete_gate_bootstrapping_secret_keyset(key);
     delete_gate_bootstrapping_secret_keyset(nbitkey);
@@ -352,15 +303,7 @@ int main()
     LweSample* ciphertextbit = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
     LweSample* ciphertext1 = new_gate_bootstrapping_ciphertext_array(32, params);
     LweSample* ciphertext2 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext3 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext4 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext5 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext6 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext7 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext8 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext9 = new_gate_bootstrapping_ciphertext_array(32, params);
     
-   int32_t plaintext3 = 0;
    for (int i=0; i<32; i++) {
 	bootsSymEncrypt(&ciphertextnegative[i], (negative>>i)&1, nbitkey);
     }
@@ -373,27 +316,6 @@ int main()
     for (int i=0; i<32; i++) {
 	bootsSymEncrypt(&ciphertext2[i], (chunk2>>i)&1, key);
     }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext3[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext4[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext5[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext6[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext7[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext8[i], (plaintext3>>i)&1, key);
-    }
-    for (int i=0; i<32; i++) {
-	bootsSymEncrypt(&ciphertext9[i], (plaintext3>>i)&1, key);
-    }
     
    
     // export the secret key to file for later use
@@ -411,31 +333,18 @@ int main()
     export_tfheGateBootstrappingSecretKeySet_toFile(nbit_key, nbitkey);
     fclose(nbit_key);
 
-    // export the 64 ciphertexts to a file (for the cloud)
+    // export negativity, bit size and one limb per 32 bits of the value as the
+    // sections of a container (for the cloud), which takes the other limbs and
+    // the carry as zeros
     FILE* cloud_data = fopen("cloud.data","wb");
-    for (int i=0; i<32; i++)
-    export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextnegative[i], nbitparams);
-    for (int i = 0; i<32; i++)
-    export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextbit[i], nbitparams);
-    for (int i=0; i<32; i++)  // 1
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext1[i], params);
-    for (int i=0; i<32; i++)  // 2
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext2[i], params);
-    for (int i = 0; i<32; i++) // 3
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext3[i], params);
-    for (int i = 0; i<32; i++) // 4
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext4[i], params);
-    for (int i = 0; i<32; i++) // 5
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext5[i], params);
-    for (int i = 0; i<32; i++) // 6
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext6[i], params);
-    for (int i = 0; i<32; i++) // 7
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext7[i], params);
-    for (int i = 0; i<32; i++) // 8
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext8[i], params);
-    for (int i = 0; i<32; i++) // 9
-	export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext9[i], params);
+    Container container;
+    container_begin(&container, cloud_data);
+    container_write(&container, SECTION_SIGN, 0, ciphertextnegative, 32, nbitparams);
+    container_write(&container, SECTION_WIDTH, 0, ciphertextbit, 32, nbitparams);
+    container_write(&container, SECTION_LIMB, 0, ciphertext1, 32, params);
+    container_write(&container, SECTION_LIMB, 1, ciphertext2, 32, params);
     
+    container_end(&container);
     fclose(cloud_data);
 
     // clean up all pointers
@@ -443,13 +352,6 @@ int main()
     delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit);
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
     delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-    delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
     
     delete_gate_bootstrapping_secret_keyset(key);
     delete_gate_bootstrapping_secret_keyset(nbitkey);
@@ -470,16 +372,7 @@ int main()
 	 
     LweSample* ciphertextbit = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
     LweSample* ciphertext1 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext2 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext3 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext4 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext5 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext6 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext7 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext8 = new_gate_bootstrapping_ciphertext_array(32, params);
-    LweSample* ciphertext9 = new_gate_bootstrapping_ciphertext_array(32, params);
 	 
-	int32_t plaintext3 = 0;
 	
 	for (int i=0; i<32; i++) {
 		bootsSymEncrypt(&ciphertextnegative[i], (negative>>i)&1, nbitkey);
@@ -490,30 +383,6 @@ int main()
 	for (int i=0; i<32; i++) {
 		bootsSymEncrypt(&ciphertext1[i], (chunk1>>i)&1, key);
 	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext2[i], (plaintext3>>i)&1, key);
-	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext3[i], (plaintext3>>i)&1, key);
-	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext4[i], (plaintext3>>i)&1, key);
-	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext5[i], (plaintext3>>i)&1, key);
-	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext6[i], (plaintext3>>i)&1, key);
-	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext7[i], (plaintext3>>i)&1, key);
-	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext8[i], (plaintext3>>i)&1, key);
-	}
-	for (int i=0; i<32; i++) {
-		bootsSymEncrypt(&ciphertext9[i], (plaintext3>>i)&1, key);
-	}
 		
 	    // export the secret key to file for later use
 	   FILE* secret_key = fopen("secret.key","wb");
@@ -530,30 +399,16 @@ int main()
        export_tfheGateBootstrappingSecretKeySet_toFile(nbit_key, nbitkey);
        fclose(nbit_key);
 
-	   // export the 64 ciphertexts to a file (for the cloud)
+	   // export negativity, bit size and one limb per 32 bits of the value as the
+	   // sections of a container (for the cloud), which takes the other limbs and
+	   // the carry as zeros
 	   FILE* cloud_data = fopen("cloud.data","wb"); // TODO change to wb
-	   for (int i=0; i<32; i++)
-        export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextnegative[i], nbitparams);
-	   for (int i=0; i<32; i++)
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertextbit[i], nbitparams);
-	   for (int i = 0; i<32; i++) // 1
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext1[i], params);
-	   for (int i = 0; i<32; i++) // 2
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext2[i], params);
-	   for (int i = 0; i<32; i++) // 3
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext3[i], params);
-	   for (int i = 0; i<32; i++) // 4
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext4[i], params);
-	   for (int i = 0; i<32; i++) // 5
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext5[i], params);
-	   for (int i = 0; i<32; i++) // 6
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext6[i], params);
-	   for (int i = 0; i<32; i++) // 7
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext7[i], params);
-	   for (int i = 0; i<32; i++) // 8
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext8[i], params);
-	   for (int i = 0; i<32; i++) // 9
-		export_gate_bootstrapping_ciphertext_toFile(cloud_data, &ciphertext9[i], params);
+	   Container container;
+	   container_begin(&container, cloud_data);
+	   container_write(&container, SECTION_SIGN, 0, ciphertextnegative, 32, nbitparams);
+	   container_write(&container, SECTION_WIDTH, 0, ciphertextbit, 32, nbitparams);
+	   container_write(&container, SECTION_LIMB, 0, ciphertext1, 32, params);
+	   container_end(&container);
 	   fclose(cloud_data);
 
 	   // clean up all pointers
@@ -561,14 +416,6 @@ int main()
 	   delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit);
 
 	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-	   delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
 
 	   delete_gate_bootstrapping_secret_keyset(key);
 	   delete_gate_bootstrapping_secret_keyset(nbitkey);
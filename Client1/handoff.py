@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# In-memory handoff of per-operation files to the TFHE binaries.
+#
+# ./cloud, ./alice and ./verif read and write fixed file names (cloud.data,
+# answer.data, operator.txt) in their working directory. With IN_MEMORY set,
+# those per-operation files live in a scratch directory on tmpfs and the
+# binaries are run there. Long-lived files such as the keys are symlinked in
+# from the node directory, so ciphertexts never touch persistent storage.
+#
+# The scratch directory is named after the node directory, so partially
+# received files survive a restart of the node scripts and can be resumed.
+import os
+import shutil
+import subprocess
+
+IN_MEMORY = True
+TMPFS_DIRS = ['/dev/shm', '/run/shm']
+
+# Directory the per-operation files are read from and written to
+work_dir = '.'
+
+
+def scratch_root():
+    for root in TMPFS_DIRS:
+        if os.path.isdir(root) and os.access(root, os.W_OK):
+            return root
+    return None
+
+
+def setup(links):
+    """Create the scratch directory and link the persistent files in links
+    (keys, values.txt, ...) into it. Falls back to the node directory when
+    IN_MEMORY is off or no tmpfs is mounted."""
+    global work_dir
+    root = scratch_root()
+    if not IN_MEMORY or root is None:
+        work_dir = '.'
+        return work_dir
+
+    work_dir = os.path.join(root, 'ie-ache-' + os.path.basename(os.getcwd()))
+    os.makedirs(work_dir, mode=0o700, exist_ok=True)
+    try:
+        # Private to this user even if an earlier run made it otherwise,
+        # transfer.py only hands over files from private scratch directories
+        os.chmod(work_dir, 0o700)
+    except PermissionError:
+        print("Scratch directory", work_dir, "belongs to another user, using the node directory")
+        work_dir = '.'
+        return work_dir
+    for name in links:
+        link = os.path.join(work_dir, name)
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.abspath(name), link)
+    return work_dir
+
+
+def path(name):
+    return os.path.join(work_dir, name)
+
+
+def run(binary):
+    # Run the binary inside the scratch directory so it finds its inputs there
+    return subprocess.call(os.path.abspath(binary), cwd=work_dir)
+
+
+def remove(*names):
+    for name in names:
+        try:
+            os.remove(path(name))
+        except FileNotFoundError:
+            pass
+
+
+def copy(src, dst):
+    shutil.copyfile(path(src), path(dst))
+
+
+def link(src, dst):
+    """Make the file dst another name of src (both full paths), copying it
+    only where a hard link cannot be made. Either name may be replaced or
+    removed later, but neither file may be written in place."""
+    temporary = dst + '.link'
+    if os.path.lexists(temporary):
+        os.remove(temporary)
+    try:
+        os.link(src, temporary)
+    except OSError:
+        shutil.copyfile(src, temporary)
+    os.replace(temporary, dst)
@@ -0,0 +1,123 @@
+// Container for TFHE ciphertexts: cloud.data, the operands and results on the
+// Cloud and answer.data.
+//
+// A container starts with a header of fixed size: the magic "TFHC", the format
+// version, the number of sections, the size of the whole container and an
+// index with the kind, number, offset and length of every section. Offsets
+// count from the start of the container, so containers put one after another
+// are read one after another (container_next()). A reader looks its sections
+// up in the index and seeks straight to them, it reads only the ones it needs.
+// The header is written as x86 lays it out, little-endian (see container.py).
+//
+// Sections of an operand or result: SECTION_SIGN (negativity) and
+// SECTION_WIDTH (bit size), 32 ciphertexts each under the nbit key, then
+// SECTION_LIMB 0, 1, ... with 32 bits of the value each, least significant
+// first, and SECTION_CARRY if there is one. Limbs beyond the bit size and a
+// missing carry are zeros.
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+
+#define CONTAINER_MAGIC "TFHC"
+#define CONTAINER_VERSION 1
+// Sign, width, eight limbs and the carry
+#define CONTAINER_SECTIONS 11
+
+enum SectionKind { SECTION_SIGN = 1, SECTION_WIDTH = 2, SECTION_LIMB = 3, SECTION_CARRY = 4 };
+
+struct Section {
+	uint32_t kind;
+	uint32_t number;
+	uint64_t offset;
+	uint64_t length;
+};
+
+struct ContainerHeader {
+	char magic[4];
+	uint32_t version;
+	uint32_t count;
+	uint32_t reserved;
+	uint64_t size;
+	Section index[CONTAINER_SECTIONS];
+};
+
+struct Container {
+	FILE* file;
+	long start;
+	ContainerHeader header;
+};
+
+// Starts a container at the current position of file. Sections follow with
+// container_write(), container_end() puts the index in place.
+void container_begin(Container* c, FILE* file)
+{
+	c->file = file;
+	c->start = ftell(file);
+	memset(&c->header, 0, sizeof(c->header));
+	memcpy(c->header.magic, CONTAINER_MAGIC, 4);
+	c->header.version = CONTAINER_VERSION;
+	fwrite(&c->header, sizeof(c->header), 1, file);
+}
+
+void container_write(Container* c, uint32_t kind, uint32_t number, const LweSample* samples, int n, const TFheGateBootstrappingParameterSet* params)
+{
+	Section* section = &c->header.index[c->header.count++];
+	section->kind = kind;
+	section->number = number;
+	section->offset = ftell(c->file) - c->start;
+	for (int i = 0; i < n; i++)
+		export_gate_bootstrapping_ciphertext_toFile(c->file, &samples[i], params);
+	section->length = ftell(c->file) - c->start - section->offset;
+}
+
+void container_end(Container* c)
+{
+	long end = ftell(c->file);
+	c->header.size = end - c->start;
+	fseek(c->file, c->start, SEEK_SET);
+	fwrite(&c->header, sizeof(c->header), 1, c->file);
+	fseek(c->file, end, SEEK_SET);
+}
+
+// Reads the header of the container at the current position of file.
+// Returns -1 if there is none.
+int container_open(Container* c, FILE* file)
+{
+	c->file = file;
+	c->start = ftell(file);
+	if (fread(&c->header, sizeof(c->header), 1, file) != 1
+		|| memcmp(c->header.magic, CONTAINER_MAGIC, 4) != 0
+		|| c->header.version != CONTAINER_VERSION
+		|| c->header.count > CONTAINER_SECTIONS) {
+		printf("Not a ciphertext container\n");
+		return -1;
+	}
+	return 0;
+}
+
+const Section* container_find(const Container* c, uint32_t kind, uint32_t number)
+{
+	for (uint32_t s = 0; s < c->header.count; s++)
+		if (c->header.index[s].kind == kind && c->header.index[s].number == number)
+			return &c->header.index[s];
+	return NULL;
+}
+
+// Reads n ciphertexts of a section into samples. Returns -1 if the container
+// does not have the section.
+int container_read(Container* c, uint32_t kind, uint32_t number, LweSample* samples, int n, const TFheGateBootstrappingParameterSet* params)
+{
+	const Section* section = container_find(c, kind, number);
+	if (section == NULL)
+		return -1;
+	fseek(c->file, c->start + section->offset, SEEK_SET);
+	for (int i = 0; i < n; i++)
+		import_gate_bootstrapping_ciphertext_fromFile(c->file, &samples[i], params);
+	return 0;
+}
+
+// Moves to the container after this one
+void container_next(Container* c)
+{
+	fseek(c->file, c->start + c->header.size, SEEK_SET);
+}
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+# Long-lived connections between the Cloud and the client nodes.
+#
+# The Cloud keeps one connection per client and reuses it for every operand
+# it fetches, across queries, instead of connecting to port 4381 each time.
+# The client keeps its listening socket and serves requests until the Cloud
+# goes away, then waits for the Cloud to connect again.
+#
+# A new connection starts with a challenge-response in both directions, keyed
+# with nbit.key, which the Keygen hands to the Cloud and the clients over
+# Dragonfly. After that the Cloud sends DataRequest messages naming what it
+# wants. "ping" is answered with "pong" and serves as the health check for a
+# connection that has been idle before it is reused.
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+import asn1tools
+import transfer
+import transport
+
+asn1_file = asn1tools.compile_files("declaration.asn")
+
+KEY_FILE = 'nbit.key'
+NONCE_SIZE = 32
+
+# Ping a connection that has been idle this long (seconds) before reusing it
+HEALTH_INTERVAL = 10
+HEALTH_TIMEOUT = 5
+CONNECT_RETRY = 5
+
+# Open connections: client address -> [socket, time of last request]
+connections = {}
+# Client address -> lock held while one thread talks to the client, the
+# connection serves one request at a time
+locks = {}
+locks_lock = threading.Lock()
+
+
+def auth_key():
+    with open(KEY_FILE, 'rb') as k:
+        return hashlib.sha256(k.read()).digest()
+
+
+def sign(key, role, nonce):
+    return hmac.new(key, role + nonce, hashlib.sha256).digest()
+
+
+def recv_auth(connection):
+    return asn1_file.decode('DataAuth', transfer.recv_pdu(connection))
+
+
+def cloud_auth(connection):
+    """Cloud side: answer the client's challenge, then challenge the client."""
+    key = auth_key()
+    challenge = recv_auth(connection)
+    nonce = os.urandom(NONCE_SIZE)
+    connection.sendall(asn1_file.encode('DataAuth', {'nonce': nonce, 'mac': sign(key, b'cloud', challenge.get('nonce'))}))
+    reply = recv_auth(connection)
+    if not hmac.compare_digest(reply.get('mac'), sign(key, b'client', nonce)):
+        raise ConnectionRefusedError('client failed authentication')
+
+
+def client_auth(connection):
+    """Client side: challenge the Cloud, then answer its challenge."""
+    key = auth_key()
+    nonce = os.urandom(NONCE_SIZE)
+    connection.sendall(asn1_file.encode('DataAuth', {'nonce': nonce, 'mac': b''}))
+    reply = recv_auth(connection)
+    if not hmac.compare_digest(reply.get('mac'), sign(key, b'cloud', nonce)):
+        raise ConnectionRefusedError('cloud failed authentication')
+    connection.sendall(asn1_file.encode('DataAuth', {'nonce': b'', 'mac': sign(key, b'client', reply.get('nonce'))}))
+
+
+def send_request(connection, name):
+    connection.sendall(asn1_file.encode('DataRequest', {'data': name}))
+
+
+def recv_request(connection):
+    return asn1_file.decode('DataRequest', transfer.recv_pdu(connection)).get('data')
+
+
+def open_connection(address):
+    # Connect as soon as the client is listening and authenticate
+    while True:
+        connection = transport.wait_connect(address, 'bulk')
+        try:
+            cloud_auth(connection)
+            print("Connected to client", address)
+            return connection
+        except ConnectionError as conn_error:
+            print('Client', address, 'failed to authenticate', conn_error)
+            connection.close()
+            time.sleep(CONNECT_RETRY)
+
+
+def ping(connection):
+    try:
+        connection.settimeout(HEALTH_TIMEOUT)
+        send_request(connection, 'ping')
+        alive = recv_request(connection) == 'pong'
+        connection.settimeout(None)
+        return alive
+    except (OSError, ConnectionError):
+        return False
+    except:
+        print("An error occured", sys.exc_info()[0])
+        return False
+
+
+def drop(address):
+    entry = connections.pop(address, None)
+    if entry is not None:
+        entry[0].close()
+
+
+def get(address):
+    """Healthy, authenticated connection to the client at address."""
+    entry = connections.get(address)
+    if entry is not None:
+        connection, last_used = entry
+        if time.time() - last_used < HEALTH_INTERVAL or ping(connection):
+            return connection
+        print("Client", address, "did not answer, reconnecting")
+        drop(address)
+    connections[address] = [open_connection(address), time.time()]
+    return connections[address][0]
+
+
+def lock(address):
+    """Lock to hold around a request to the client at address and the
+    reading of its answer."""
+    with locks_lock:
+        return locks.setdefault(address, threading.Lock())
+
+
+def request(address, name):
+    """Ask the client at address for name, return the connection to read the
+    answer from."""
+    connection = get(address)
+    send_request(connection, name)
+    connections[address][1] = time.time()
+    return connection
+
+
+def serve(listener, handlers):
+    """Client side: accept the Cloud's connection on listener (a
+    transport.Listener) and pass each request to handlers[name](connection),
+    until the Cloud goes away. Then wait for it to connect again."""
+    while True:
+        connection, cloud_address = listener.accept()
+        with connection:
+            print("Connecting from", cloud_address)
+            try:
+                client_auth(connection)
+                while True:
+                    name = recv_request(connection)
+                    if name == 'ping':
+                        send_request(connection, 'pong')
+                    elif name in handlers:
+                        handlers[name](connection)
+                    else:
+                        print("Unknown request", name)
+            except ConnectionError as conn_error:
+                print("Connection to cloud closed", conn_error)
+            except:
+                print("An error occured", sys.exc_info()[0])
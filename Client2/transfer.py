@@ -0,0 +1,706 @@
+#!/usr/bin/python3
+# Resumable file transfer shared by the Keygen, Cloud, Client and Output nodes.
+#
+# The receiver keeps the bytes it has persisted so far in <filename>.part. On
+# every (re)connect it reports a checkpoint (offset + SHA-256 of those bytes),
+# the sender checks the checkpoint against its own copy of the file and
+# continues from that offset, or from zero if the prefix does not match.
+#
+# Files that are already encrypted are sent in raw mode: a DataTransfer header
+# carrying the size of the file, followed by the file body sent with
+# sendfile() and received with splice(), so the payload is never copied
+# through Python on either end.
+#
+# Everything else is streamed in framed mode: each frame carries a sequence
+# number, its offset, its length and a checksum (CRC32C, or CRC-32 when the
+# crc32c module is missing on either end) in front of the payload. The sender
+# keeps up to WINDOW_SIZE bytes in flight and the receiver answers with
+# cumulative acks. Frames that are corrupt or never arrived are named in the
+# ack (NACK) and sent again on their own, every frame that checked out is kept
+# where it is. The receiver reads with recv_into() into one buffer allocated
+# per transfer (RecvBuffer), parses the frame headers in place and writes the
+# payload to the file straight from slices of that buffer.
+#
+# Both ends hash the file while it is transferred and the sender closes with a
+# DataTrailer carrying the SHA-256 of the whole file, which the receiver checks
+# in-process before the .part file is put in place.
+#
+# When the receiver runs on the same host, the header carries the path of the
+# file instead and the receiver copies it straight from the page cache. Only
+# files in a scratch directory of handoff.py that belongs to this user are
+# handed over like that (local_source()). If the receiver cannot take the path
+# it answers "remote" and the file is sent as usual.
+#
+# The frame size (and in raw mode the sendfile() window) is tuned per link.
+# The receiver advertises the largest frame it accepts in its checkpoint. On
+# the first transfer of at least TUNE_MIN_SIZE bytes to a peer the sender
+# sends a probe header followed by PROBE_SIZE bytes. The RTT is the round trip
+# of the header, the bandwidth is timed by the receiver from the first bytes of
+# the probe to the last and sent back in its ack (DataProbeAck). Frames and
+# window are sized from them, the result is kept for later transfers to the
+# same peer and written to the timings file. Smaller transfers use the
+# defaults.
+#
+# A ciphertext of the clients is as long as its bit width needs (see alice.c),
+# the header carries that width so the receiver knows how much of the layout
+# to expect. It is 0 for any other file.
+#
+# BER messages are read with recv_pdu(), which finds the PDU boundary from the
+# BER tag and length, so a PDU split over several TCP segments or sent right
+# behind another one is still decoded whole.
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import select
+import socket
+import stat
+import struct
+import sys
+import time
+import zlib
+import asn1tools
+import transport
+
+try:
+    from crc32c import crc32c
+except ImportError:
+    crc32c = None
+
+asn1_file = asn1tools.compile_files("declaration.asn")
+
+logger = logging.getLogger('dragonfly')
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Send file bodies with sendfile() instead of BER encoded chunks
+RAW_TRANSFER = True
+# Let a receiver on the same host copy the file from its path
+LOCAL_HANDOFF = True
+# tmpfs mounts that hold the scratch directories of handoff.py,
+# ie-ache-<node directory> each
+LOCAL_ROOTS = ['/dev/shm', '/run/shm']
+RAW_BUFFER_SIZE = 1024 * 1024
+
+# Framed mode: payload bytes per frame and bytes in flight before the sender
+# waits for an ack. The receiver acks every WINDOW_SIZE // ACK_RATIO bytes.
+FRAME_SIZE = 64 * 1024
+WINDOW_SIZE = 4 * 1024 * 1024
+ACK_RATIO = 4
+
+# Link autotuning: probe payload, largest frame accepted, and how many seconds
+# of data one frame should carry at the measured bandwidth
+AUTOTUNE = True
+PROBE_SIZE = 1024 * 1024
+# Transfers smaller than this do not probe, a key file of a few KB would
+# mostly carry the probe
+TUNE_MIN_SIZE = 4 * PROBE_SIZE
+# The receiver times the probe from the end of its first read, so the RTT
+# is not counted
+PROBE_FIRST_READ = 64 * 1024
+MAX_FRAME_SIZE = 8 * 1024 * 1024
+FRAME_TIME = 0.005
+
+TIMINGS_FILE = 'timings.txt'
+
+# Tuned links: peer address -> (frame size, window)
+links = {}
+
+# Frame header: sequence number, offset of the payload in the file, payload
+# length, checksum of the payload
+FRAME_HEADER = struct.Struct('!QQII')
+# Ack: offset received in order so far, number of NACKed sequence numbers that
+# follow the ack
+FRAME_ACK = struct.Struct('!QH')
+FRAME_NACK = struct.Struct('!Q')
+MAX_NACKS = 256
+
+
+def prefix_digest(filename, length):
+    """SHA-256 hash object over the first length bytes of filename."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while length > 0:
+            data = f.read(min(HASH_CHUNK_SIZE, length))
+            if not data:
+                break
+            digest.update(data)
+            length -= len(data)
+    return digest
+
+
+def hash_window(digest, f, start, end):
+    """Add bytes start..end of file f to digest, read from the page cache."""
+    if end <= start:
+        return
+    with mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view, view[start:end] as window:
+            digest.update(window)
+
+
+def checkpoint(filename):
+    """Offset and running hash of the partial download of filename."""
+    partial = filename + '.part'
+    if not os.path.isfile(partial):
+        return 0, hashlib.sha256()
+    offset = os.path.getsize(partial)
+    return offset, prefix_digest(partial, offset)
+
+
+def recv_exact(connection, size):
+    data = connection.recv(size)
+    if not data:
+        raise ConnectionResetError('peer closed the connection')
+    return data
+
+
+def recv_all_into(connection, view):
+    """Fill view with exactly len(view) bytes."""
+    pos = 0
+    while pos < len(view):
+        n = connection.recv_into(view[pos:])
+        if not n:
+            raise ConnectionResetError('peer closed the connection')
+        pos += n
+
+
+def recv_all(connection, size):
+    """Receive exactly size bytes."""
+    data = bytearray(size)
+    recv_all_into(connection, memoryview(data))
+    return data
+
+
+def recv_status(connection):
+    """Read the "success", "fail" or "remote" that answers a header or a
+    trailer and nothing more, the receiver may send its next message right
+    behind it."""
+    status = recv_all(connection, 4)
+    if status == b'succ':
+        status += recv_all(connection, 3)
+    elif status == b'remo':
+        status += recv_all(connection, 2)
+    return status.decode(errors='replace')
+
+
+class RecvBuffer:
+    """Reusable receive buffer. Each recv_into() takes whatever the socket
+    has, so several small frames come in with one call, and bytes are handed
+    out as memoryview slices of the buffer instead of new objects."""
+
+    def __init__(self, connection, size):
+        self.connection = connection
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def take(self, size):
+        """View of the next size bytes, valid until the next take()."""
+        if self.start + size > len(self.buffer):
+            # Move the unread tail to the front to make room
+            tail = self.end - self.start
+            self.view[:tail] = self.view[self.start:self.end]
+            self.start, self.end = 0, tail
+        while self.end - self.start < size:
+            n = self.connection.recv_into(self.view[self.end:])
+            if not n:
+                raise ConnectionResetError('peer closed the connection')
+            self.end += n
+        data = self.view[self.start:self.start + size]
+        self.start += size
+        return data
+
+
+class BerDecoder:
+    """Incremental BER decoder. Bytes are fed in as they arrive and complete
+    PDUs are handed out once their last byte is in."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+
+    def boundary(self):
+        """Size of the first PDU in the buffer (None while its header is
+        incomplete) and the number of bytes still missing from it."""
+        buf = self.buffer
+        pos = 1
+        # High tag numbers continue while bit 8 is set
+        if buf and buf[0] & 0x1f == 0x1f:
+            while pos < len(buf) and buf[pos] & 0x80:
+                pos += 1
+            pos += 1
+        if len(buf) <= pos:
+            return None, pos + 1 - len(buf)
+
+        length = buf[pos]
+        pos += 1
+        if length == 0x80:
+            raise ValueError('indefinite length BER is not supported')
+        if length & 0x80:
+            # Long form, the low bits give the number of length bytes
+            count = length & 0x7f
+            if len(buf) < pos + count:
+                return None, pos + count - len(buf)
+            length = int.from_bytes(buf[pos:pos + count], 'big')
+            pos += count
+        return pos + length, max(pos + length - len(buf), 0)
+
+    def pdus(self):
+        """Yield the complete PDUs in the buffer."""
+        while True:
+            size, missing = self.boundary()
+            if size is None or missing:
+                return
+            pdu = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            yield pdu
+
+
+def recv_pdu(connection):
+    """Receive one BER PDU. Only the bytes of that PDU are read from the
+    socket, whatever follows it is left for the next read."""
+    decoder = BerDecoder()
+    while True:
+        for pdu in decoder.pdus():
+            return pdu
+        size, missing = decoder.boundary()
+        decoder.feed(recv_exact(connection, missing))
+
+
+def readable(connection, timeout):
+    # Multiplexed streams (mux.py) have no file descriptor to select() on
+    if isinstance(connection, socket.socket):
+        r, w, e = select.select([connection], [], [], timeout)
+        return len(r) > 0
+    return connection.readable(timeout)
+
+
+def send_ready(connection, message):
+    """Tell the peer a stage is done, e.g. "keys installed"."""
+    connection.sendall(asn1_file.encode('DataIndicator', {'data': message}))
+
+
+def recv_ready(connection, message):
+    """Wait until the peer sends message with send_ready()."""
+    indication = asn1_file.decode('DataIndicator', recv_pdu(connection)).get('data')
+    if indication != message:
+        raise ConnectionResetError('expected ' + message + ', got ' + indication)
+
+
+def recv_checkpoint(connection):
+    """Receive the checkpoint the receiver sends at the start of a transfer:
+    offset, prefix digest, the largest frame it accepts and whether it has
+    CRC32C."""
+    checkpoint_decoded = asn1_file.decode('DataCheckpoint', recv_pdu(connection))
+    return (checkpoint_decoded.get('offset'), checkpoint_decoded.get('digest'),
+            checkpoint_decoded.get('frame'), checkpoint_decoded.get('crc32c'))
+
+
+def frame_checksum(use_crc32c):
+    return crc32c if use_crc32c else zlib.crc32
+
+
+def resume_point(filename, resume):
+    """Offset and prefix hash to continue from, or 0 if the receiver's prefix
+    does not match our copy of filename."""
+    offset, digest = resume[0], resume[1]
+    if offset <= 0 or not os.path.isfile(filename):
+        return 0, hashlib.sha256()
+    if offset > os.path.getsize(filename):
+        return 0, hashlib.sha256()
+    prefix = prefix_digest(filename, offset)
+    if prefix.digest() != digest:
+        return 0, hashlib.sha256()
+    return offset, prefix
+
+
+def record(line):
+    f = open(TIMINGS_FILE, 'a')
+    f.write('\n' + line)
+    f.close()
+
+
+def peer(connection):
+    address = connection.getpeername()
+    return address[0] if isinstance(address, tuple) else str(address)
+
+
+def send_header(connection, header):
+    """Send a DataTransfer header until it is acked. Returns False if the
+    receiver cannot read the local path in the header."""
+    header_encoded = asn1_file.encode('DataTransfer', header)
+    while True:
+        connection.sendall(header_encoded)
+        msg = recv_status(connection)
+        if (msg == "success"):
+            return True
+        if (msg == "remote"):
+            return False
+        if (msg != "fail"):
+            # Not a reply to the header, the stream is out of step
+            raise ConnectionResetError('unexpected reply ' + repr(msg) + ' to a transfer header')
+
+
+def tune(connection, header, limit):
+    """Probe RTT and bandwidth to the receiver, return frame size and window."""
+    start = time.perf_counter()
+    send_header(connection, dict(header, probe=PROBE_SIZE))
+    rtt = time.perf_counter() - start
+
+    connection.sendall(bytes(PROBE_SIZE))
+    ack = asn1_file.decode('DataProbeAck', recv_pdu(connection))
+    # Microseconds the receiver took for the bytes after its first read
+    bandwidth = ack['bytes'] / max(ack['elapsed'], 1) * 1e6
+
+    # A frame carries about FRAME_TIME seconds of data, rounded down to a power
+    # of two, and the window covers twice the bandwidth-delay product
+    frame = FRAME_SIZE
+    while frame * 2 <= min(bandwidth * FRAME_TIME, limit):
+        frame *= 2
+    frame = min(frame, limit)
+    window = max(WINDOW_SIZE, 4 * frame, int(2 * bandwidth * rtt))
+
+    print("Link", peer(connection), "rtt", round(rtt, 6), "s bandwidth", int(bandwidth), "B/s frame size", frame)
+    record('Link ' + peer(connection) + ': rtt ' + str(round(rtt, 6)) + ' s, bandwidth ' + str(int(bandwidth))
+           + ' B/s, frame size ' + str(frame) + ', window ' + str(window))
+    return frame, window
+
+
+def send_raw(connection, f, offset, count, digest, frame_size):
+    # sendfile() hands the file pages to the socket inside the kernel, each
+    # window is hashed from the same cached pages right after it is sent
+    end = offset + count
+    while offset < end:
+        n = min(frame_size, end - offset)
+        connection.sendfile(f, offset, n)
+        hash_window(digest, f, offset, offset + n)
+        offset += n
+
+
+def recv_raw(connection, f, count, digest, frame_size):
+    """Write the next count bytes from connection straight into file f."""
+    if not hasattr(os, 'splice'):
+        buf = bytearray(frame_size)
+        view = memoryview(buf)
+        while count > 0:
+            n = connection.recv_into(view[:min(count, frame_size)])
+            if not n:
+                raise ConnectionResetError('peer closed the connection')
+            f.write(view[:n])
+            digest.update(view[:n])
+            count -= n
+        return
+
+    # socket -> pipe -> file, the payload stays in kernel buffers
+    start = f.tell()
+    r, w = os.pipe()
+    if hasattr(fcntl, 'F_SETPIPE_SZ'):
+        try:
+            # Let one splice() move a whole frame
+            fcntl.fcntl(w, fcntl.F_SETPIPE_SZ, frame_size)
+        except OSError:
+            pass
+    try:
+        while count > 0:
+            try:
+                n = os.splice(connection.fileno(), w, min(count, frame_size))
+            except BlockingIOError:
+                # A socket with a timeout is non-blocking underneath, wait
+                # for it here as recv() would
+                if not select.select([connection], [], [], connection.gettimeout())[0]:
+                    raise socket.timeout('timed out')
+                continue
+            if not n:
+                raise ConnectionResetError('peer closed the connection')
+            count -= n
+            end = start + n
+            while n > 0:
+                n -= os.splice(r, f.fileno(), n)
+            hash_window(digest, f, start, end)
+            start = end
+    finally:
+        os.close(r)
+        os.close(w)
+
+
+def local_source(path):
+    """Whether path may be handed over by path: a file of this user in one of
+    the private scratch directories of handoff.py."""
+    real = os.path.realpath(path)
+    scratch = os.path.dirname(real)
+    roots = [os.path.realpath(root) for root in LOCAL_ROOTS]
+    if os.path.dirname(scratch) not in roots or not os.path.basename(scratch).startswith('ie-ache-'):
+        return False
+    try:
+        scratch_stat = os.lstat(scratch)
+        file_stat = os.stat(real)
+    except OSError:
+        return False
+    return (scratch_stat.st_uid == os.getuid() and not scratch_stat.st_mode & 0o077
+            and file_stat.st_uid == os.getuid() and stat.S_ISREG(file_stat.st_mode)
+            and os.access(real, os.R_OK))
+
+
+def copy_local(path, f, offset, fsize, digest, frame_size):
+    """Copy bytes offset..fsize of the sender's file at path into file f."""
+    with open(path, 'rb') as src:
+        while offset < fsize:
+            # File to file sendfile(), the data never leaves the kernel
+            n = os.sendfile(f.fileno(), src.fileno(), offset, min(frame_size, fsize - offset))
+            if not n:
+                # The sender's file is shorter than announced, the trailer
+                # digest will not match and the file is sent again
+                break
+            hash_window(digest, f, offset, offset + n)
+            offset += n
+
+
+def send_frame(connection, f, seq, offset, length, checksum):
+    content = os.pread(f.fileno(), length, offset)
+    connection.sendall(FRAME_HEADER.pack(seq, offset, len(content), checksum(content)) + content)
+
+
+def send_frames(connection, f, offset, fsize, digest, frame_size, window, checksum):
+    """Stream bytes offset..fsize of file f as frames within the window."""
+    start = offset
+    acked = offset
+    resend = []
+    while acked < fsize:
+        # Frames the receiver asked for again go out first
+        for seq in resend:
+            frame_offset = start + seq * frame_size
+            send_frame(connection, f, seq, frame_offset, min(frame_size, fsize - frame_offset), checksum)
+        resend = []
+        while offset < fsize and offset - acked < window:
+            length = min(frame_size, fsize - offset)
+            send_frame(connection, f, (offset - start) // frame_size, offset, length, checksum)
+            offset += length
+
+        # Pick up acks as they come, only block once nothing else can be sent
+        blocked = offset >= fsize or offset - acked >= window
+        if not readable(connection, None if blocked else 0.0):
+            continue
+        ack, count = FRAME_ACK.unpack(recv_all(connection, FRAME_ACK.size))
+        if count:
+            resend = [seq for seq, in FRAME_NACK.iter_unpack(recv_all(connection, count * FRAME_NACK.size))]
+            print("Resending frames", resend, "of", f.name)
+        # Everything below the ack is with the receiver, hash it in order
+        hash_window(digest, f, acked, ack)
+        acked = max(acked, ack)
+
+
+def send_ack(connection, offset, nacks):
+    """Ack offset and NACK up to MAX_NACKS of nacks. Returns the ones left for
+    the next ack."""
+    sent = nacks[:MAX_NACKS]
+    connection.sendall(FRAME_ACK.pack(offset, len(sent)) + b''.join(FRAME_NACK.pack(seq) for seq in sent))
+    return nacks[MAX_NACKS:]
+
+
+def recv_frames(connection, f, offset, fsize, digest, frame_size, checksum):
+    """Receive frames into file f until it holds fsize bytes."""
+    start = offset
+    acked = offset
+    # Next sequence number in sending order, and frames kept beyond offset
+    expected = 0
+    received = set()
+    # Frames to ask for again that did not fit in the last ack
+    nacks = []
+    # Room for two whole frames, so a frame never waits for the buffer to
+    # be compacted more than once
+    buffer = RecvBuffer(connection, 2 * (FRAME_HEADER.size + frame_size))
+    try:
+        while offset < fsize:
+            seq, frame_offset, length, crc = FRAME_HEADER.unpack(buffer.take(FRAME_HEADER.size))
+            if length > frame_size or frame_offset != start + seq * frame_size or frame_offset + length > fsize:
+                # The stream is out of step, reconnect and resume from the .part file
+                raise ConnectionResetError('bad frame ' + str(seq) + ' length ' + str(length))
+            content = buffer.take(length)
+
+            # Frames skipped over never arrived, ask for those as well
+            nacks.extend(range(expected, seq))
+            expected = max(expected, seq + 1)
+            if checksum(content) != crc:
+                print("Frame", seq, "of", f.name, "is corrupt, asking for it again")
+                nacks.append(seq)
+            elif frame_offset >= offset and seq not in received:
+                if seq in nacks:
+                    nacks.remove(seq)
+                os.pwrite(f.fileno(), content, frame_offset)
+                received.add(seq)
+                # Hash what is now in order, as the sender does
+                end = offset
+                while end < fsize and (end - start) // frame_size in received:
+                    received.remove((end - start) // frame_size)
+                    end = min(end + frame_size, fsize)
+                hash_window(digest, f, offset, end)
+                offset = end
+
+            if nacks or offset - acked >= WINDOW_SIZE // ACK_RATIO or offset == fsize:
+                nacks = send_ack(connection, offset, nacks)
+                acked = offset
+    except:
+        # Only the bytes received in order count for the checkpoint
+        f.truncate(offset)
+        raise
+
+
+def send_file(connection, filename, resume=None, raw=None, width=0):
+    """Send filename, continuing from the receiver's checkpoint. width is the
+    bit width of the ciphertext in it, if it is one."""
+    if resume is None:
+        resume = recv_checkpoint(connection)
+    if raw is None:
+        raw = RAW_TRANSFER
+    # sendfile() and splice() need the real socket, streams use framed mode
+    raw = raw and isinstance(connection, socket.socket)
+    fsize = os.path.getsize(filename)
+    use_crc32c = bool(resume[3]) and crc32c is not None
+    offset, digest = resume_point(filename, resume)
+    if offset:
+        print("Resuming", filename, "from offset", offset, "of", fsize)
+
+    local = LOCAL_HANDOFF and transport.is_local(connection) and local_source(filename)
+    limit = min(resume[2] or FRAME_SIZE, MAX_FRAME_SIZE)
+    if AUTOTUNE and not local and fsize - offset >= TUNE_MIN_SIZE and peer(connection) not in links:
+        links[peer(connection)] = tune(connection, {'fsize': fsize, 'offset': offset, 'raw': raw}, limit)
+    frame_size, window = links.get(peer(connection), (RAW_BUFFER_SIZE if raw else FRAME_SIZE, WINDOW_SIZE))
+    frame_size = min(frame_size, limit)
+
+    with open(filename, 'rb') as f:
+        while True:
+            header = {'fsize': fsize, 'offset': offset, 'raw': raw, 'frame': frame_size, 'crc32c': use_crc32c, 'width': width}
+            if local:
+                header['path'] = os.path.abspath(filename)
+            if not send_header(connection, header):
+                print("Receiver cannot read", filename, "locally, sending it")
+                local = False
+                continue
+
+            if local:
+                # The receiver copies the file, hash the same bytes for the trailer
+                hash_window(digest, f, offset, fsize)
+            elif raw:
+                send_raw(connection, f, offset, fsize - offset, digest, frame_size)
+            else:
+                send_frames(connection, f, offset, fsize, digest, frame_size, window, frame_checksum(use_crc32c))
+
+            #Receiver checks the digest of the whole file
+            connection.sendall(asn1_file.encode('DataTrailer', {'digest': digest.digest()}))
+            msg = recv_status(connection)
+            if (msg == "success"):
+                break
+            print("Digest mismatch, resending", filename)
+            offset = 0
+            digest = hashlib.sha256()
+
+    logger.info('transfer=sent file=%s bytes=%d frame=%d sha256=%s', filename, fsize, frame_size, digest.hexdigest())
+    return fsize
+
+
+def recv_header(connection):
+    while True:
+        try:
+            header_decoded = asn1_file.decode('DataTransfer', recv_pdu(connection))
+        except ConnectionError:
+            raise
+        except:
+            # recv_pdu() took exactly the bytes of the bad PDU, the stream is
+            # still in step and the sender just sends the header again
+            print("An error occured", sys.exc_info()[0])
+            connection.send("fail".encode())
+            continue
+
+        path = header_decoded.get('path')
+        if path is not None and not local_source(path):
+            # Not the same file system after all, or not a file of ours to
+            # take, ask for the bytes
+            connection.send("remote".encode())
+            continue
+        connection.send("success".encode())
+
+        if not header_decoded.get('probe'):
+            return header_decoded
+        # Link probe from the sender, take the payload and ack it with how
+        # long it took
+        timed, elapsed = recv_probe(connection, header_decoded.get('probe'))
+        connection.sendall(asn1_file.encode('DataProbeAck', {'bytes': timed, 'elapsed': int(elapsed * 1e6)}))
+
+
+def recv_probe(connection, size):
+    """Take size bytes of probe payload. Returns the number of bytes after the
+    first read and the seconds they took to arrive."""
+    view = memoryview(bytearray(size))
+    first = connection.recv_into(view[:min(size, PROBE_FIRST_READ)])
+    if not first:
+        raise ConnectionResetError('peer closed the connection')
+    start = time.perf_counter()
+    recv_all_into(connection, view[first:])
+    return size - first, time.perf_counter() - start
+
+
+def recv_file(connection, filename, append=False):
+    """Receive into filename.part, then replace (or append to) filename.
+    Returns the size of the file and the width the sender declared."""
+    partial = filename + '.part'
+    offset, digest = checkpoint(filename)
+    connection.sendall(asn1_file.encode('DataCheckpoint', {'offset': offset, 'digest': digest.digest(), 'frame': MAX_FRAME_SIZE,
+                                                           'crc32c': crc32c is not None}))
+
+    # Unbuffered, so raw mode can splice into the file descriptor, and readable
+    # so the received windows can be hashed from the page cache
+    with open(partial, 'r+b' if offset else 'w+b', buffering=0) as f:
+        while True:
+            header_decoded = recv_header(connection)
+            fsize = header_decoded.get('fsize')
+            if header_decoded.get('offset') != offset:
+                # Sender could not verify our prefix, start over
+                offset = 0
+                digest = hashlib.sha256()
+            elif offset:
+                print("Resuming", filename, "from offset", offset, "of", fsize)
+            f.truncate(offset)
+            f.seek(offset)
+
+            frame_size = header_decoded.get('frame')
+            if frame_size > MAX_FRAME_SIZE:
+                raise ConnectionResetError('frame size ' + str(frame_size) + ' over the limit')
+            if header_decoded.get('path') is not None:
+                copy_local(header_decoded.get('path'), f, offset, fsize, digest, frame_size or RAW_BUFFER_SIZE)
+            elif header_decoded.get('raw'):
+                recv_raw(connection, f, fsize - offset, digest, frame_size or RAW_BUFFER_SIZE)
+            else:
+                recv_frames(connection, f, offset, fsize, digest, frame_size, frame_checksum(header_decoded.get('crc32c')))
+
+            try:
+                trailer_decoded = asn1_file.decode('DataTrailer', recv_pdu(connection))
+            except ConnectionError:
+                raise
+            except:
+                trailer_decoded = {}
+            if trailer_decoded.get('digest') == digest.digest():
+                connection.sendall("success".encode())
+                break
+            print("Digest mismatch, receiving", filename, "again")
+            connection.sendall("fail".encode())
+            offset = 0
+            digest = hashlib.sha256()
+
+    logger.info('transfer=received file=%s bytes=%d frame=%d sha256=%s', filename, fsize, frame_size, digest.hexdigest())
+    record('Frame size for ' + os.path.basename(filename) + ': ' + str(frame_size))
+
+    if append:
+        with open(partial, 'rb') as src, open(filename, 'ab') as dst:
+            while True:
+                data = src.read(HASH_CHUNK_SIZE)
+                if not data:
+                    break
+                dst.write(data)
+        os.remove(partial)
+    else:
+        os.replace(partial, filename)
+    return fsize, header_decoded.get('width')
@@ -16,13 +16,14 @@ from Cryptodome import Random
 from Cryptodome.Hash import SHA256
 from optparse   import *
 import select
+import transfer
+import handoff
+import pool
+import transport
 import sys
 
 asn1_file = asn1tools.compile_files("declaration.asn")
 
-#Create tcp/ip socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
 #retrieve local hostname
 local_hostname = socket.gethostname()
 
@@ -32,141 +33,107 @@ local_fqdn = socket.getfqdn()
 #get the according ip address
 ip_address = "192.168.0.23"
 
-#bind socket 
+#listen on tcp/ip and, for a cloud on this host, a unix socket
 own_address = (ip_address, 4381)
 print("Starting up on %s port %s" % own_address)
-sock.bind(own_address)
-
-
-
-def cipher():
-
-    sock.listen(1)
-    connection, cloud_address = sock.accept()
-    with connection:
-        print("Connecting from", cloud_address)
-        
-
-        # Run Adder_alice to get ciphertext
-        print("Getting ciphertext...\n")
-        subprocess.call("./alice")
-        print("Printing ciphertext...\n")
-        cloud_data = "cloud.data"
-        print("This file ", cloud_data, "is our ciphertext\n")
+sock = transport.Listener(own_address, profile='bulk')
+
+
+
+# Files ./alice encrypts from, cloud.data is made again when one changes
+# (or when ./alice itself does)
+SOURCES = ['secret.key', 'nbit.key', 'values.txt', 'alice']
+
+def stamp():
+    return ' '.join(str(os.stat(name).st_mtime_ns) for name in SOURCES)
+
+def ciphertext():
+    # Encrypt values.txt into cloud.data unless it already holds the current
+    # values under the current keys. Returns the SHA-256 of cloud.data, the
+    # version the cloud keeps it under
+    cloud_data = handoff.path("cloud.data")
+    try:
+        with open(handoff.path("cloud.version")) as v:
+            held_source, version = v.read().split('\n')
+        if held_source == stamp() and os.path.exists(cloud_data):
+            return bytes.fromhex(version)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    # Run Adder_alice to get ciphertext
+    print("Getting ciphertext...\n")
+    handoff.run("./alice")
+    print("Printing ciphertext...\n")
+    version = transfer.prefix_digest(cloud_data, os.path.getsize(cloud_data)).digest()
+    # ./alice writes secret.key and nbit.key again, so the stamp is taken
+    # after it ran
+    with open(handoff.path("cloud.version"), 'w') as v:
+        v.write(stamp() + '\n' + version.hex())
+    return version
+
+def width():
+    # Bit width of the value, the second line of values.txt. cloud.data holds
+    # one chunk per 32 bits of it
+    with open("values.txt") as v:
+        v.readline()
+        return int(v.readline().strip(), 2)
+
+def version(connection):
+    # Called by pool.serve() before the cloud fetches cloud.data, so it can
+    # skip the transfer when it holds this version already
+    connection.sendall(asn1_file.encode('DataVersion', {'digest': ciphertext()}))
+
+def cipher(connection):
+    # Called by pool.serve() each time the cloud asks for cloud.data
+    cloud_data = handoff.path("cloud.data")
+    ciphertext()
+    print("This file ", cloud_data, "is our ciphertext\n")
+
+    # The cloud first reports how much of cloud.data it already holds
+    resume = transfer.recv_checkpoint(connection)
+
+    # Send the file size and the data to the cloud server
+    fsize = transfer.send_file(connection, cloud_data, resume, width=width())
+
+    # Get the file size of sent data
+    print("Original file size: ", fsize)
+
+    #  Decode BER indication data received from cloud 
+    while True:
+        try:
+            irecv = transfer.recv_pdu(connection)
+            indication = asn1_file.decode('DataIndicator', irecv)
+            indication_decoded = indication.get('data')
+            print(indication_decoded)
+
+            msg = "success"
+            connection.send(msg.encode())
+
+            #break out of while loop
+            break
         
-        f = open(cloud_data, "rb")
-        content = f.read(8192)
-        print(content)
-
-        # Send the file size of the data to the cloud server
-        fsize = os.path.getsize(cloud_data)
-        print("This is the fsize" ,fsize)
-
-        # Send fsize in BER NOTE: COMPLETE
-        fsize_encoded = asn1_file.encode('DataFsize',{'data':fsize})
-
-#####
-        while True:
-            #Send file size to cloud
-            connection.send(fsize_encoded)
-
-            #Receive msg
-            encoded_msg = connection.recv(1024)
-            msg = encoded_msg.decode()
-
-            print(fsize_encoded)
-
-            #If success, break
-            if (msg == "success"):
-                break
-            else:
-                continue
+        except:
+            #print out err msg
+            print('An error has occured', sys.exc_info()[0])
 
-        #set offset value
-        offset_value = 0
-
-        BUFFER_SIZE = 1024
-        with open(cloud_data, 'rb') as f:
-            while True:
-                print("offset value", f.tell())
-
-                #Before offset
-                before_offset = f.tell()
-                content = f.read(BUFFER_SIZE)
-
-                #BER encode data and send
-                data_encoded = asn1_file.encode('DataContent', {'data':content})
-                connection.send(data_encoded)
-                
-                #After offset
-                after_offset = f.tell()
-
-                #Received msg
-                encode_msg = connection.recv(1024)
-                msg = encode_msg.decode()
-                print("msg", msg)
-
-                if(msg == "success"):
-                    if(int(after_offset == fsize)):
-                        break
-                    else:
-                        continue
-                else:
-                    #offset differences
-                    offset_differences = int(after_offset) - int(before_offset)
-                
-                    #offset values
-                    offset_value = int(after_offset) - int(offset_differences)
-                    f.seek(offset_value)
-
-            f.close()
-#####
-        # Get the file size of sent data
-        print("Original file size: ", os.path.getsize(cloud_data))
-        print("The CLOUD will send the computed answer to OUTPUT.\n")
-#####
-
-        # buffer_size = 10
-        #  Decode BER indication data received from cloud 
-        while True:
-            try:
-                irecv = connection.recv(1024)
-                indication = asn1_file.decode('DataIndicator', irecv)
-                indication_decoded = indication.get('data')
-                print(indication_decoded)
-
-                msg = "success"
-                connection.send(msg.encode())
-
-                #break out of while loop
-                break
+            # recv_pdu() consumed exactly the bad PDU, nothing to empty out
             
-            except:
-                #print out err msg
-                print('An error has occured', sys.exc_info()[0])
-
-                #empty out data from socket
-                read_con = [connection]
-                while True:
-                    r, w, e = select.select(read_con, [], [], 0.0)
-                    if len(r) == 0:
-                        break
-                    else:
-                        for data in r:
-                            data.recv(1024)
-                
-                #Testing phase
-                # buffer_size = int(input("size of buffer?"))
+            #Testing phase
+            # buffer_size = int(input("size of buffer?"))
 
-                msg = "fail"
-                connection.send(msg.encode())
-                continue
+            msg = "fail"
+            connection.send(msg.encode())
+            continue
 #####
-        sock.close()
     
 
 if __name__ == '__main__':
-    cipher()
+    # Keep cloud.data on tmpfs for ./alice
+    handoff.setup(['secret.key', 'nbit.key', 'values.txt'])
+
+    # Keep serving the cloud over one connection instead of exiting after
+    # each transfer
+    pool.serve(sock, {'cloud.data': cipher, 'version': version})
                 
 
 
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+# Compares ./cloud operation latency with the per-operation files on disk
+# (node directory) against the in-memory handoff (tmpfs scratch directory).
+#
+# Run on the Cloud machine after a query has left cloud.data (two operands),
+# cloud.key and nbit.key in this directory:
+#   python3 bench_handoff.py [runs] [operator]
+import os
+import statistics
+import sys
+import time
+import handoff
+
+runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+operator = sys.argv[2] if len(sys.argv) > 2 else "1"
+
+if not os.path.isfile('cloud.data'):
+    print("cloud.data not found, run a query first")
+    sys.exit()
+
+with open('cloud.data', 'rb') as c:
+    cloud_data = c.read()
+
+
+def operation():
+    # Same steps as compute(): write the inputs, run ./cloud, read the answer
+    start = time.perf_counter()
+    with open(handoff.path('cloud.data'), 'wb') as c:
+        c.write(cloud_data)
+    with open(handoff.path('operator.txt'), 'w') as o:
+        o.write(operator)
+    handoff.run("./cloud")
+    with open(handoff.path('answer.data'), 'rb') as a:
+        a.read()
+    return time.perf_counter() - start
+
+
+results = {}
+for mode in ['disk', 'memory']:
+    handoff.IN_MEMORY = (mode == 'memory')
+    handoff.setup(['cloud.key', 'nbit.key', 'averagestandard.txt'])
+    results[mode] = [operation() for i in range(runs)]
+    if mode == 'memory':
+        handoff.remove('cloud.data', 'answer.data', 'operator.txt')
+
+f = open('benchmark.txt', 'a')
+f.write('\nHandoff benchmark, operator ' + operator + ', ' + str(runs) + ' runs')
+for mode, timings in results.items():
+    mean = round(statistics.mean(timings), 3)
+    stdev = round(statistics.stdev(timings), 3) if runs > 1 else 0.0
+    print(mode, "mean:", mean, "s stdev:", stdev, "s")
+    f.write('\n' + mode + ' mean: ' + str(mean) + ' stdev: ' + str(stdev))
+f.write('\n========================================')
+f.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# Per-chunk latency of the header/ack exchange under each transport profile.
+#
+# Every chunk goes the way transfer.py sends one: a DataTransfer header acked
+# with "success", then a frame header and the payload, acked by the receiver.
+# The frame header goes out as a write of its own, with Nagle on the payload
+# behind it waits for the delayed ACK of the first.
+#
+# Over loopback (both ends in this process):
+#   python3 bench_transport.py [chunks] [chunk size]
+# Between two machines, on the receiving one:
+#   python3 bench_transport.py serve <ip> <port>
+# and on the sending one:
+#   python3 bench_transport.py connect <ip> <port> [chunks] [chunk size]
+import statistics
+import sys
+import threading
+import time
+import transfer
+import transport
+
+asn1_file = transfer.asn1_file
+transport.USE_UDS = False
+# Plain CRC32 on both ends, as for a peer without CRC32C
+checksum = transfer.frame_checksum(False)
+
+
+def serve(listener, count=None):
+    # Count connections, the loopback run stops after one per profile
+    while count is None or count > 0:
+        connection, address = listener.accept()
+        with connection:
+            profile = transfer.recv_exact(connection, 16).decode()
+            transport.configure(connection, profile)
+            connection.sendall(b'ok')
+            try:
+                while True:
+                    asn1_file.decode('DataTransfer', transfer.recv_pdu(connection))
+                    connection.sendall(b'success')
+                    seq, offset, length, crc = transfer.FRAME_HEADER.unpack(transfer.recv_all(connection, transfer.FRAME_HEADER.size))
+                    payload = transfer.recv_all(connection, length)
+                    if checksum(payload) != crc:
+                        raise ConnectionResetError('corrupt frame ' + str(seq))
+                    # Acked in order, no NACKs
+                    connection.sendall(transfer.FRAME_ACK.pack(offset + length, 0))
+            except ConnectionError:
+                pass
+        if count is not None:
+            count -= 1
+
+
+def run(address, profile, chunks, size):
+    connection = transport.connect(address, profile)
+    connection.sendall(profile.encode())
+    transfer.recv_exact(connection, 2)
+    payload = bytes(size)
+    crc = checksum(payload)
+    timings = []
+    for seq in range(chunks):
+        start = time.perf_counter()
+        transfer.send_header(connection, {'fsize': chunks * size, 'offset': seq * size, 'raw': False, 'frame': size})
+        connection.sendall(transfer.FRAME_HEADER.pack(seq, seq * size, size, crc))
+        connection.sendall(payload)
+        ack, count = transfer.FRAME_ACK.unpack(transfer.recv_all(connection, transfer.FRAME_ACK.size))
+        if ack != (seq + 1) * size or count:
+            raise ConnectionResetError('unexpected ack ' + str(ack) + ' for frame ' + str(seq))
+        timings.append(time.perf_counter() - start)
+    connection.close()
+    return timings
+
+
+if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+    serve(transport.Listener((sys.argv[2], int(sys.argv[3])), uds=False))
+    sys.exit()
+
+if len(sys.argv) > 1 and sys.argv[1] == 'connect':
+    address = (sys.argv[2], int(sys.argv[3]))
+    args = sys.argv[4:]
+else:
+    address = ('127.0.0.1', 4390)
+    args = sys.argv[1:]
+    listener = transport.Listener(address, uds=False)
+    threading.Thread(target=serve, args=(listener, len(transport.PROFILES)), daemon=True).start()
+chunks = int(args[0]) if len(args) > 0 else 200
+size = int(args[1]) if len(args) > 1 else 4096
+
+f = open('benchmark.txt', 'a')
+f.write('\nTransport benchmark, ' + str(address) + ', ' + str(chunks) + ' chunks of ' + str(size) + ' bytes')
+for profile in transport.PROFILES:
+    timings = sorted(run(address, profile, chunks, size))
+    mean = round(statistics.mean(timings) * 1000, 3)
+    p99 = round(timings[int(len(timings) * 0.99) - 1] * 1000, 3)
+    print(profile, "mean:", mean, "ms p99:", p99, "ms")
+    f.write('\n' + profile + ' mean: ' + str(mean) + ' ms p99: ' + str(p99) + ' ms')
+f.write('\n========================================')
+f.close()
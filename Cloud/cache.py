@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+# Cache of intermediate results on the Cloud.
+#
+# Queries often share subexpressions over the same client data (A+B, then
+# A+B-C), so the result of every operation is kept and reused instead of
+# running ./cloud again. An entry is keyed by the operation and the digests
+# of its two inputs: the version of an operand's ciphertext (its SHA-256, see
+# store.py), or the key of the entry an intermediate result came from. The bit
+# width is carried inside the containers, so the digests cover it.
+#
+# Entries live in the cache directory under the scratch directory, <key>.data
+# with the result and <key>.deps with the digests of the operands it was
+# computed from. Results go in and out as hard links (handoff.link), a cache
+# hit costs no copy. The least recently used ones are removed once the cache grows
+# beyond CACHE_SIZE bytes. Entries computed from a client's earlier ciphertext
+# are removed when the client sends a new one, and all of them when the keys
+# change (a new key epoch) or the layout of the results does.
+import hashlib
+import os
+import threading
+import handoff
+
+USE_CACHE = True
+CACHE_SIZE = 512 * 1024 * 1024
+CACHE_DIR = 'cache'
+KEY_FILES = ['cloud.key', 'nbit.key']
+# Changed along with the layout of the results, which drops the cached ones
+LAYOUT = 'container'
+
+# key -> [size, operand digests], least recently used first
+entries = {}
+# client address -> digest of the last ciphertext it sent
+clients = {}
+epoch = None
+lock = threading.Lock()
+
+
+def path(name):
+    return os.path.join(handoff.path(CACHE_DIR), name)
+
+
+def key_epoch():
+    return ' '.join([LAYOUT] + [str(os.stat(name).st_mtime_ns) for name in KEY_FILES])
+
+
+def key(operator, left, right):
+    return hashlib.sha256(('%d %s %s' % (operator, left, right)).encode()).hexdigest()
+
+
+def remove(k):
+    entries.pop(k, None)
+    for name in (k + '.data', k + '.deps'):
+        try:
+            os.remove(path(name))
+        except FileNotFoundError:
+            pass
+
+
+def load():
+    """Read the entries left by an earlier run, dropping them all if the keys
+    changed since."""
+    global epoch
+    os.makedirs(handoff.path(CACHE_DIR), exist_ok=True)
+    epoch = key_epoch()
+    try:
+        with open(path('epoch')) as e:
+            same_epoch = e.read() == epoch
+    except FileNotFoundError:
+        same_epoch = False
+
+    names = [name for name in os.listdir(handoff.path(CACHE_DIR)) if name.endswith('.data')]
+    names.sort(key=lambda name: os.path.getmtime(path(name)))
+    for name in names:
+        k = name[:-len('.data')]
+        try:
+            with open(path(k + '.deps')) as d:
+                operands = d.read().split()
+            entries[k] = [os.path.getsize(path(name)), operands]
+        except FileNotFoundError:
+            pass
+        if not same_epoch or k not in entries:
+            remove(k)
+
+    with open(path('epoch'), 'w') as e:
+        e.write(epoch)
+
+
+def check_epoch():
+    # New keys make every cached ciphertext useless
+    with lock:
+        if epoch is None or key_epoch() != epoch:
+            for k in list(entries):
+                remove(k)
+            load()
+
+
+def operand(client, d):
+    """Record d, the digest of the ciphertext client sent, and return it.
+    Drops the entries computed from the previous one if it changed."""
+    with lock:
+        old = clients.get(client)
+        if old is not None and old != d:
+            for k, (size, operands) in list(entries.items()):
+                if old in operands:
+                    remove(k)
+        clients[client] = d
+    return d
+
+
+def get(k, filename):
+    """Link the cached result k to filename, False if there is none."""
+    if not USE_CACHE:
+        return False
+    with lock:
+        if k not in entries:
+            return False
+        entries[k] = entries.pop(k)
+        handoff.link(path(k + '.data'), filename)
+        os.utime(path(k + '.data'))
+    return True
+
+
+def put(k, filename, operands):
+    """Keep the result in filename under k, computed from the operand digests
+    in operands."""
+    if not USE_CACHE:
+        return
+    with lock:
+        handoff.link(filename, path(k + '.data'))
+        with open(path(k + '.deps'), 'w') as d:
+            d.write('\n'.join(sorted(operands)))
+        entries.pop(k, None)
+        entries[k] = [os.path.getsize(filename), list(operands)]
+
+        total = sum(size for size, operands in entries.values())
+        for old in list(entries):
+            if total <= CACHE_SIZE:
+                break
+            total -= entries[old][0]
+            remove(old)
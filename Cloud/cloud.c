@@ -4,6 +4,7 @@
 #include <utility>
 #include <tfhe/tfhe.h>
 #include <tfhe/tfhe_io.h>
+#include "container.h"
 #include <stdio.h>
 #include <time.h>
 #include <vector>
@@ -11,8 +12,12 @@
 #include <sys/time.h>
 #include <omp.h>
 #include <fstream>
+#include <string.h>
+#include <unistd.h>
+#include <sys/stat.h>
+#include <sys/socket.h>
+#include <sys/un.h>
 using namespace std;
-ifstream read;
 
 #define T_FILE "averagestandard.txt"
 void add(LweSample *sum, LweSample *carryover, const LweSample *x, const LweSample *y, const LweSample *c, const int32_t nb_bits, const TFheGateBootstrappingCloudKeySet *keyset)
@@ -647,20 +652,77 @@ void mul128(LweSample *result, LweSample *result2,LweSample *result3,LweSample *
 }
 
 
-int main() {
-	// dragonfly_cipher_cloud should have already appended 2 cipherstreams into cloud.data
+// Reads negativity and bit size of an operand. Returns the bit size.
+int32_t read_header(Container* operand, LweSample* negative, LweSample* bit, TFheGateBootstrappingSecretKeySet* nbitkey)
+{
+	const TFheGateBootstrappingParameterSet* nbitparams = nbitkey->params;
+	container_read(operand, SECTION_SIGN, 0, negative, 32, nbitparams);
+	container_read(operand, SECTION_WIDTH, 0, bit, 32, nbitparams);
 
-	printf("Reading the key...\n");
+	// Decrypts bit size
+	int32_t int_bit = 0;
+	for (int i=0; i<32; i++) {
+		int ai = bootsSymDecrypt(&bit[i],nbitkey)>0;
+		int_bit |= (ai<<i); }
+	return int_bit;
+}
 
-	// reads the cloud key from file
-	FILE* cloud_key = fopen("cloud.key", "rb");
-	TFheGateBootstrappingCloudKeySet* bk = new_tfheGateBootstrappingCloudKeySet_fromFile(cloud_key);
-	fclose(cloud_key);
+// Reads the eight limbs and the carry of an operand. The ones it does not
+// have, alice.c exports only as many limbs as the bit size needs, are zeros.
+void read_limbs(Container* operand, LweSample** chunks, LweSample* carry, const TFheGateBootstrappingCloudKeySet* bk)
+{
+	for (int32_t c = 0; c < 8; c++)
+		if (container_read(operand, SECTION_LIMB, c, chunks[c], 32, bk->params) != 0)
+			zero(chunks[c], bk, 32);
+	if (container_read(operand, SECTION_CARRY, 0, carry, 32, bk->params) != 0)
+		zero(carry, bk, 32);
+}
 
-	// reads the nbit key from file
-	FILE* nbit_key = fopen("nbit.key","rb");
-        TFheGateBootstrappingSecretKeySet* nbitkey = new_tfheGateBootstrappingSecretKeySet_fromFile(nbit_key);
-        fclose(nbit_key);
+// Puts the answer compute() wrote to raw, negativity, bit size and eight
+// limbs one after another, into a container in output. Only the limbs its bit
+// size covers are kept, the ones after them hold zeros. An answer that could
+// not be computed (status not 0) has no limbs.
+void package(TFheGateBootstrappingSecretKeySet* nbitkey, const TFheGateBootstrappingParameterSet* params, const char* raw, const char* output, int status)
+{
+	const TFheGateBootstrappingParameterSet* nbitparams = nbitkey->params;
+	LweSample* negative = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
+	LweSample* bit = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
+	LweSample* limb = new_gate_bootstrapping_ciphertext_array(32, params);
+
+	FILE* raw_data = fopen(raw, "rb");
+	for (int i = 0; i<32; i++)
+		import_gate_bootstrapping_ciphertext_fromFile(raw_data, &negative[i], nbitparams);
+	for (int i = 0; i<32; i++)
+		import_gate_bootstrapping_ciphertext_fromFile(raw_data, &bit[i], nbitparams);
+	int32_t int_bit = 0;
+	for (int i=0; i<32; i++) {
+		int ai = bootsSymDecrypt(&bit[i],nbitkey)>0;
+		int_bit |= (ai<<i); }
+
+	FILE* answer_data = fopen(output, "wb");
+	Container answer;
+	container_begin(&answer, answer_data);
+	container_write(&answer, SECTION_SIGN, 0, negative, 32, nbitparams);
+	container_write(&answer, SECTION_WIDTH, 0, bit, 32, nbitparams);
+	for (int32_t c = 0; status == 0 && c < int_bit / 32; c++) {
+		for (int i=0; i<32; i++)
+			import_gate_bootstrapping_ciphertext_fromFile(raw_data, &limb[i], params);
+		container_write(&answer, SECTION_LIMB, c, limb, 32, params);
+	}
+	container_end(&answer);
+	fclose(answer_data);
+	fclose(raw_data);
+	remove(raw);
+
+	delete_gate_bootstrapping_ciphertext_array(32, negative);
+	delete_gate_bootstrapping_ciphertext_array(32, bit);
+	delete_gate_bootstrapping_ciphertext_array(32, limb);
+}
+
+// One operation int_op on the two operand containers, answer written to output.
+int compute(TFheGateBootstrappingCloudKeySet* bk, TFheGateBootstrappingSecretKeySet* nbitkey, int32_t int_op, Container* operand1, Container* operand2, const char* output) {
+
+	int status = 0;
 
 	// if necessary, the params are inside the key
 	const TFheGateBootstrappingParameterSet* params = bk->params;
@@ -697,80 +759,19 @@ int main() {
 	LweSample* ciphertextcarry1 = new_gate_bootstrapping_ciphertext_array(32, params);
 	LweSample* ciphertextcarry2 = new_gate_bootstrapping_ciphertext_array(32, params);
 
+	LweSample* chunks1[8] = {ciphertext1, ciphertext2, ciphertext3, ciphertext4, ciphertext5, ciphertext6, ciphertext7, ciphertext8};
+	LweSample* chunks2[8] = {ciphertext9, ciphertext10, ciphertext11, ciphertext12, ciphertext13, ciphertext14, ciphertext15, ciphertext16};
+
 	printf("Reading input 1...\n");
 
-	// reads ciphertexts from cloud.data
-	FILE* cloud_data = fopen("cloud.data", "rb");
-	for (int i = 0; i<32; i++) // line0
-		import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertextnegative1[i], nbitparams);
-	for (int i = 0; i<32; i++) // line1
-		import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertextbit1[i], nbitparams);
-	
-	// Decrypts bit size1 
-	int32_t int_bit1 = 0;
-    	for (int i=0; i<32; i++) {
-       	int ai = bootsSymDecrypt(&ciphertextbit1[i],nbitkey)>0;
-       	int_bit1 |= (ai<<i); }
-
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext1[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext2[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext3[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext4[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext5[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext6[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext7[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext8[i], params);
-
-	for (int i = 0; i<32; i++) // line10
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertextcarry1[i], params);
+	// only the negativity and bit size of the operands for now
+	int32_t int_bit1 = read_header(operand1, ciphertextnegative1, ciphertextbit1, nbitkey);
 
 	printf("Reading input 2...\n");
 
-	for (int i = 0; i<32; i++) // line11
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertextnegative2[i], nbitparams);
-	for (int i = 0; i<32; i++) // line12
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertextbit2[i], nbitparams);
-
-	// Decrypts bit size2
-	int32_t int_bit2 = 0;
-    	for (int i=0; i<32; i++) {
-       	int ai = bootsSymDecrypt(&ciphertextbit2[i],nbitkey)>0;
-       	int_bit2 |= (ai<<i); }
-
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext9[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext10[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext11[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext12[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext13[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext14[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext15[i], params);
-	for (int i=0; i<32; i++)
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertext16[i], params);
-
-	for (int i = 0; i<32; i++) // line21
-	import_gate_bootstrapping_ciphertext_fromFile(cloud_data, &ciphertextcarry2[i], params);
-	
-	printf("Reading operation code...\n");
+	int32_t int_bit2 = read_header(operand2, ciphertextnegative2, ciphertextbit2, nbitkey);
 	
-	// Get Operation Code from File
-	int32_t int_op;
-   	read.open("operator.txt");
-	read >> int_op;
+	printf("Operation code %d\n", int_op);
 	
 	// Homomorphic encryption to add negative1 and negative2 ciphertexts
 	LweSample* ciphertextnegative = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
@@ -806,7 +807,7 @@ int main() {
 
 
     //export the negative and bit data for the verif
-    FILE* answer_data = fopen("answer.data", "wb");
+    FILE* answer_data = fopen(output, "wb");
 
 	// Write negative to  answer.data
 	int32_t ciphernegative = 0;
@@ -854,15 +855,18 @@ int main() {
     			std::cout << int_bit << " written to answer.data" << "\n";
 	}
 	
-	fclose(cloud_data);
-	
 	// If trying to multiply a 256 bit number
 	if ((int_op == 4) && (int_bit >= 256)){
     		std::cout << "Cannot multiply 256 bit number!" << "\n";
 		fclose(answer_data);
-		return 126;
+		status = 126;
+		goto cleanup;
 	}
 
+	// The operation goes ahead, read the values
+	read_limbs(operand1, chunks1, ciphertextcarry1, bk);
+	read_limbs(operand2, chunks2, ciphertextcarry2, bk);
+
 
 	// Addition
 	//if (the operation is add AND (both numbers are positive OR both numbers are negative)) OR (the operation is subtract AND either number is negative)
@@ -921,16 +925,7 @@ int main() {
 			//Clean up
 			delete_gate_bootstrapping_ciphertext_array(32, result);
 			delete_gate_bootstrapping_ciphertext_array(32, carry1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);	
-
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 		}
 
 		//64 Bit Addition
@@ -983,18 +978,7 @@ int main() {
 			delete_gate_bootstrapping_ciphertext_array(32, result2);
 			delete_gate_bootstrapping_ciphertext_array(32, carry1);
 			delete_gate_bootstrapping_ciphertext_array(32, carry2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 		}
 			
 		//128 Bit Addition
@@ -1059,22 +1043,7 @@ int main() {
 			delete_gate_bootstrapping_ciphertext_array(32, carry2);
 			delete_gate_bootstrapping_ciphertext_array(32, carry3);
 			delete_gate_bootstrapping_ciphertext_array(32, carry4);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext11);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext12);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 		}
 			
 		//256 Bit Addition
@@ -1162,30 +1131,7 @@ int main() {
 			delete_gate_bootstrapping_ciphertext_array(32, carry7);
 			delete_gate_bootstrapping_ciphertext_array(32, carry8);
 				
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext11);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext12);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext13);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext14);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext15);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext16);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 		}
     }
 		
@@ -1285,16 +1231,7 @@ int main() {
 					
 				delete_gate_bootstrapping_ciphertext_array(32, result1);
 					
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);		
-
-				delete_gate_bootstrapping_cloud_keyset(bk);
-				delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 			}
 			
 			//64 Bit Subtraction
@@ -1399,18 +1336,7 @@ int main() {
 				delete_gate_bootstrapping_ciphertext_array(32, result1);
 				delete_gate_bootstrapping_ciphertext_array(32, result2);
 					
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-				delete_gate_bootstrapping_cloud_keyset(bk);
-				delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 			}
 			
 			//128 Bit Subtraction
@@ -1564,22 +1490,7 @@ int main() {
 				delete_gate_bootstrapping_ciphertext_array(32, result3);
 				delete_gate_bootstrapping_ciphertext_array(32, result4);
 					
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext11);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext12);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-				delete_gate_bootstrapping_cloud_keyset(bk);
-				delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 					
 			}
 			
@@ -1769,6 +1680,12 @@ int main() {
 				
 				delete_gate_bootstrapping_ciphertext_array(32, carry1);
 				delete_gate_bootstrapping_ciphertext_array(32, carry2);
+				delete_gate_bootstrapping_ciphertext_array(32, carry3);
+				delete_gate_bootstrapping_ciphertext_array(32, carry4);
+				delete_gate_bootstrapping_ciphertext_array(32, carry5);
+				delete_gate_bootstrapping_ciphertext_array(32, carry6);
+				delete_gate_bootstrapping_ciphertext_array(32, carry7);
+				delete_gate_bootstrapping_ciphertext_array(32, carry8);
 				delete_gate_bootstrapping_ciphertext_array(32, result1);
 				delete_gate_bootstrapping_ciphertext_array(32, result2);
 				delete_gate_bootstrapping_ciphertext_array(32, result3);
@@ -1778,30 +1695,7 @@ int main() {
 				delete_gate_bootstrapping_ciphertext_array(32, result7);
 				delete_gate_bootstrapping_ciphertext_array(32, result8);
 					
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext11);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext12);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext13);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext14);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext15);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext16);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-				delete_gate_bootstrapping_cloud_keyset(bk);
-				delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 			}
     		
     	}
@@ -1881,12 +1775,7 @@ int main() {
 				delete_gate_bootstrapping_ciphertext_array(32, carry1);
 				delete_gate_bootstrapping_ciphertext_array(32, result1);
 							
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
 
-				delete_gate_bootstrapping_cloud_keyset(bk);
-				delete_gate_bootstrapping_secret_keyset(nbitkey);
 						
 				}
 			else if (int_bit == 64){
@@ -1980,18 +1869,7 @@ int main() {
 				delete_gate_bootstrapping_ciphertext_array(32, carry2);
 				delete_gate_bootstrapping_ciphertext_array(32, result1);
 				delete_gate_bootstrapping_ciphertext_array(32, result2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-				delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-				delete_gate_bootstrapping_cloud_keyset(bk);
-				delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 
 				}
 			else if (int_bit == 128){
@@ -2127,22 +2005,7 @@ int main() {
 			delete_gate_bootstrapping_ciphertext_array(32, result3);
 			delete_gate_bootstrapping_ciphertext_array(32, result4);
 			
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 				
 				
 			}
@@ -2326,6 +2189,12 @@ int main() {
 			
 			delete_gate_bootstrapping_ciphertext_array(32, carry1);
 			delete_gate_bootstrapping_ciphertext_array(32, carry2);
+			delete_gate_bootstrapping_ciphertext_array(32, carry3);
+			delete_gate_bootstrapping_ciphertext_array(32, carry4);
+			delete_gate_bootstrapping_ciphertext_array(32, carry5);
+			delete_gate_bootstrapping_ciphertext_array(32, carry6);
+			delete_gate_bootstrapping_ciphertext_array(32, carry7);
+			delete_gate_bootstrapping_ciphertext_array(32, carry8);
 			delete_gate_bootstrapping_ciphertext_array(32, result1);
 			delete_gate_bootstrapping_ciphertext_array(32, result2);
 			delete_gate_bootstrapping_ciphertext_array(32, result3);
@@ -2335,30 +2204,7 @@ int main() {
 			delete_gate_bootstrapping_ciphertext_array(32, result7);
 			delete_gate_bootstrapping_ciphertext_array(32, result8);
 			
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext11);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext12);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext13);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext14);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext15);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext16);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
+
 				
 			}
 		}
@@ -2547,22 +2393,7 @@ int main() {
 			delete_gate_bootstrapping_ciphertext_array(32, carryover14);
 			delete_gate_bootstrapping_ciphertext_array(32, carryover15);
 	
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext11);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext12);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
-	
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
+	
     		
     	}
 		else if (int_bit == 64){
@@ -2634,22 +2465,11 @@ int main() {
 			delete_gate_bootstrapping_ciphertext_array(32, result5);
 			delete_gate_bootstrapping_ciphertext_array(32, result6);
 	
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
 	
 			delete_gate_bootstrapping_ciphertext_array(32, finalresult);
 			delete_gate_bootstrapping_ciphertext_array(32, finalresult2);
 			delete_gate_bootstrapping_ciphertext_array(32, finalresult3);
 	
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
     	
     	}
 		else if (int_bit == 32){
@@ -2703,18 +2523,221 @@ int main() {
 			// clean up all pointers
 			delete_gate_bootstrapping_ciphertext_array(32, result1);
 			delete_gate_bootstrapping_ciphertext_array(32, result2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
 	
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
-			delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
 
-			delete_gate_bootstrapping_cloud_keyset(bk);
-			delete_gate_bootstrapping_secret_keyset(nbitkey);
     	
     	}
     }
+
+	// Every way out of compute() comes here. The arrays of the operands are
+	// freed once, whichever branch ran, as a resident worker runs many
+	// operations in one process. The keys and their params belong to the caller
+cleanup:
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative1);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit1);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertextnegative2);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertextbit2);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext1);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext2);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext3);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext4);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext5);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext6);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext7);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext8);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext9);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext10);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext11);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext12);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext13);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext14);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext15);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertext16);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry1);
+	delete_gate_bootstrapping_ciphertext_array(32, ciphertextcarry2);
+	delete_gate_bootstrapping_ciphertext_array(32, carry1);
+	return status;
+}
+
+// Opens the operand container that segment refers to: a file name, or
+// "<file>@<offset>" for a container that starts at offset inside the file.
+// Returns -1 if there is none.
+int open_operand(Container* operand, const char* segment)
+{
+	std::string name = segment;
+	long offset = 0;
+	size_t at = name.rfind('@');
+	if (at != std::string::npos) {
+		offset = atol(name.c_str() + at + 1);
+		name.resize(at);
+	}
+	FILE* file = fopen(name.c_str(), "rb");
+	if (file == NULL) {
+		printf("Cannot open %s\n", name.c_str());
+		return -1;
+	}
+	fseek(file, offset, SEEK_SET);
+	if (container_open(operand, file) != 0) {
+		fclose(file);
+		return -1;
+	}
+	return 0;
+}
+
+// One operation int_op on the operands left and right, answer written to
+// output. The operands are read where they are, nothing is copied to put them
+// together. Without right, the second operand is the container that follows
+// the first one in left. The keys stay with the caller, so a resident worker
+// loads them only once.
+int operation(TFheGateBootstrappingCloudKeySet* bk, TFheGateBootstrappingSecretKeySet* nbitkey, int32_t int_op, const char* left, const char* right, const char* output) {
+	Container operand1;
+	Container operand2;
+	if (open_operand(&operand1, left) != 0)
+		return 1;
+	std::string next;
+	if (right == NULL) {
+		next = left;
+		next = next.substr(0, next.rfind('@')) + "@" + std::to_string(operand1.start + operand1.header.size);
+		right = next.c_str();
+	}
+	if (open_operand(&operand2, right) != 0) {
+		fclose(operand1.file);
+		return 1;
+	}
+
+	std::string raw = std::string(output) + ".raw";
+	int status = compute(bk, nbitkey, int_op, &operand1, &operand2, raw.c_str());
+	fclose(operand1.file);
+	fclose(operand2.file);
+	if (status == 0 || status == 126)
+		package(nbitkey, bk->params, raw.c_str(), output, status);
+	return status;
+}
+
+// Keys of one key epoch. A new Dragonfly round replaces cloud.key and
+// nbit.key, the worker notices by their modification time and reloads them.
+struct KeyEpoch {
+	TFheGateBootstrappingCloudKeySet* bk;
+	TFheGateBootstrappingSecretKeySet* nbitkey;
+	long long cloud_version;
+	long long nbit_version;
+};
+
+long long key_version(const char* name) {
+	struct stat st;
+	if (stat(name, &st) != 0)
+		return 0;
+	return st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec;
+}
+
+void load_keys(KeyEpoch* keys) {
+	printf("Reading the key...\n");
+
+	// reads the cloud key from file
+	FILE* cloud_key = fopen("cloud.key", "rb");
+	keys->bk = new_tfheGateBootstrappingCloudKeySet_fromFile(cloud_key);
+	fclose(cloud_key);
+
+	// reads the nbit key from file
+	FILE* nbit_key = fopen("nbit.key","rb");
+	keys->nbitkey = new_tfheGateBootstrappingSecretKeySet_fromFile(nbit_key);
+	fclose(nbit_key);
+
+	keys->cloud_version = key_version("cloud.key");
+	keys->nbit_version = key_version("nbit.key");
+}
+
+void free_keys(KeyEpoch* keys) {
+	delete_gate_bootstrapping_cloud_keyset(keys->bk);
+	delete_gate_bootstrapping_secret_keyset(keys->nbitkey);
+}
+
+// Resident worker: loads the keys once per key epoch and takes operations
+// over a Unix domain socket at path. Each request is one line
+// "<operator> <left> <right> <output file>", or "<operator> <input file>
+// <output file>" with both operands in the input file (see operation()),
+// answered with one line holding the status a one-shot ./cloud would have
+// exited with.
+int serve(const char* path) {
+	KeyEpoch keys;
+	load_keys(&keys);
+
+	int sock = socket(AF_UNIX, SOCK_STREAM, 0);
+	struct sockaddr_un addr;
+	memset(&addr, 0, sizeof(addr));
+	addr.sun_family = AF_UNIX;
+	strncpy(addr.sun_path, path, sizeof(addr.sun_path) - 1);
+	unlink(path);
+	if (bind(sock, (struct sockaddr*) &addr, sizeof(addr)) != 0 || listen(sock, 1) != 0) {
+		perror("cloud worker");
+		return 1;
+	}
+	printf("Compute worker listening on %s\n", path);
+	fflush(stdout);
+
+	while (true) {
+		int conn = accept(sock, NULL, NULL);
+		if (conn < 0)
+			continue;
+		FILE* requests = fdopen(conn, "r");
+		FILE* replies = fdopen(dup(conn), "w");
+		char line[1600];
+		char left[512];
+		char right[512];
+		char output[512];
+		int32_t int_op;
+		while (fgets(line, sizeof(line), requests)) {
+			int status = -1;
+			int fields = sscanf(line, "%d %511s %511s %511s", &int_op, left, right, output);
+			if (fields == 3 || fields == 4) {
+				if (key_version("cloud.key") != keys.cloud_version || key_version("nbit.key") != keys.nbit_version) {
+					printf("Keys changed, reloading\n");
+					free_keys(&keys);
+					load_keys(&keys);
+				}
+				if (fields == 4)
+					status = operation(keys.bk, keys.nbitkey, int_op, left, right, output);
+				else
+					status = operation(keys.bk, keys.nbitkey, int_op, left, NULL, right);
+			}
+			fflush(stdout);
+			fprintf(replies, "%d\n", status);
+			fflush(replies);
+		}
+		fclose(requests);
+		fclose(replies);
+	}
+}
+
+int main(int argc, char** argv) {
+	// ./cloud serve <socket>: resident worker, see serve()
+	if (argc == 3 && strcmp(argv[1], "serve") == 0)
+		return serve(argv[2]);
+
+	// ./cloud <operator> <left> <right> <output> or ./cloud <operator> <input>
+	// <output>: one operation on the given files
+	KeyEpoch keys;
+	load_keys(&keys);
+	if (argc == 5 || argc == 4) {
+		int status;
+		if (argc == 5)
+			status = operation(keys.bk, keys.nbitkey, atoi(argv[1]), argv[2], argv[3], argv[4]);
+		else
+			status = operation(keys.bk, keys.nbitkey, atoi(argv[1]), argv[2], NULL, argv[3]);
+		free_keys(&keys);
+		return status;
+	}
+
+	// ./cloud: one operation, operator.txt and cloud.data in, answer.data out
+	// Get Operation Code from File
+	int32_t int_op;
+	ifstream read;
+	read.open("operator.txt");
+	read >> int_op;
+	read.close();
+
+	int status = operation(keys.bk, keys.nbitkey, int_op, "cloud.data", NULL, "answer.data");
+	free_keys(&keys);
+	return status;
 }
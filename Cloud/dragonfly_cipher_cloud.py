@@ -15,6 +15,18 @@ from Cryptodome.Hash import SHA256
 from optparse import *
 import sys
 import select
+import queue
+import threading
+import transfer
+import handoff
+import pool
+import mux
+import transport
+import schedule
+import cache
+import store
+import jobs
+import container
 
 asn1_file = asn1tools.compile_files("declaration.asn")
 
@@ -509,7 +521,7 @@ def decrypting(key, filename):
     return outputFile
 
 
-def handshake():
+def handshake(sock_output):
     #Own MAC address
     own_mac = (':'.join(re.findall('..', '%012x' % uuid.getnode())))
 
@@ -522,7 +534,7 @@ def handshake():
 
     #Send own MAC address, BER encoded to peer
     sock_output.send(own_mac_BER)
-    raw_other_mac = sock_output.recv(1024)
+    raw_other_mac = transfer.recv_pdu(sock_output)
 
     #decode BER and get MAC address from peer
     other_decode_mac = asn1_file.decode('DataMac', raw_other_mac)
@@ -546,7 +558,7 @@ def handshake():
     logger.info('Computing shared secret...\n')
 
     #Received BER encoded Scalar / Element AP
-    scalar_element_ap_encoded = sock_output.recv(1024)
+    scalar_element_ap_encoded = transfer.recv_pdu(sock_output)
     scalar_element_ap_decoded = asn1_file.decode('DataScalarElement', scalar_element_ap_encoded)
     scalar_element_ap = scalar_element_ap_decoded.get('data')
 
@@ -578,7 +590,7 @@ def handshake():
     logger.info('Confirm Exchange...\n')
 
     #Received BER encoded AP Token and decode it
-    apToken_encoded = sock_output.recv(1024)
+    apToken_encoded = transfer.recv_pdu(sock_output)
     apToken_decoded = asn1_file.decode('DataStaAp', apToken_encoded)
     ap_token = apToken_decoded.get('data')
 
@@ -587,7 +599,9 @@ def handshake():
     PMK_Key = sta.confirm_exchange(ap_token)
     #print (PMK_Key)
     # time.sleep(1000)
+    return PMK_Key
 
+def receive_batch(sock_output):
     # Open the received cloud key from the key generator
     # open('OPERATION_AND_BER.hacklab', 'wb') as s:
     #       print ('File opened...\n')
@@ -597,17 +611,16 @@ def handshake():
     #Testing phase
     # buffer_size = 1
 
-    buffer_size = 1024
     while True:
         try:
             #Listening and receive data
-            OPERATION_AND_IP_BER = sock_output.recv(buffer_size)
+            OPERATION_AND_IP_BER = transfer.recv_pdu(sock_output)
 
             print("length of operation and ip", len(OPERATION_AND_IP_BER))
             print("Operation and IP BER", OPERATION_AND_IP_BER)
 
             #Decode BER
-            OPERATION_AND_IP_decoded = asn1_file.decode('DataUserInput', OPERATION_AND_IP_BER)
+            OPERATION_AND_IP_decoded = asn1_file.decode('DataBatch', OPERATION_AND_IP_BER)
         
             #Send success msg to output
             msg = "success"
@@ -620,15 +633,7 @@ def handshake():
             #Print error message
             print("An error occured", sys.exc_info()[0])
 
-            #Empty out data from socket
-            read_con = [sock_output]
-            while True:
-                r, w, e = select.select(read_con, [], [], 0.0)
-                if len(r) == 0:
-                    break
-                else:
-                    for data in r:
-                        data.recv(1024)
+            # recv_pdu() consumed exactly the bad PDU, nothing to empty out
             
             #Testing phase
             # buffer_size = int(input("Size of buffer?"))
@@ -641,815 +646,348 @@ def handshake():
 
     #Print out operation and IP
     print("Operation and IP data", OPERATION_AND_IP_decoded)
+    return OPERATION_AND_IP_decoded
+
+def prepare(job, batch):
+    # Decrypt every query of the batch. Each client's ciphertext is fetched
+    # once, however many operands and queries use it
+    job.clients = []
+    job.queries = []
+    for q, plan in enumerate(batch['queries']):
+        postfixList, clients, opList = decrypt_plan(job, plan)
+        operands = []
+        for CLIENT in clients:
+            if CLIENT not in job.clients:
+                job.clients.append(CLIENT)
+            operands.append(job.operand_file(job.clients.index(CLIENT)))
+
+        # Operands and intermediate results are files, the postfix expression
+        # says which operation reads which. Checked before anything is fetched
+        job.queries.append(schedule.build(postfixList, operands, opList, job.name('query{0}_node'.format(q))))
+
+def serve(job):
+    versions = fetch_operands(job)
+
+    # Results already computed from these ciphertexts are taken from the
+    # cache. A client that sent a new ciphertext invalidates the old ones
+    digests = {}
+    for operand, client in enumerate(job.clients):
+        digests[job.operand_file(operand)] = cache.operand(client, versions[operand])
+
+    # Run the operations of all queries as a graph, independent ones at the
+    # same time, and send every answer as soon as it is ready
+    print("Starting computation process")
+    sender = AnswerThread(job)
+    sender.start()
+    compute_time_start = time.perf_counter()
+    try:
+        schedule.evaluate(job.queries, digests, sender.put)
+    finally:
+        sender.finish()
+    compute_time_stop = time.perf_counter()
+    f = open('timings.txt','a')
+    f.write('\nThe total time elapsed for all computations is: ')
+    f.write(str(round((compute_time_stop - compute_time_start), 3)))
+    f.close()
+    sender.join()
+    if sender.error is not None:
+        raise sender.error
+
+def send_status(job, state, position=0, retry=0):
+    # Tell the output of job how it is doing, on the control stream
+    status = asn1_file.encode('DataJobStatus', {'id': job.id, 'state': state, 'position': position, 'retry': retry})
+    try:
+        job.output_mux.stream(mux.CONTROL).sendall(status)
+    except (ConnectionError, socket.timeout) as conn_error:
+        print('Could not send job status to output', conn_error)
+
+def job_changed(job):
+    send_status(job, job.state, job.position)
+
+def remove_job(job):
+    job.output_mux.close()
+    handoff.remove(*[job.operand_file(operand) for operand in range(len(job.clients))])
+    for query in job.queries:
+        schedule.remove(query)
+
+class SessionThread(threading.Thread):
+    # Takes the batches of the analyst at one output node, one after another,
+    # and queues them as jobs
+    def __init__(self, output_address):
+        threading.Thread.__init__(self)
+        self.output_address = output_address
+
+    def run(self):
+        while True:
+            job = jobs.Job(self.output_address)
 
-    # Define global lists for ipaddresses and operation codes
-    global ipList
-    ipList = []
-
-    global opList
-    opList = []
-
-    global numClList
-    numClList = []
-
-    # Create variables for each ipaddress and operation
-    for k1, v1 in OPERATION_AND_IP_decoded.items():
-        for k2,v2 in v1.items():
-            locals()[k2] = k2
-            print('key',k2)
-    
-    postfix_expr = OPERATION_AND_IP_decoded['postfix']['postfix']
+            # Handshake, query, job status and answers share this connection
+            # as separate streams
+            job.output_mux = mux.Mux(connect(self.output_address))
+            sock_output = job.output_mux.stream(mux.CONTROL)
+            try:
+                job.key = handshake(sock_output)
+                while True:
+                    batch = receive_batch(sock_output)
+                    try:
+                        prepare(job, batch)
+                    except:
+                        # The plan cannot be computed (ValueError from
+                        # schedule.build), the output hears it before the
+                        # session is closed
+                        send_status(job, jobs.FAILED)
+                        raise
+                    if jobs.submit(job):
+                        break
+                    # Queue is full, the output sends the batch again later
+                    print("Job queue full, output", self.output_address[0], "retries in", jobs.RETRY, "s")
+                    send_status(job, jobs.BUSY, retry=jobs.RETRY)
+                job.over.wait()
+                print("Job", job.id, "finished, waiting for the next batch\n")
+            except:
+                print("An error occured", sys.exc_info()[0])
+            remove_job(job)
+
+def read_outputs(filename='outputs.txt'):
+    # Output nodes to serve, one "<ip> <port>" per line of filename. Without
+    # the file only the default output is served
+    try:
+        with open(filename) as f:
+            return [(line.split()[0], int(line.split()[1])) for line in f if line.strip()]
+    except FileNotFoundError:
+        return [("192.168.0.4", 4381)]
+
+def decrypt_plan(job, plan):
+    # Postfix expression, client of every operand and operation codes of one
+    # query, all in postfix order
+    postfix_expr = plan['postfix']
     print('Postfix: ',postfix_expr)
-    p = open('postfix.hacklab', 'wb')
+    p = open(job.name('postfix.hacklab'), 'wb')
     p.write(postfix_expr)
     p.close()
-    decrypting(PMK_Key, 'postfix.hacklab')
-    p = open('postfix', 'r')
+    decrypting(job.key, job.name('postfix.hacklab'))
+    p = open(job.name('postfix'), 'r')
     postfix = str(p.read())
     p.close()
+    os.remove(job.name('postfix'))
+    os.remove(job.name('postfix.hacklab'))
     print("The postfix expression is: ",postfix)
-    global postfixList
     postfixList = " ".join(postfix)
     postfixList = postfixList.split()
     print("POSTFIX LIST", postfixList)
 
-    global flip 
-    flip = False
-    
-    numClList = re.findall("[a-zA-Z]", postfix)
-    sock_output.close()
-
-    # iterate through postfixList to sort alpha char and operators
-    x = 0
-    y = 0
-    for i in postfixList:
-        if (i.isalpha()):
-            CLI = OPERATION_AND_IP_decoded['ipaddress']['ipaddress{0}'.format(x+1)]
-            print("Client :", CLI)
-            c = open("client.hacklab", "wb")
-            c.write(CLI)
-            c.close()
-            decrypting(PMK_Key, 'client.hacklab')
-            c = open("client", "r")
-            CLIENT = c.read()
-            c.close()
-            ipList.append(CLIENT)
-            print(ipList)
-            os.remove('client')
-            os.remove('client.hacklab')
-            x = x + 1
-        else:
-            OPCODE = OPERATION_AND_IP_decoded['operation']['operation{0}'.format(y+1)]
-            print("Opcode:", OPCODE)
-            o = open("opcode.hacklab","wb")
-            o.write(OPCODE)
-            o.close()
-            decrypting(PMK_Key, 'opcode.hacklab')
-            o = open("opcode", "r")
-            OPCODE = o.read()
-            o.close()
-            opList.append(OPCODE)
-            print(opList)
-            os.remove('opcode')
-            os.remove('opcode.hacklab')
-            y = y + 1
-
-            print(len(ipList))
-            if (len(ipList) == 1) or (len(numClList) ==1):
-                print(ipList)
-                compute_final()
-            elif (len(ipList) > 1) and (len(numClList) >1):
-                if (len(ipList) == 2):
-                    flip = True
-                else:
-                    flip = False
-                print(ipList)
-                computation()
-            else:
-                None
-    answer()
-    sys.exit()
-
-##########################################################
-
-def computation():
-    print("ip list",ipList)
-    print("op list",opList)
-    time.sleep(5)
-    
-    # pop the last element of ipList
-    CL_A = ipList.pop()
-    numClList.pop(0)
-
-    time.sleep(5)
+    clients = []
+    for CLI in plan['operands']:
+        print("Client :", CLI)
+        c = open(job.name('client.hacklab'), "wb")
+        c.write(CLI)
+        c.close()
+        decrypting(job.key, job.name('client.hacklab'))
+        c = open(job.name('client'), "r")
+        CLIENT = c.read()
+        c.close()
+        clients.append(CLIENT)
+        os.remove(job.name('client'))
+        os.remove(job.name('client.hacklab'))
 
-    # pop the next last element of ipList
-    CL_B = ipList.pop()
-    numClList.pop(0)
-    cipher((CL_B, 4381))
-    cipher_ab((CL_A, 4381))
-
-    # At this stage cloud.data should contain the ciphertexts from 2 CL
-    compute()
-    
-def cipher(client_address):
+    opList = []
+    for OPCODE in plan['operations']:
+        print("Opcode:", OPCODE)
+        o = open(job.name('opcode.hacklab'),"wb")
+        o.write(OPCODE)
+        o.close()
+        decrypting(job.key, job.name('opcode.hacklab'))
+        o = open(job.name('opcode'), "r")
+        OPCODE = o.read()
+        o.close()
+        opList.append(OPCODE)
+        print(opList)
+        os.remove(job.name('opcode'))
+        os.remove(job.name('opcode.hacklab'))
+    return postfixList, clients, opList
 
-    data_request_time_start = time.perf_counter()
+##########################################################
 
+def connect(client_address):
+    # Open a new socket to the peer as soon as it is listening
+    return transport.wait_connect(client_address, 'bulk')
+
+def fetch_cloud_data(client_address, filename):
+    # Receive cloud.data from the client over its pooled connection into
+    # filename, unless the store already has the version the client holds.
+    # If the link drops mid-transfer, reconnect and resume from the bytes
+    # already persisted in filename.part. Returns the version
+    client = client_address[0]
+    # Other jobs may want the same client, its connection serves them in turn
+    with pool.lock(client_address):
+        return fetch_locked(client_address, client, filename)
+
+def fetch_locked(client_address, client, filename):
     while True:
         try:
-            sockA.connect(client_address)
+            client_sock = pool.request(client_address, 'version')
+            version = asn1_file.decode('DataVersion', transfer.recv_pdu(client_sock)).get('digest').hex()
+            if store.get(client, version, handoff.path(filename)):
+                print('Ciphertext of', client, 'unchanged, taken from the store\n')
+                return version
+            client_sock = pool.request(client_address, 'cloud.data')
+            print ('Receiving cloud data...\n')
+            fsize, width = transfer.recv_file(client_sock, handoff.path(filename))
             break
-        except ConnectionRefusedError as conn_error:
-            print('A connection error has occured')
-            print(conn_error)
-            print('Attempting to connect to client again')
-            time.sleep(5)
-        except KeyboardInterrupt:
-            print('Crtl-C pressed to terminate program')
-            pass
-        except:
-            print('Unexpected error: ',sys.exc_info()[0])
-
-    # Open the cloud data received from client and write to cloud.data
-
-#####
-    BUFFER_SIZE = 1032
-    with open('cloud.data', 'wb') as f:
-        print ('Cloud data file opened...\n')
-    
-        #Size of cloud data
-        while True:
-            try:
-                msg = sockA.recv(BUFFER_SIZE)
-                fsize_decoded = asn1_file.decode("DataFsize", msg)
-                fsize = int(fsize_decoded.get("data"))
-
-                #Send success msg to output
-                msg = "success"
-                sockA.send(msg.encode())
-
-                #Break out of while loop if succeed
-                break
-
-            except:
-                #Print error message
-                print("An error occured", sys.exc_info()[0])
-
-                #Empty out data from socket
-                read_con = [sockA]
-                while True:
-                    r, w, e = select.select(read_con, [], [], 0.0)
-                    if len(r) == 0:
-                        break
-                    else:
-                        for data in r:
-                            data.recv(1024)
-                    
-                #Testing phase
-                # buffer_size = int(input("Size of buffer?"))
-                
-                #Send fail message to output
-                msg = "fail"
-                sockA.send(msg.encode())
-                continue
-
-        #Received size
-        rsize = 0
-
-        # Decode received cloud data from BER
-        while True:
-            try:
-                while True:
-                    print ('Receiving cloud data...\n')
-        
-                    #BER receive data and decode
-                    cloud_data = sockA.recv(BUFFER_SIZE)
-
-                    #Testing phase
-                    # BUFFER_SIZE -=10
-
-                    print("Length of cloud data",len(cloud_data))
-                    #print(cloud_data)
-                    cloud_data_decoded_dict = asn1_file.decode("DataContent", cloud_data)
-                    cloud_data_decoded_raw = cloud_data_decoded_dict.get("data")
-
-                    #Writing data
-                    f.write(cloud_data_decoded_raw)
-
-                    #Send success message to client
-                    msg = "success"
-                    sockA.sendall(msg.encode())
-
-                    #Break occur if all data is received
-                    rsize = rsize + len(cloud_data_decoded_raw)
-                    if rsize >= fsize:
-                        print ('Breaking from file write')
-                        break
-            except:
-                #Print error message
-                print("An error occured:", sys.exc_info()[0])
-
-                #Empty out data from socket
-                read_con = [sockA]
-                while True:
-                    r, w, e = select.select(read_con, [], [], 0.0)
-                    if len(r) == 0:
-                        break
-                    else:
-                        for data in r:
-                            data.recv(1024)
-
-                #Testing phase
-                # BUFFER_SIZE = int(input("sock a, Size of buffer size?\n"))
-
-                #Send fail message to client
-                msg = "fail"
-                sockA.send(msg.encode())
-                continue
-            
-            else:
-                #Break out of while loop
-                if rsize >= fsize:
-                    print ('Received everything.. Breaking out')
-                    break
-#####
-        f.close()
-        print ('Successfully got the file\n')
+        except (ConnectionError, socket.timeout) as conn_error:
+            print('Connection lost during transfer, resuming', conn_error)
+            pool.drop(client_address)
+    print ('Successfully got the file\n')
 
     # Send notice to the client;
     indicator = asn1_file.encode('DataIndicator', {'data':"Hello! cloud.data received"})
 ######
     while True:
-        sockA.send(indicator)
+        client_sock.sendall(indicator)
 
-        #Receive msg
-        encode_msg = sockA.recv(1024)
-        msg = encode_msg.decode()
+        #Receive msg, the pooled connection carries the next request right
+        #after it
+        msg = transfer.recv_status(client_sock)
 
         print(msg)
 
         #if success break
         if (msg == "success"):
             break
-        else:
+        elif (msg == "fail"):
             continue
-######
-    print("Sending an indicator...\n")
-    print('Cloud data file size: ', os.path.getsize('cloud.data'))
-    sockA.close()
-
-    data_request_time_stop = time.perf_counter()
-    global data_request_time1
-    data_request_time1 = round((data_request_time_stop - data_request_time_start), 3)
-    f = open('timings.txt', 'a')
-    f.write('\nThe total time elapsed for data request for client 1 is: ')
-    f.write(str(data_request_time1))
-    f.close
-
-def cipher_ab(client_address):
-    # This function appends to cloud.data instead of overwriting it.
-
-    data_request_time_start2 = time.perf_counter()
-
-    while True:
-        try:
-            sockB.connect(client_address)
-            break
-        except ConnectionRefusedError as conn_error:
-            print('A connection error has occured')
-            print(conn_error)
-            print('Attempting to connect to client again')
-            time.sleep(5)
-        except KeyboardInterrupt:
-            print('Crtl-C pressed to terminate program')
-            pass
-        except:
-            print('Unexpected error: ',sys.exc_info()[0])
-    # Open the cloud data received from client and write to cloud.data
-
-#####
-    BUFFER_SIZE = 1032
-    with open('cloud.data', 'ab') as f:
-        print ('Cloud data file opened...\n')
-       
-        while True:
-            try:
-                msg = sockB.recv(BUFFER_SIZE)
-                fsize_decoded = asn1_file.decode("DataFsize", msg)
-                fsize = int(fsize_decoded.get("data"))
-
-                #Send success
-                msg = "success"
-                sockB.send(msg.encode())
-
-                #Break out of while loop if succeed
-                break
-            
-            except:
-                #Print error message
-                print("An error occured", sys.exc_info()[0])
-
-                #Empty out data from socket
-                read_con = [sockB]
-                while True:
-                    r, w, e = select.select(read_con, [], [], 0.0)
-                    if len(r) == 0:
-                        break
-                    else:
-                        for data in r:
-                            data.recv(1024)
-                    
-                #Testing phase
-                # BUFFER_SIZE = int(input("fSize of buffer?"))
-                
-                #Send fail message to output
-                msg = "fail"
-                sockB.send(msg.encode())
-                continue
-
-        #Received size
-        rsize = 0
-        
-        while True:
-            try:
-                while True:
-                    print ('Receiving cloud data...\n')
-  
-                    #Received BER data and decode
-                    cloud_data = sockB.recv(BUFFER_SIZE)
-
-                    #Testing phase
-                    # BUFFER_SIZE -=10
-
-                    cloud_data_decoded_dict = asn1_file.decode("DataContent", cloud_data)
-                    cloud_data_decoded_raw = cloud_data_decoded_dict.get("data")
-                    
-
-                    #Writing data
-                    f.write(cloud_data_decoded_raw)
-
-                    #Send success message to client
-                    msg = "success"
-                    sockB.sendall(msg.encode())
-
-                    #Break occur if all data is received
-                    rsize = rsize + len(cloud_data_decoded_raw)
-                    if rsize >= fsize:
-                        print ('Breaking from file write')
-                        break
-
-            except:
-                #Print error message
-                print("An error has occured:", sys.exc_info()[0])
-
-                #Empty out data from socket
-                read_con = [sockB]
-                while True:
-                    r, w, e = select.select(read_con, [], [], 0.0)
-                    if len(r) == 0:
-                        break
-                    else:
-                        for data in r:
-                            data.recv(1024)
-
-                #Testing phase
-                # BUFFER_SIZE = int(input("sock a, Size of buffer size?\n"))
-
-                #Send fail message to client
-                msg = "fail"
-                sockB.send(msg.encode())
-                continue
-
-            else:
-                #Break out of while loop
-                if rsize >= fsize:
-                    print ('Received everything.. Breaking out')
-                    break
-
-#####
-        f.close()
-        print ('Successfully got the file\n')
-
-    # Send notice to the client;
-    indicator = asn1_file.encode('DataIndicator', {'data':"Hello! cloud.data received"})
-######
-    while True:
-        sockB.send(indicator)
-
-        #Receive msg
-        encode_msg = sockB.recv(1024)
-        msg = encode_msg.decode()
-
-        print(msg)
-
-        #if success break
-        if (msg == "success"):
-            break
         else:
-            continue
+            # Not a reply to the indicator, do not reuse the connection
+            pool.drop(client_address)
+            raise ConnectionResetError('unexpected reply ' + repr(msg) + ' to the indicator')
 ######
     print("Sending an indicator...\n")
-    print('Cloud data file size: ', os.path.getsize('cloud.data'))
-    sockB.close()
-    data_request_time_stop2 = time.perf_counter()
-    data_request_time2 = round((data_request_time_stop2 - data_request_time_start2), 3)
-    f = open('timings.txt', 'a')
-    f.write('\nThe total time elapsed for data request for client2 is: ')
-    f.write(str(data_request_time2))
-    f.close
-
-
-def cipher2(client_address):
-    data_request_time_start = time.perf_counter()
-    while True:
+    # ./cloud looks its sections up in the index, a file without one would
+    # only fail there. Raises ValueError
+    limbs = container.limbs(handoff.path(filename))
+    print('Cloud data file size: ', fsize, 'for', width, 'bits in', limbs, 'limbs')
+    store.put(client, version, handoff.path(filename))
+    return version
+
+class FetchThread(threading.Thread):
+    # Fetches the operands of one client in turn, over its pooled connection
+    def __init__(self, job, client_address):
+        threading.Thread.__init__(self)
+        self.job = job
+        self.client_address = client_address
+        self.operands = []
+        self.versions = {}
+        self.elapsed = 0
+        self.error = None
+
+    def run(self):
+        data_request_time_start = time.perf_counter()
         try:
-            sock.connect(client_address)
-            break
-        except ConnectionRefusedError as conn_error:
-            print('A connection error has occured')
-            print(conn_error)
-            print('Attempting to connect to client again')
-            time.sleep(5)
-        except KeyboardInterrupt:
-            print('Crtl-C pressed to terminate program')
-            pass
+            for operand in self.operands:
+                self.versions[operand] = fetch_cloud_data(self.client_address, self.job.operand_file(operand))
         except:
-            print('Unexpected error: ',sys.exc_info()[0])
-
-#####
-    BUFFER_SIZE = 1032
-
-    #Testing phase
-    # BUFFER_SIZE = 3
-
-    with open('cloud.data', 'wb') as f:
-        print ('Cloud data file opened...\n')
-        
-        #Size of cloud data
-        while True:
-            try:
-                msg = sock.recv(BUFFER_SIZE)
-                fsize_decoded = asn1_file.decode("DataFsize", msg)
-                fsize = int(fsize_decoded.get("data"))
-
-                #Send success msg to output
-                msg = "success"
-                sock.send(msg.encode())
-
-                #Break out of while loop if succeed
-                break
-            
-            except:
-                #Print error message
-                print("An error occured", sys.exc_info()[0])
-
-                #Empty out data from socket
-                read_con = [sock]
-                while True:
-                    r, w, e = select.select(read_con, [], [], 0.0)
-                    if len(r) == 0:
-                        break
-                    else:
-                        for data in r:
-                            data.recv(1024)
-                
-                #Testing phase
-                # BUFFER_SIZE = int(input("Size of buffer?"))
-                
-                #Send fail message to output
-                msg = "fail"
-                sock.send(msg.encode())
-                continue
-
-        #Received size
-        rsize = 0
-        
-        # Decode received cloud data from BER
-        while True:
-            try:
-                while True:
-                    print ('Receiving cloud data...\n')
-                    
-                    #BER received and decode
-                    cloud_data = sock.recv(BUFFER_SIZE)
-
-                    #Testing phase
-                    # BUFFER_SIZE -=10
-
-                    cloud_data_decoded_dict = asn1_file.decode("DataContent", cloud_data)
-                    cloud_data_decoded_raw = cloud_data_decoded_dict.get("data")
-                    #print(cloud_data)
-
-                    #Writing to file
-                    f.write(cloud_data_decoded_raw)
-
-                    #sending success message to client
-                    msg = "success"
-                    sock.sendall(msg.encode())
-
-                    #Break occur if all data is received
-                    rsize = rsize + len(cloud_data_decoded_raw)
-                    if rsize >= fsize:
-                        print ('Breaking from file write')
-                        break
-            except:
-                #Print error message
-                print("An error occured:", sys.exc_info()[0])
-
-                #Empty out data from socket
-                read_con = [sock]
-                while True:
-                    r, w, e = select.select(read_con, [], [], 0.0)
-                    if len(r) == 0:
-                        break
-                    else:
-                        for data in r:
-                            data.recv(1024)
-
-                #Testing phase
-                # BUFFER_SIZE = int(input("sock a, Size of buffer size?\n"))
-
-                #Send fail message to client
-                msg = "fail"
-                sock.send(msg.encode())
-                continue
-
-            else:
-                #Break out of while loop
-                if rsize >= fsize:
-                    print ('Received everything.. Breaking out')
-                    break
-
-#####
-    f.close()
-    print ('Successfully got the file\n')
-
-    # Send notice to the client;
-    indicator = asn1_file.encode('DataIndicator', {'data':"Hello! cloud.data received"})
-
-######
-    while True:
-        sock.send(indicator)
-        #Receive msg
-        encode_msg = sock.recv(1024)
-        msg = encode_msg.decode()
-
-        print(msg)
-
-        #if success break
-        if (msg == "success"):
-            break
-        else:
-            continue
-######
-    print("Sending an indicator...\n")
-    print('Cloud data file size: ', os.path.getsize('cloud.data'))
-    sock.close()
+            print("An error occured", sys.exc_info()[0])
+            self.error = sys.exc_info()[1]
+        data_request_time_stop = time.perf_counter()
+        self.elapsed = round((data_request_time_stop - data_request_time_start), 3)
+
+def fetch_operands(job):
+    # Fetch the ciphertext of every operand at the same time, one thread per
+    # client. Operand i (job.clients[i]) is kept in its own file,
+    # job.operand_file(i), and read from there when it is computed on.
+    # Returns the version (ciphertext digest) of every operand
+    fetch_time_start = time.perf_counter()
+    threads = {}
+    for operand, client in enumerate(job.clients):
+        if client not in threads:
+            threads[client] = FetchThread(job, (client, 4381))
+        threads[client].operands.append(operand)
+    for thread in threads.values():
+        thread.start()
+    for thread in threads.values():
+        thread.join()
+    fetch_time_stop = time.perf_counter()
 
-    data_request_time_stop = time.perf_counter()
-    data_request_time3 = round((data_request_time_stop - data_request_time_start), 3)
     f = open('timings.txt', 'a')
-    f.write('\nThe total time elapsed for data request for client 3 is: ')
-    f.write(str(data_request_time3))
-    f.close
-
-
-
-def compute():
-    
-    operator = int(opList.pop(0))
-
-    print("Starting computation process")
+    for client, thread in threads.items():
+        f.write('\nThe total time elapsed for data request for client ' + client + ' is: ')
+        f.write(str(thread.elapsed))
+    f.write('\nThe total time elapsed for fetching all operands is: ')
+    f.write(str(round((fetch_time_stop - fetch_time_start), 3)))
+    f.close()
 
-    # NOTE: change the subprocess file as required, when available
-    if operator == 1:
-        o = open('operator.txt', 'w')
-        o.write("1")
-        o.close()
-        compute_time_start = time.perf_counter()
-        # The user has chosen the Addition function
-        # Run C++ Adder_cloud to compute answer
-        subprocess.call("./cloud")
-        print("Printing addition answer data...\n")
-        compute_time_stop = time.perf_counter()
-        compute_time_final = round((compute_time_stop - compute_time_start), 3)
-        f = open('timings.txt','a')
-        f.write('\nComputation time: ')
-        f.write(str(compute_time_final))
-        f.close()
-    elif operator == 2:
-        o = open('operator.txt', 'w')
-        o.write("2")
-        o.close()
-        compute_time_start = time.perf_counter()
-        # The user has chosen the Subtraction function
-        # Run C++ subtract_cloud to compute answer
-        subprocess.call("./cloud")
-        print("Printing subtraction answer data...\n")
-        compute_time_stop = time.perf_counter()
-        compute_time_final = round((compute_time_stop - compute_time_start), 3)
-        f = open('timings.txt','a')
-        f.write('\nComputation time: ')
-        f.write(str(compute_time_final))
-        f.close()
-    elif operator == 3:
-        o = open('operator.txt', 'w')
-        o.write("4") # cloud uses 4 to denote multiplication
-        o.close()
-        compute_time_start = time.perf_counter()
-        # The user has chosen the Multiplication function
-        # Run C++ Multiply_cloud to compute answer
-        subprocess.call("./cloud")
-        print("Printing multiplication answer data...\n")
-        compute_time_stop = time.perf_counter()
-        compute_time_final = round((compute_time_stop - compute_time_start), 3)
-        f = open('timings.txt','a')
-        f.write('\nComputation time: ')
-        f.write(str(compute_time_final))
-        f.close()
-    elif operator == 4:
-        o = open('operator.txt', 'w')
-        o.write("4") # cloud uses 4 to denote multiplication
-        o.close()
-        compute_time_start = time.perf_counter()
-        # The user has chosen the Division function
-        # Run C++ Divide_cloud to compute answer
-        subprocess.call("./cloud")
-        print("Printing Multiplication answer data...\n")
-        compute_time_stop = time.perf_counter()
-        compute_time_final = round((compute_time_stop - compute_time_start), 3)
-        f = open('timings.txt','a')
-        f.write('\nComputation time: ')
-        f.write(str(compute_time_final))
-        f.close()
-    else:
-        None
-
-
-    # Print size of answer.data
-    answer_data = 'answer.data'
-    ans_size = os.path.getsize(answer_data)
-    print("File size of computed answer file: ", ans_size)
-
-    if ans_size <= 162304:
-        answer()
-        sys.exit()
-
-
-def compute_final():
-
-    CL_C = ipList.pop()
-    numClList.pop(0)
-    cipher2((CL_C, 4381))
-    
-    if flip == True:
-        with open('cloud.data', 'rb') as c:
-            cloud = c.read(8192)
-            with open('answer.data', 'ab') as a:
-                while cloud:
-                    a.write(cloud)
-                    cloud = c.read(8192)
-        os.system('cp answer.data cloud.data')
-        os.remove('answer.data')
-        compute()
-
-    else:
-        
-        # copy binary contents of answer.data to append to cloud.data
-        with open('answer.data', 'rb') as a:
-            answer = a.read(8192)
-            with open('cloud.data', 'ab') as c:
-                while answer:
-                    c.write(answer)
-                    answer = a.read(8192)
-        os.remove('answer.data')
-        compute()
-    
-def answer():
+    versions = {}
+    for thread in threads.values():
+        if thread.error is not None:
+            raise thread.error
+        versions.update(thread.versions)
+    return versions
 
-    answer_data = "answer.data"
-    ans_size = os.path.getsize(answer_data)
-    print("This file ", answer_data, "is our computed answer\n")
+class AnswerThread(threading.Thread):
+    # Sends the answers of a job to its output in the order the queries finish
+    def __init__(self, job):
+        threading.Thread.__init__(self)
+        self.job = job
+        self.answers = queue.Queue()
+        self.error = None
 
+    def put(self, query, filename):
+        self.answers.put((query, filename))
 
-    # Open the file and read its content
-    # f = open('answer.data', 'rb')
-    # answer = f.read(8192)
+    def finish(self):
+        self.answers.put((None, None))
 
-    # Open socket connection to OUTPUT to send Answer
-    output_ipaddr = "192.168.0.4"
-    output_address =(output_ipaddr, 4381)
+    def run(self):
+        try:
+            while True:
+                query, filename = self.answers.get()
+                if query is None:
+                    break
+                answer(self.job, query, filename)
+        except:
+            print("An error occured", sys.exc_info()[0])
+            self.error = sys.exc_info()[1]
 
-    sock_output2.connect(output_address)
-    print ("connecting to", output_ipaddr)
+def answer(job, query, filename):
 
-    # Encode ans_size in BER
-    # Send size of answer file to the client
-    # Send answer file to output
-    ans_size = os.path.getsize(answer_data)
-    ans_size_encoded = asn1_file.encode('DataAnsSize', {'data':ans_size})
+    answer_data = handoff.path(filename)
+    print("This file ", answer_data, "is our computed answer to query", query, "\n")
 
+    # Send answer file to output on the answer stream of the connection the
+    # query came in on, behind the id of the query. If the link drops
+    # mid-transfer, reconnect and continue from the checkpoint reported by
+    # the output
+    print("Sending answer...\n")
     while True:
-        sock_output2.send(ans_size_encoded)
-
-        #receive msg
-        encode_msg = sock_output2.recv(1024)
-        msg = encode_msg.decode()
-
-        print(ans_size_encoded)
-
-        #if success, break
-        if (msg == "success"):
+        try:
+            answer_stream = job.output_mux.stream(mux.ANSWER)
+            answer_stream.sendall(asn1_file.encode('DataQueryId', {'id': query}))
+            transfer.send_file(answer_stream, answer_data)
             break
-        else:
-            continue
-  
-    print("Sending answer...\n")
+        except (ConnectionError, socket.timeout) as conn_error:
+            print('Connection lost during transfer, resuming', conn_error)
+            job.output_mux.close()
+            job.output_mux = mux.Mux(connect(job.output_address))
 
-    # Read the final answer file and send it to the OUTPUT
-    # with open('answer.data', 'rb') as f:
-    # answer = f.read(1032)
-
-#####
-    #Get size of answer.data
-    answ_data_size = os.path.getsize("answer.data")
-    print("Size of answer.data is", answ_data_size)
-
-    #set offset value
-    offset_value = 0
-
-    #Testing x value
-    with open('answer.data', 'rb') as f:
-        while True:
-            print("offset",f.tell())
-            #Before offset
-            before_offset = f.tell()
-            answer = f.read(1032)
-
-            #BER encode answer & send
-            answer_encoded = asn1_file.encode('DataAnswer', {'data':answer})
-            sock_output2.sendall(answer_encoded)
-            
-            #after offset
-            after_offset = f.tell()
-
-            #receving msg
-            encode_msg = sock_output2.recv(1024)
-            msg = encode_msg.decode()
-            
-            #success message
-            if (msg == "success"):
-                #close socket if all data send
-                print(answ_data_size)
-                print(after_offset)
-                if (int(after_offset == answ_data_size)):
-                    sock_output2.shutdown(socket.SHUT_RDWR)
-                    sock_output2.close()
-                    break
-                #fail message
-                else:
-                    continue
-            else:
-                #offset differences
-                offset_differences = int(after_offset) - int(before_offset)
-                
-                #offset value
-                offset_value = int(after_offset) - int(offset_differences)
-                f.seek(offset_value)
-
-#####
-    f.close()
     print("File size of computed answer file: ", os.path.getsize(answer_data))
-    os.system("md5sum answer.data")
-    os.remove('answer.data')
-    sock_output2.close()
 
 if __name__ == '__main__':
 
-    sockA = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sockB = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    sock2 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock_output = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock_output2 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-    output_ipaddr = "192.168.0.4"
-    output_address =(output_ipaddr, 4381)
-    while True:
-        try:
-            sock_output.connect(output_address)
-            break
-        except ConnectionRefusedError as conn_error:
-            print('A connection error has occured')
-            print(conn_error)
-            print('Attempting to connect to OUTPUT again')
-            time.sleep(5)
-        except KeyboardInterrupt:
-            print('Crtl-C pressed to terminate program')
-            pass
-        except:
-            print ("connecting to", output_ipaddr)
-
-    handshake()
+    # Keep the operands, intermediate results and answer.data on tmpfs for ./cloud
+    handoff.setup(['cloud.key', 'nbit.key', 'averagestandard.txt'])
+
+    # Output nodes of the analysts, from outputs.txt. Each gets its own
+    # session, which takes one batch at a time, waiting for its answers before
+    # the next. The batches of different outputs are queued and run side by
+    # side, a single output never fills the queue
+    output_addresses = read_outputs()
+    print("Serving outputs", output_addresses)
+
+    # Serve one job after another in this process, so the pooled client
+    # connections are reused by the next one
+    jobs.start(serve, job_changed)
+    sessions = [SessionThread(output_address) for output_address in output_addresses]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
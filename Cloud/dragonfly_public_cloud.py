@@ -23,17 +23,16 @@ import re, uuid
 import base64
 import os
 from collections import namedtuple
-from Cryptodome.Cipher import AES
 from Cryptodome import Random
 import asn1tools
 import sys
+import transfer
+import transport
+import keys
 
 #Compile ASN1 file for Sending of cloud.key
 asn1_file = asn1tools.compile_files('declaration.asn')
 
-#create tcp/ip socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
 #retrieve local hostname
 local_hostname = socket.gethostname()
 
@@ -45,12 +44,7 @@ ip_address = socket.gethostbyname(local_hostname)
 
 #bind socket to port
 server_address = ('192.168.0.3', 4380)
-while True:
-    try:
-        sock.connect(server_address)
-        break
-    except:
-        print('Unexpected error: ',sys.exc_info()[0])
+sock = transport.wait_connect(server_address)
 
 print ("Connecting to %s (%s) with %s" % (local_hostname, local_fqdn, ip_address))
 
@@ -518,26 +512,6 @@ class Peer:
 		return digest
 
 
-def decrypting(key, filename):
-	chunksize = 64 * 1024
-	outputFile = filename.split('.hacklab')[0]
-	
-	with open(filename, 'rb') as infile:
-		filesize = int(infile.read(16))
-		IV = infile.read(16)
-		decryptor = AES.new(key, AES.MODE_CBC, IV)
-		
-		with open(outputFile, 'wb') as outfile:
-			while True:
-				chunk = infile.read(chunksize)
-				if len(chunk) == 0:
-					break
-				outfile.write(decryptor.decrypt(chunk))
-			outfile.truncate(filesize)
-
-	return outputFile
-
-
 def handshake():
 	#Own MAC address
 	own_mac = (':'.join(re.findall('..', '%012x' % uuid.getnode())))
@@ -551,7 +525,7 @@ def handshake():
 
 	#Send own MAC address, BER encoded to peer
 	sock.send(own_mac_BER)
-	raw_other_mac = sock.recv(1024)
+	raw_other_mac = transfer.recv_pdu(sock)
 
 	#decode BER and get MAC address from peer
 	other_decode_mac = asn1_file.decode('DataMac', raw_other_mac)
@@ -575,7 +549,7 @@ def handshake():
 	logger.info('Computing shared secret...\n')
 
 	#Received BER encoded Scalar / Element AP
-	scalar_element_ap_encoded = sock.recv(1024)
+	scalar_element_ap_encoded = transfer.recv_pdu(sock)
 	scalar_element_ap_decoded = asn1_file.decode('DataScalarElement', scalar_element_ap_encoded)
 	scalar_element_ap = scalar_element_ap_decoded.get('data')
 
@@ -608,7 +582,7 @@ def handshake():
 	logger.info('Confirm Exchange...\n')
 
 	#Received BER encoded AP Token and decode it
-	apToken_encoded = sock.recv(1024)
+	apToken_encoded = transfer.recv_pdu(sock)
 	apToken_decoded = asn1_file.decode('DataStaAp', apToken_encoded)
 	ap_token = apToken_decoded.get('data')
 
@@ -617,38 +591,23 @@ def handshake():
 	PMK_Key = sta.confirm_exchange(ap_token)
 	#print (PMK_Key)
 
-	# Open the received cloud key from the key generator
-	with open('cloud.key.hacklab', 'wb') as s, open('nbit.key.hacklab', 'wb') as t:
-		print ('File opened...\n')
-		while True:
-			key_BER = sock.recv(16396, socket.MSG_WAITALL)
-			if (len(key_BER) > 10):
-				keys_decoded = asn1_file.decode('DataKey', key_BER)
-				cloud_key = keys_decoded.get('key')
-				nbit_key = keys_decoded.get('nbit')
-			else:
-				break
-			if not (cloud_key or nbit_key):
-				break
-			s.write(cloud_key)
-			t.write(nbit_key)
-
-
-		s.close()
-		t.close()
-		print ('Successfully got the key files\n')
+	# Receive the encrypted keys from the key generator
+	# and the content key they are encrypted with, see keys.py
+	content_key = keys.recv(sock, PMK_Key, ['cloud.key.hacklab', 'nbit.key.hacklab'])
+	print ('Successfully got the key files\n')
 
 	print ('Encrypted cloudkey file size: ', os.path.getsize('cloud.key.hacklab'))
 	print ('Encrypted nbitkey file size: ', os.path.getsize('nbit.key.hacklab'))
 	print ('Decrypting the files...\n')
 
-	decrypted_cloud_key = decrypting(PMK_Key, 'cloud.key.hacklab')
+	decrypted_cloud_key = keys.decrypt(content_key, 'cloud.key.hacklab')
 	print('Acquired cloud key file size: ', os.path.getsize(decrypted_cloud_key))
-	os.system("md5sum cloud.key")
  
-	decrypted_nbit_key = decrypting(PMK_Key, 'nbit.key.hacklab')
+	decrypted_nbit_key = keys.decrypt(content_key, 'nbit.key.hacklab')
 	print('Acquired nbit key file size: ', os.path.getsize(decrypted_nbit_key))
-	os.system("md5sum nbit.key")
+
+	# Let the key generator know the keys are in place
+	transfer.send_ready(sock, 'keys installed')
 		
 def tests():
 	"""
@@ -671,4 +630,13 @@ def tests():
 
 if __name__ == '__main__':
 	#tests()
-	handshake()
+	while True:
+		try:
+			handshake()
+			break
+		except (ConnectionError, socket.timeout) as conn_error:
+			# Connect again for a new session, the key files continue from
+			# what their .part files hold
+			print('Connection lost during transfer, resuming', conn_error)
+			sock.close()
+			sock = transport.wait_connect(server_address)
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+# Job queue of the Cloud.
+#
+# Every batch an analyst sends from an output node becomes a job. A job holds
+# everything its batch needs (output connection, clients, query trees, file
+# names), so several of them can be served at once: one session thread per
+# output node takes batches in, JOB_WORKERS job threads run them. Their
+# operations share the compute workers of worker.py, sized to the host's
+# cores. An output sends its next batch once it has the answers of the last,
+# so jobs only run side by side, and the queue only fills, when the Cloud
+# serves several outputs (outputs.txt).
+#
+# At most QUEUE_DEPTH jobs wait for a job thread. A batch that arrives when
+# the queue is full is not taken: the output is told the Cloud is busy and to
+# send it again after RETRY seconds.
+#
+# The state of every job (queued, running, done or failed) is sent to its
+# output as it changes and kept in jobs.txt.
+import itertools
+import queue
+import sys
+import threading
+import time
+
+# Jobs run at the same time. Each runs its independent operations in
+# parallel already, so a few are enough to keep the workers busy
+JOB_WORKERS = 2
+QUEUE_DEPTH = 8
+
+# Seconds a busy output waits before sending its batch again
+RETRY = 5
+
+STATUS_FILE = 'jobs.txt'
+# Finished jobs kept in the status file
+HISTORY = 100
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+BUSY = 'busy'
+
+waiting = queue.Queue(maxsize=QUEUE_DEPTH)
+# Job id -> Job, oldest first
+jobs = {}
+ids = itertools.count(1)
+lock = threading.Lock()
+# Called with a job whenever its state changes, set by start()
+notify = None
+
+
+class Job:
+    def __init__(self, output_address):
+        self.id = next(ids)
+        self.output_address = output_address
+        self.output_mux = None
+        self.key = None
+        # Clients of the operands, operand i is read from operand_file(i)
+        self.clients = []
+        # Query trees of the batch, see schedule.py
+        self.queries = []
+        self.state = None
+        # Jobs ahead of this one when it was queued
+        self.position = 0
+        self.submitted = None
+        self.started = None
+        self.finished = None
+        # Set by the job thread when the job is over
+        self.over = threading.Event()
+
+    def name(self, filename):
+        """filename, made unique to this job."""
+        return 'job{0}_{1}'.format(self.id, filename)
+
+    def operand_file(self, operand):
+        return self.name('operand{0}.data'.format(operand))
+
+    def status(self):
+        line = '{0} {1} {2}:{3} {4} queries'.format(self.id, self.state, self.output_address[0],
+                                                    self.output_address[1], len(self.queries))
+        if self.started is not None:
+            line += ', waited ' + str(round(self.started - self.submitted, 3)) + ' s'
+        if self.finished is not None:
+            line += ', ran ' + str(round(self.finished - self.started, 3)) + ' s'
+        return line
+
+
+def report():
+    # Rewrite the status file, called with lock held
+    f = open(STATUS_FILE, 'w')
+    for job in jobs.values():
+        f.write(job.status() + '\n')
+    f.close()
+
+
+def set_state(job, state):
+    with lock:
+        job.state = state
+        if state == RUNNING:
+            job.started = time.perf_counter()
+        elif state in (DONE, FAILED):
+            job.finished = time.perf_counter()
+            done = [old for old in jobs.values() if old.state in (DONE, FAILED)]
+            for old in done[:max(0, len(done) - HISTORY)]:
+                del jobs[old.id]
+        report()
+    print("Job", job.status())
+    if notify is not None:
+        notify(job)
+
+
+def submit(job):
+    """Queue job. Returns False when the queue is full and the job was not
+    taken."""
+    with lock:
+        # Only submit() adds to the queue, so it cannot fill up in between
+        if waiting.full():
+            return False
+        job.submitted = time.perf_counter()
+        job.state = QUEUED
+        job.position = waiting.qsize()
+        jobs[job.id] = job
+        report()
+        print("Job", job.status())
+        # The output hears it is queued before a job thread can start it
+        if notify is not None:
+            notify(job)
+        waiting.put_nowait(job)
+        return True
+
+
+class JobThread(threading.Thread):
+    # Runs queued jobs one after another with run(job)
+    def __init__(self, run):
+        threading.Thread.__init__(self, daemon=True)
+        self.run_job = run
+
+    def run(self):
+        while True:
+            job = waiting.get()
+            set_state(job, RUNNING)
+            try:
+                self.run_job(job)
+                set_state(job, DONE)
+            except:
+                print("An error occured", sys.exc_info()[0])
+                set_state(job, FAILED)
+            job.over.set()
+
+
+def start(run, on_change=None):
+    """Start the job threads, run(job) serves one job. on_change(job) is
+    called when a job is queued, when it starts and when it is over."""
+    global notify
+    notify = on_change
+    for number in range(JOB_WORKERS):
+        JobThread(run).start()
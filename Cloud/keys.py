@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# Key files sent by the key generator.
+#
+# The keys are encrypted once per key version, under a random content key.
+# Each session only sends the content key, wrapped with the Dragonfly key
+# (PMK) of that session. The encrypted key files are therefore the same bytes
+# in every session. A peer whose link dropped connects again, runs a new
+# Dragonfly exchange and its transfers resume from the .part files instead of
+# from zero.
+#
+# An encrypted file is the size of the key as 16 digits, the IV, then AES-CBC
+# of the key padded with spaces to whole blocks.
+import os
+
+from Cryptodome.Cipher import AES
+from Cryptodome import Random
+
+import transfer
+
+CHUNK_SIZE = 64 * 1024
+SUFFIX = '.hacklab'
+
+
+def encrypt(key, filename):
+    """Encrypt filename into filename.hacklab. Returns the new name."""
+    outputFile = filename + SUFFIX
+    filesize = str(os.path.getsize(filename)).zfill(16)
+    IV = Random.new().read(16)
+
+    encryptor = AES.new(key, AES.MODE_CBC, IV)
+    with open(filename, 'rb') as infile:
+        with open(outputFile, 'wb') as outfile:
+            outfile.write(filesize.encode('utf-8'))
+            outfile.write(IV)
+            while True:
+                chunk = infile.read(CHUNK_SIZE)
+                if len(chunk) == 0:
+                    break
+                elif len(chunk) % 16 != 0:
+                    chunk += b' ' * (16 - (len(chunk) % 16))
+                outfile.write(encryptor.encrypt(chunk))
+    return outputFile
+
+
+def decrypt(key, filename):
+    """Decrypt filename, a file made by encrypt(), next to it without the
+    suffix. Returns the new name."""
+    outputFile = filename.split(SUFFIX)[0]
+
+    with open(filename, 'rb') as infile:
+        filesize = int(infile.read(16))
+        IV = infile.read(16)
+        decryptor = AES.new(key, AES.MODE_CBC, IV)
+
+        with open(outputFile, 'wb') as outfile:
+            while True:
+                chunk = infile.read(CHUNK_SIZE)
+                if len(chunk) == 0:
+                    break
+                outfile.write(decryptor.decrypt(chunk))
+            outfile.truncate(filesize)
+    return outputFile
+
+
+def prepare(filenames):
+    """Encrypt the key files of a new key version. Returns the content key and
+    the names of the encrypted files."""
+    content_key = Random.new().read(32)
+    return content_key, [encrypt(content_key, filename) for filename in filenames]
+
+
+def send(connection, session_key, content_key, encrypted):
+    """Send the content key wrapped with session_key, then the encrypted
+    files, each continuing from the checkpoint the peer reports."""
+    IV = Random.new().read(16)
+    wrapped = IV + AES.new(session_key, AES.MODE_CBC, IV).encrypt(content_key)
+    connection.sendall(transfer.asn1_file.encode('DataContent', {'data': wrapped}))
+    for filename in encrypted:
+        transfer.send_file(connection, filename)
+
+
+def recv(connection, session_key, encrypted):
+    """Receive what send() sends into the files named in encrypted. Returns
+    the content key to decrypt them with."""
+    wrapped = transfer.asn1_file.decode('DataContent', transfer.recv_pdu(connection)).get('data')
+    content_key = AES.new(session_key, AES.MODE_CBC, wrapped[:16]).decrypt(wrapped[16:])
+    for filename in encrypted:
+        transfer.recv_file(connection, filename)
+    return content_key
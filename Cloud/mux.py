@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+# Logical streams multiplexed over one connection between two nodes.
+#
+# Every frame carries a stream id, a frame type and a length. DATA frames carry
+# at most MUX_FRAME_SIZE bytes of one stream, so a bulk transfer goes out in
+# small pieces and a control message queued behind it is sent before the rest
+# of the bulk data. Frames are sent in priority order, the control stream
+# first.
+#
+# Flow control is per stream: a sender may have up to STREAM_WINDOW bytes that
+# the application on the other end has not read yet, and the receiver returns
+# credit with WINDOW frames as it reads. A slow reader on one stream does not
+# hold up the others.
+#
+# Streams have the socket methods transfer.py and the BER receive loops use
+# (send, sendall, recv, recv_into, settimeout, getpeername, family), so they
+# can be passed wherever a connected socket was used.
+import itertools
+import queue
+import socket
+import struct
+import threading
+import transfer
+
+# Streams between Cloud and Output
+CONTROL = 1
+ANSWER = 2
+
+MUX_FRAME_SIZE = 16 * 1024
+STREAM_WINDOW = 1024 * 1024
+
+# Frame types
+DATA = 0
+WINDOW = 1
+FIN = 2
+
+# Frame header: stream id, frame type, payload length
+MUX_HEADER = struct.Struct('!HBI')
+CREDIT = struct.Struct('!I')
+
+# Send priorities, lowest first. Credit goes out ahead of everything so a
+# blocked sender is released as soon as possible.
+URGENT = 0
+CONTROL_PRIORITY = 1
+BULK_PRIORITY = 2
+LAST = 3
+
+
+class Stream:
+    def __init__(self, mux, stream_id):
+        self.mux = mux
+        self.stream_id = stream_id
+        self.priority = CONTROL_PRIORITY if stream_id == CONTROL else BULK_PRIORITY
+        self.buffer = bytearray()
+        # Set once the peer has closed the stream or the connection is gone
+        self.closed = False
+        self.credit = STREAM_WINDOW
+        self.consumed = 0
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def getpeername(self):
+        return self.mux.sock.getpeername()
+
+    @property
+    def family(self):
+        return self.mux.sock.family
+
+    def readable(self, timeout=None):
+        with self.mux.lock:
+            return self.mux.lock.wait_for(lambda: self.buffer or self.closed, timeout)
+
+    def recv_into(self, buffer, nbytes=0):
+        view = memoryview(buffer).cast('B')
+        nbytes = nbytes or len(view)
+        with self.mux.lock:
+            if not self.mux.lock.wait_for(lambda: self.buffer or self.closed, self.timeout):
+                raise socket.timeout('timed out')
+            n = min(nbytes, len(self.buffer))
+            # Copy out through a view, slicing the bytearray would copy twice
+            with memoryview(self.buffer) as buffered:
+                view[:n] = buffered[:n]
+            del self.buffer[:n]
+
+            # Hand the space back to the sender
+            self.consumed += n
+            if self.consumed >= STREAM_WINDOW // 2:
+                self.mux.queue(URGENT, self.stream_id, WINDOW, CREDIT.pack(self.consumed))
+                self.consumed = 0
+        return n
+
+    def recv(self, bufsize, flags=0):
+        data = bytearray(bufsize)
+        n = self.recv_into(data)
+        return bytes(data[:n])
+
+    def sendall(self, data):
+        view = memoryview(data).cast('B')
+        pos = 0
+        while pos < len(view):
+            with self.mux.lock:
+                if not self.mux.lock.wait_for(lambda: self.credit > 0 or self.mux.dead, self.timeout):
+                    raise socket.timeout('timed out')
+                if self.mux.dead:
+                    raise ConnectionResetError('connection closed')
+                n = min(self.credit, MUX_FRAME_SIZE, len(view) - pos)
+                self.credit -= n
+            self.mux.queue(self.priority, self.stream_id, DATA, bytes(view[pos:pos + n]))
+            pos += n
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def close(self):
+        # Queued behind this stream's data, so the peer reads everything first
+        self.mux.queue(self.priority, self.stream_id, FIN, b'')
+
+
+class Mux:
+    def __init__(self, sock):
+        self.sock = sock
+        # Frames are small and interleaved, do not let Nagle hold them back
+        if self.sock.family != socket.AF_UNIX:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock = threading.Condition()
+        self.streams = {}
+        self.dead = False
+        self.outgoing = queue.PriorityQueue()
+        self.order = itertools.count()
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.reader.start()
+        self.writer.start()
+
+    def stream(self, stream_id):
+        with self.lock:
+            if stream_id not in self.streams:
+                self.streams[stream_id] = Stream(self, stream_id)
+            return self.streams[stream_id]
+
+    def queue(self, priority, stream_id, kind, payload):
+        # The counter keeps frames of equal priority in the order they were queued
+        self.outgoing.put((priority, next(self.order), stream_id, kind, payload))
+
+    def write_loop(self):
+        try:
+            while True:
+                priority, order, stream_id, kind, payload = self.outgoing.get()
+                if kind is None:
+                    break
+                self.sock.sendall(MUX_HEADER.pack(stream_id, kind, len(payload)) + payload)
+        except OSError:
+            pass
+        self.fail()
+
+    def read_loop(self):
+        # Frames are read into one buffer and copied from there into the
+        # stream, no new objects per frame
+        frame = memoryview(bytearray(MUX_HEADER.size + MUX_FRAME_SIZE))
+        try:
+            while True:
+                transfer.recv_all_into(self.sock, frame[:MUX_HEADER.size])
+                stream_id, kind, length = MUX_HEADER.unpack_from(frame)
+                if length > MUX_FRAME_SIZE:
+                    raise ConnectionResetError('bad mux frame length ' + str(length))
+                payload = frame[MUX_HEADER.size:MUX_HEADER.size + length]
+                transfer.recv_all_into(self.sock, payload)
+                stream = self.stream(stream_id)
+                with self.lock:
+                    if kind == DATA:
+                        stream.buffer += payload
+                    elif kind == WINDOW:
+                        stream.credit += CREDIT.unpack(payload)[0]
+                    elif kind == FIN:
+                        stream.closed = True
+                    self.lock.notify_all()
+        except OSError:
+            pass
+        self.fail()
+
+    def fail(self):
+        with self.lock:
+            self.dead = True
+            for stream in self.streams.values():
+                stream.closed = True
+            self.lock.notify_all()
+
+    def close(self):
+        """Send everything queued so far, then close the connection."""
+        self.queue(LAST, 0, None, b'')
+        self.writer.join()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.fail()
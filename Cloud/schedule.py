@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+# Evaluation of a query as a graph of operations.
+#
+# The postfix expression becomes a tree: every operator is a node whose two
+# inputs are operands or results of other nodes. A node is ready once both
+# its inputs are, and all ready nodes run at the same time on the compute
+# workers (worker.py). In A*B + C*D both products run at once and the sum
+# starts when the later one finishes.
+#
+# Operands and results are files in the scratch directory, a node refers to
+# its inputs by file name. The result of node k is node<k>.data, ./cloud reads
+# the two inputs straight from their files, so chaining operations copies
+# nothing. Any number of operands works, the expression is evaluated with a
+# stack like any postfix one.
+#
+# Before an operation is run its result is looked up in cache.py, and every
+# result computed is added to it.
+#
+# The queries of a batch are evaluated together, their operations share the
+# workers and each answer is handed on as soon as its query is done.
+import queue
+import sys
+import threading
+import time
+import cache
+import container
+import handoff
+import worker
+
+# Operator codes of the query -> operator of ./cloud, which uses 4 to denote
+# multiplication
+CLOUD_OPERATOR = {1: 1, 2: 2, 3: 4, 4: 4}
+OPERATOR_NAME = {1: 'addition', 2: 'subtraction', 3: 'multiplication', 4: 'division'}
+
+
+class Node:
+    def __init__(self, filename, operator=None, left=None, right=None):
+        self.filename = filename
+        self.operator = operator
+        self.left = left
+        self.right = right
+        self.done = operator is None
+        # Cache key of the result and digests of the operands under it, set
+        # when the cache is used
+        self.key = None
+        self.operands = set()
+
+    def operations(self):
+        """Operation nodes of this tree, inputs before the nodes using them."""
+        if self.operator is None:
+            return []
+        return self.left.operations() + self.right.operations() + [self]
+
+    def ready(self):
+        return not self.done and self.left.done and self.right.done
+
+
+class NodeThread(threading.Thread):
+    # Runs one operation and reports back on finished
+    def __init__(self, node, finished):
+        threading.Thread.__init__(self)
+        self.node = node
+        self.finished = finished
+        self.elapsed = 0
+        self.error = None
+        # The result holds no value, ./cloud could not compute it
+        self.failed = False
+
+    def run(self):
+        node = self.node
+        compute_time_start = time.perf_counter()
+        try:
+            print("Starting", OPERATOR_NAME[node.operator], "of", node.left.filename, "and", node.right.filename)
+            # A result left over from an earlier run may share its file with
+            # the cache, ./cloud must not write into it
+            handoff.remove(node.filename)
+            status = worker.run(CLOUD_OPERATOR[node.operator], [node.left.filename, node.right.filename], node.filename)
+            # 126 is a result too, one too large to compute. Anything else
+            # leaves no result file
+            if status not in (0, 126):
+                raise RuntimeError('./cloud failed on ' + node.filename + ' with status ' + str(status))
+            self.failed = container.failed(handoff.path(node.filename))
+        except:
+            print("An error occured", sys.exc_info()[0])
+            self.error = sys.exc_info()[1]
+        compute_time_stop = time.perf_counter()
+        self.elapsed = round((compute_time_stop - compute_time_start), 3)
+        self.finished.put(self)
+
+
+def build(postfix, operands, operators, name='node'):
+    """Tree of the postfix expression, a list of tokens: letters for operands,
+    anything else for operators. The i-th letter is read from the file
+    operands[i], the j-th operator has the code operators[j]. Results are
+    named <name><k>.data, trees evaluated together need different names.
+    Raises ValueError unless every operand and operator is used exactly
+    once."""
+    stack = []
+    leaves = 0
+    nodes = 0
+    for token in postfix:
+        if token.isalpha():
+            if leaves >= len(operands):
+                raise ValueError('more operands in the expression than in the plan')
+            stack.append(Node(operands[leaves]))
+            leaves += 1
+        else:
+            if len(stack) < 2 or nodes >= len(operators):
+                raise ValueError('malformed postfix expression')
+            right = stack.pop()
+            left = stack.pop()
+            node = Node('{0}{1}.data'.format(name, nodes), int(operators[nodes]), left, right)
+            if node.operator not in CLOUD_OPERATOR:
+                raise ValueError('unknown operator ' + str(node.operator))
+            stack.append(node)
+            nodes += 1
+    if len(stack) != 1 or leaves != len(operands) or nodes != len(operators):
+        raise ValueError('malformed postfix expression')
+    return stack[0]
+
+
+def evaluate(roots, digests=None, done=None):
+    """Run every operation of the trees in roots, one per query, as many at
+    once as there are compute workers. Returns the file holding the answer of
+    each query: the result of its root, or the first of its results that
+    reports a failure. done(query, filename) is called as soon as the answer
+    of a query is known, so it can be sent while the others are computed.
+
+    digests maps operand files to the digests of their ciphertexts
+    (cache.operand), without it the cache is not used."""
+    if digests is not None:
+        cache.check_epoch()
+    finished = queue.Queue()
+    answers = [None] * len(roots)
+    # Operation node -> the query it belongs to
+    query = {}
+    pending = []
+    for i, root in enumerate(roots):
+        for node in root.operations():
+            query[node] = i
+            pending.append(node)
+    running = 0
+    error = None
+
+    def decide(i, filename):
+        if answers[i] is None:
+            answers[i] = filename
+            if done is not None:
+                done(i, filename)
+
+    def result(node, failed=False):
+        node.done = True
+        # Inputs that were results of other nodes are not needed any more
+        for child in (node.left, node.right):
+            if child.operator is not None:
+                handoff.remove(child.filename)
+        i = query[node]
+        if node is roots[i] or failed:
+            decide(i, node.filename)
+
+    # A query without operations is answered by its operand
+    for i, root in enumerate(roots):
+        if root.operator is None:
+            decide(i, root.filename)
+
+    try:
+        while True:
+            # Start whatever has its inputs, unless a result already decided
+            # the answer of its query. Cached results may make more nodes
+            # ready
+            ready = [node for node in pending if node.ready() and answers[query[node]] is None]
+            while ready and error is None:
+                for node in ready:
+                    pending.remove(node)
+                    if answers[query[node]] is not None:
+                        continue
+                    if digests is not None:
+                        for child in (node.left, node.right):
+                            if child.operator is None:
+                                child.key = digests[child.filename]
+                                child.operands = {child.key}
+                        node.key = cache.key(CLOUD_OPERATOR[node.operator], node.left.key, node.right.key)
+                        node.operands = node.left.operands | node.right.operands
+                        if cache.get(node.key, handoff.path(node.filename)):
+                            print("Cached", OPERATOR_NAME[node.operator], "of", node.left.filename, "and", node.right.filename)
+                            result(node)
+                            continue
+                    NodeThread(node, finished).start()
+                    running += 1
+                ready = [node for node in pending if node.ready() and answers[query[node]] is None]
+            if running == 0:
+                break
+
+            thread = finished.get()
+            running -= 1
+            node = thread.node
+            if thread.error is not None:
+                error = thread.error
+                continue
+
+            f = open('timings.txt', 'a')
+            f.write('\nComputation time: ')
+            f.write(str(thread.elapsed))
+            f.close()
+
+            if node.key is not None and not thread.failed:
+                cache.put(node.key, handoff.path(node.filename), node.operands)
+            result(node, thread.failed)
+    finally:
+        # Whatever went wrong, wait for the operations still running, so no
+        # thread is left behind writing into the queue
+        while running:
+            finished.get()
+            running -= 1
+
+    if error is not None:
+        raise error
+    return answers
+
+
+def remove(root):
+    """Remove the files of every operation of the tree."""
+    for node in root.operations():
+        handoff.remove(node.filename)
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# The last ciphertext of every client, kept on the Cloud between queries.
+#
+# A client only encrypts its values again when they or its keys change, and
+# reports the SHA-256 of the ciphertext it holds as its version. Before
+# fetching an operand the Cloud asks the client for its version and takes the
+# ciphertext from here when it has that version already, so a client whose
+# data is unchanged costs a version request instead of a full transfer.
+#
+# Ciphertexts live in the store directory under the scratch directory,
+# <client>.data with <client>.version next to it, linked to and from the
+# operand files rather than copied (handoff.link). The least recently used
+# ones are removed once the store grows beyond STORE_SIZE bytes.
+import os
+import threading
+import handoff
+
+USE_STORE = True
+STORE_SIZE = 256 * 1024 * 1024
+STORE_DIR = 'store'
+
+lock = threading.Lock()
+
+
+def path(name):
+    return os.path.join(handoff.path(STORE_DIR), name)
+
+
+def version(client):
+    """Version of the ciphertext held for client, None if there is none."""
+    try:
+        with open(path(client + '.version')) as v:
+            return v.read()
+    except FileNotFoundError:
+        return None
+
+
+def get(client, current, filename):
+    """Link the ciphertext of client to filename if it is version current.
+    Returns False if it has to be fetched."""
+    if not USE_STORE:
+        return False
+    with lock:
+        if version(client) != current or not os.path.exists(path(client + '.data')):
+            return False
+        handoff.link(path(client + '.data'), filename)
+        # Most recently used
+        os.utime(path(client + '.data'))
+    return True
+
+
+def put(client, current, filename):
+    """Keep the ciphertext in filename as version current of client."""
+    if not USE_STORE:
+        return
+    with lock:
+        os.makedirs(handoff.path(STORE_DIR), exist_ok=True)
+        handoff.link(filename, path(client + '.data'))
+        with open(path(client + '.version'), 'w') as v:
+            v.write(current)
+
+        names = [name for name in os.listdir(handoff.path(STORE_DIR)) if name.endswith('.data')]
+        names.sort(key=lambda name: os.path.getmtime(path(name)))
+        total = sum(os.path.getsize(path(name)) for name in names)
+        for name in names:
+            if total <= STORE_SIZE:
+                break
+            total -= os.path.getsize(path(name))
+            for stored in (name, name[:-len('.data')] + '.version'):
+                os.remove(path(stored))
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+# Query planner test for schedule.py.
+#
+# build() turns the postfix expression of a query into a tree of operations.
+# A valid plan of any number of operands gives the tree the expression
+# describes, with every operand read from its own file and every operation
+# writing its own result. A plan whose expression, operands and operators do
+# not fit together raises ValueError before anything is fetched. Runs with
+# pytest or as "python3 test_schedule.py" from any directory.
+import os
+import sys
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+import schedule
+
+
+def shape(node):
+    """The tree as nested (operator, left, right) tuples, operands by file."""
+    if node.operator is None:
+        return node.filename
+    return (node.operator, shape(node.left), shape(node.right))
+
+
+def rejected(postfix, operands, operators):
+    try:
+        schedule.build(postfix.split(), operands, operators)
+    except ValueError:
+        return True
+    return False
+
+
+def test_build_two_products():
+    # A*B + C*D, both products are ready at once
+    root = schedule.build('a b * c d * +'.split(), ['op0', 'op1', 'op2', 'op3'], ['3', '3', '1'], 'query0_node')
+    assert shape(root) == (1, (3, 'op0', 'op1'), (3, 'op2', 'op3'))
+    operations = root.operations()
+    assert [node.filename for node in operations] == ['query0_node0.data', 'query0_node1.data', 'query0_node2.data']
+    assert [node.ready() for node in operations] == [True, True, False]
+
+
+def test_build_chain():
+    # ((A+B)-C)*D/E, every operation waits for the one before
+    operands = ['op{0}'.format(i) for i in range(5)]
+    root = schedule.build('a b + c - d * e /'.split(), operands, ['1', '2', '3', '4'])
+    assert shape(root) == (4, (3, (2, (1, 'op0', 'op1'), 'op2'), 'op3'), 'op4')
+    assert len(root.operations()) == 4
+    assert [node.ready() for node in root.operations()] == [True, False, False, False]
+
+
+def test_build_single_operand():
+    # A query of one operand has no operations, its answer is the operand
+    root = schedule.build(['a'], ['op0'], [])
+    assert root.operator is None and root.done
+    assert root.operations() == []
+
+
+def test_build_malformed():
+    # Operator without two inputs
+    assert rejected('a +', ['op0'], ['1'])
+    assert rejected('a b + +', ['op0', 'op1'], ['1', '1'])
+    # Operands left over on the stack
+    assert rejected('a b', ['op0', 'op1'], [])
+    assert rejected('a b c +', ['op0', 'op1', 'op2'], ['1'])
+    # Plan and expression disagree on the number of operands or operators
+    assert rejected('a b +', ['op0'], ['1'])
+    assert rejected('a b +', ['op0', 'op1', 'op2'], ['1'])
+    assert rejected('a b +', ['op0', 'op1'], [])
+    assert rejected('a b +', ['op0', 'op1'], ['1', '2'])
+    # Operator code ./cloud does not know
+    assert rejected('a b +', ['op0', 'op1'], ['9'])
+    assert rejected('', [], [])
+
+
+if __name__ == '__main__':
+    test_build_two_products()
+    test_build_chain()
+    test_build_single_operand()
+    test_build_malformed()
+    print('Schedule test passed')
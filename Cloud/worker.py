@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+# Resident TFHE compute workers.
+#
+# Started as "./cloud serve <socket>", the binary reads cloud.key and nbit.key
+# once and then takes operations over a Unix domain socket in the scratch
+# directory, instead of loading the keys again for every operation. It reloads
+# them when a new Dragonfly round replaces the key files (a new key epoch).
+#
+# A request is one line "<operator> <left> <right> <output file>", the reply
+# one line with the status ./cloud would have exited with. The operands are
+# read where they are, a file name or "<file>@<offset>" for a container inside
+# a file, so nothing is copied to put them together. A single input holds both
+# operands one after the other. When a worker cannot be started or dies, its
+# operations fall back to a one-shot "./cloud <operator> <inputs> <output>".
+#
+# There are WORKERS of them, so independent operations of one query (see
+# schedule.py) run at the same time. run() may be called from several
+# threads, each call waits for a free worker.
+import atexit
+import os
+import queue
+import socket
+import subprocess
+import time
+import handoff
+
+USE_WORKER = True
+BINARY = './cloud'
+
+# Every operation runs on two OpenMP threads (see cloud.c)
+WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Seconds to wait for a worker to listen after starting it
+START_TIMEOUT = 30
+
+
+class Worker:
+    def __init__(self, number):
+        self.socket_name = 'cloud{0}.sock'.format(number)
+        self.resident = USE_WORKER
+        self.process = None
+        self.connection = None
+        self.replies = None
+
+    def start(self):
+        """Start the worker in the scratch directory and connect to it.
+        Returns False, and runs one-shot from then on, when it does not come
+        up."""
+        path = handoff.path(self.socket_name)
+        if os.path.exists(path):
+            os.remove(path)
+        self.process = subprocess.Popen([os.path.abspath(BINARY), 'serve', self.socket_name], cwd=handoff.work_dir)
+
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline and self.process.poll() is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+                self.connection = sock
+                self.replies = sock.makefile('r')
+                return True
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                time.sleep(0.05)
+
+        print("Compute worker did not start, running", BINARY, "per operation")
+        self.stop()
+        self.resident = False
+        return False
+
+    def stop(self):
+        if self.connection is not None:
+            self.replies.close()
+            self.connection.close()
+            self.connection = self.replies = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+                self.process.wait()
+            self.process = None
+            handoff.remove(self.socket_name)
+
+    def run(self, operator, inputs, output):
+        if not self.resident or (self.connection is None and not self.start()):
+            return run_once(operator, inputs, output)
+        try:
+            self.connection.sendall(('%d %s %s\n' % (operator, ' '.join(inputs), output)).encode())
+            reply = self.replies.readline()
+            if not reply:
+                raise ConnectionResetError('compute worker closed the connection')
+            return int(reply)
+        except (OSError, ValueError) as worker_error:
+            print("Compute worker failed, restarting it", worker_error)
+            self.stop()
+            return run_once(operator, inputs, output)
+
+
+def run_once(operator, inputs, output):
+    return subprocess.call([os.path.abspath(BINARY), str(operator)] + list(inputs) + [output], cwd=handoff.work_dir)
+
+
+# Workers not running an operation right now
+workers = [Worker(number) for number in range(WORKERS)]
+idle = queue.Queue()
+for w in workers:
+    idle.put(w)
+
+
+def run(operator, inputs=('cloud.data',), output='answer.data'):
+    """Apply operator to the operands in inputs, the left and the right one or
+    a single file with both, writing output (all in the scratch directory).
+    Returns the status of the operation."""
+    w = idle.get()
+    try:
+        return w.run(operator, inputs, output)
+    finally:
+        idle.put(w)
+
+
+def stop():
+    for w in workers:
+        w.stop()
+
+
+atexit.register(stop)
@@ -24,23 +24,19 @@ import base64
 import os, random, struct
 import subprocess
 from collections import namedtuple
-from Cryptodome.Cipher import AES
-from Cryptodome import Random
 from Cryptodome.Hash import SHA256
 from optparse import *
 from _thread import *
 import asn1tools
 import threading
 import sys
-
-lock = threading.Lock()
+import transfer
+import transport
+import keys
 
 #Compile asn1 file for secret_key
 asn1_file = asn1tools.compile_files('declaration.asn')
 
-#create tcp/ip socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
 #retrieve local hostname
 local_hostname = socket.gethostname()
 
@@ -59,8 +55,8 @@ print ("Working on %s (%s) with %s" % (local_hostname, local_fqdn, ip_address))
 #bind socket to port
 server_address = ('192.168.0.3', 4380)
 print ("Starting up on %s port %s" % server_address)
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(server_address)
+# Peers are told apart by IP address, so tcp/ip only
+sock = transport.Listener(server_address, uds=False)
 
 logger = logging.getLogger('dragonfly')
 logger.setLevel(logging.INFO)
@@ -538,36 +534,27 @@ Curve-ID: brainpoolP256r1
         digest = H.digest()
         return digest
 
-def encrypting(key, filename):
-    chunksize = 64*1024
-    outputFile = filename+".hacklab"
-    filesize = str(os.path.getsize(filename)).zfill(16)
-    IV = Random.new().read(16)
-
-    encryptor = AES.new(key, AES.MODE_CBC, IV)
-    with open(filename, 'rb') as infile:
-        with open(outputFile, 'wb') as outfile:
-            outfile.write(filesize.encode('utf-8'))
-            outfile.write(IV)
-            while True:
-                chunk = infile.read(chunksize)
-                if len(chunk) == 0:
-                    break
-                elif len(chunk) % 16 != 0:
-                    chunk += b' ' * (16 - (len(chunk) % 16))
-                outfile.write(encryptor.encrypt(chunk))
-
-    return outputFile
-
 class ClientThread(threading.Thread):
-    def __init__(self,connection,clientAddr, dragonfly_start):
+    def __init__(self,connection,clientAddr, dragonfly_start, content_key, encrypted):
         threading.Thread.__init__(self)
         self.clientAddr = clientAddr
         self.dragonfly_start = dragonfly_start
         self.connection = connection
+        # Content key and key files encrypted with it, see keys.py
+        self.content_key = content_key
+        self.encrypted = encrypted
+        # Set once the peer has its keys, a peer whose link dropped connects
+        # again
+        self.installed = False
         print("Connection coming from", connection)
 
     def run(self):
+        try:
+            self.send_keys()
+        except (ConnectionError, socket.timeout) as conn_error:
+            print('Connection to', self.clientAddr, 'lost, waiting for it to resume', conn_error)
+
+    def send_keys(self):
         #Own mac address
         own_mac = (':'.join(re.findall('..', '%012x' % uuid.getnode())))
 
@@ -581,7 +568,7 @@ class ClientThread(threading.Thread):
         # print ("Connecting from", client_address)
 
         with self.connection:
-            raw_other_mac = self.connection.recv(1024)
+            raw_other_mac = transfer.recv_pdu(self.connection)
 
             #decode BER and get MAC address
             other_decode_mac = asn1_file.decode('DataMac', raw_other_mac)
@@ -612,7 +599,7 @@ class ClientThread(threading.Thread):
             logger.info('Computing shared secret...\n')
 
             #received BER encoded scalar / element and decoded
-            scalar_element_ap_encoded= self.connection.recv(1024)
+            scalar_element_ap_encoded = transfer.recv_pdu(self.connection)
             scalar_element_ap_decoded = asn1_file.decode('DataScalarElement', scalar_element_ap_encoded)
             scalar_element_ap = scalar_element_ap_decoded.get('data')
 
@@ -646,7 +633,7 @@ class ClientThread(threading.Thread):
             logger.info('Confirm Exchange...\n')
 
             #Received BER encoded STA token and decode it
-            staToken_encoded = self.connection.recv(1024)
+            staToken_encoded = transfer.recv_pdu(self.connection)
             staToken_decoded = asn1_file.decode('DataStaAp', staToken_encoded)
             sta_token = staToken_decoded.get('data')
 
@@ -662,7 +649,6 @@ class ClientThread(threading.Thread):
             KeyExchangeTiming.close()
             # Sending keys to OUTPUT and CLIENTs
             print ("Getting keys...\n")
-            lock.acquire()
             
             print("Printing secret key...\n")
             secret_key = "secret.key"
@@ -677,49 +663,29 @@ class ClientThread(threading.Thread):
             #checkSize.write('\n256-bit Hashed Shared Secret Key Size for' + str(self.connection) + ': ' + str(sys.getsizeof(PMK_Key)))
             #checkSize.write(str('\n========================================'))
             #checkSize.close()
-            encrypt_start = time.perf_counter()
+            transmit_start = time.perf_counter()
             
             transitionDelay = open('delay.txt', 'a')
-            delay_time_total = round((encrypt_start - dragonfly_stop), 3)
-            transitionDelay.write('\nTransition Delay between shared session and encryption' + str(self.connection) + ': ')
+            delay_time_total = round((transmit_start - dragonfly_stop), 3)
+            transitionDelay.write('\nTransition Delay between shared session and sending of keys' + str(self.connection) + ': ')
             transitionDelay.write(str(delay_time_total))
             transitionDelay.close()
             
-            
-            output_secret_key = encrypting(PMK_Key, secret_key)
+            # The key files were encrypted once for this key version, only
+            # the content key is wrapped with this session's PMK
+            output_secret_key, output_nbit_key = self.encrypted
             print("This file ", output_secret_key, " is encrypted secret key\n")
-            
-            output_nbit_key = encrypting(PMK_Key, nbit_key)
             print("This file ", output_nbit_key, " is encrypted nbit key\n")
-            #end of encryption
-            encrypt_stop = time.perf_counter()
-
-            s = open(output_secret_key, "rb")
-            keycontent = s.read(8192)
-
-            t = open(output_nbit_key, "rb")
-            nbitcontent = t.read(8192)
-
-            #Encode key in BER format
-            priv_key_BER = asn1_file.encode('DataKey', {'key': keycontent, 'nbit': nbitcontent})
-
-            # Send the BER encoded file to the peer
-            while (keycontent and nbitcontent):
-                self.connection.sendall(priv_key_BER)
-                keycontent = s.read(8192)
-                nbitcontent = t.read(8192)
-                priv_key_BER = asn1_file.encode('DataKey', {'key': keycontent, 'nbit': nbitcontent})
-            s.close()
-            t.close()
+
+            # Send the content key and the encrypted keys to the peer,
+            # continuing each file from the checkpoint the peer reports
+            keys.send(self.connection, PMK_Key, self.content_key, self.encrypted)
             #end of sending encrypted keys to peer
             transmission_encrypt_stop = time.perf_counter()
             
-            #writing time taken to generate shared key between keygen and client
+            #writing time taken to send the keys between keygen and client
             transmitEncryptTime = open('encryptTime.txt', 'a')
-            encrypt_time_total = round((encrypt_stop - encrypt_start), 3)
-            transmit_total = round((transmission_encrypt_stop - encrypt_stop), 3)
-            transmitEncryptTime.write('\nTotal Time Taken to encrypt keys' + str(self.connection) + ': ')
-            transmitEncryptTime.write(str(encrypt_time_total))
+            transmit_total = round((transmission_encrypt_stop - transmit_start), 3)
             transmitEncryptTime.write('\nTotal Time taken to send encrypted key to' + str(self.connection) + ': ')
             transmitEncryptTime.write(str(transmit_total))
             transmitEncryptTime.write(str('\n========================================'))
@@ -727,9 +693,7 @@ class ClientThread(threading.Thread):
             
             
             print ('Encrypted secret key file size: ', os.path.getsize(output_secret_key))
-            os.system("md5sum secret.key")
             print ('Encrypted nbit key file size: ', os.path.getsize(output_nbit_key))
-            os.system("md5sum nbit.key")
             
             #(Transition delay)
             delay_time = time.perf_counter()
@@ -740,7 +704,10 @@ class ClientThread(threading.Thread):
             transitionDelay2.write(str(delay_time_total2))
             transitionDelay2.close()
 
-            lock.release()
+            # The peer reports back once it has decrypted the keys
+            transfer.recv_ready(self.connection, 'keys installed')
+            self.installed = True
+            print("Keys installed on", self.clientAddr)
 
 def handshake():
     HOSTUP1 = True if os.system("ping -c 2 192.168.0.21 > /dev/null 2>&1") == 0 else False
@@ -763,21 +730,38 @@ def handshake():
     #f.write('\n========================================\n')
     #f.close()
 
+    # Encrypt the keys once for every peer and every reconnect, see keys.py
+    encrypt_start = time.perf_counter()
+    content_key, encrypted = keys.prepare(["secret.key", "nbit.key"])
+    encrypt_stop = time.perf_counter()
+    transmitEncryptTime = open('encryptTime.txt', 'a')
+    transmitEncryptTime.write('\nTotal Time Taken to encrypt keys: ')
+    transmitEncryptTime.write(str(round((encrypt_stop - encrypt_start), 3)))
+    transmitEncryptTime.close()
+
+    threads = []
     while True:
         dragonfly_start = time.perf_counter()
-        sock.listen()
         connection, client_address = sock.accept()
         threading_name = str(hostup)
         if (client_address[0]) == "192.168.0.4" and position == 1:
-            newThread = ClientThread(connection, client_address, dragonfly_start)
+            newThread = ClientThread(connection, client_address, dragonfly_start, content_key, encrypted)
             newThread.start()
+            threads.append(newThread)
             hostup -= 1
             position = 0
         elif hostup != 0 and position == 0 and (client_address[0]) != "192.168.0.1":
-            newThread = ClientThread(connection, client_address, dragonfly_start)
+            newThread = ClientThread(connection, client_address, dragonfly_start, content_key, encrypted)
             newThread.start()
+            threads.append(newThread)
             hostup -=1
-        elif hostup == 0:
+        else:
+            connection.close()
+            continue
+
+        if hostup == 0:
+            # Every peer that is up has connected, stop accepting right away
+            # instead of waiting for one more connection
             position = 1
             #f = open('timings.txt', 'a')
             #dragon_time_stop = time.perf_counter()
@@ -785,10 +769,18 @@ def handshake():
             #f.write('\ndragon_time + alice:')
             #f.write(str(dragon_time_total))
             #f.close()
-            break
-        else:
-            connection.close()
-            continue
+
+            # Done once every peer has reported its keys installed. A peer
+            # whose link dropped connects again and resumes its keys
+            for thread in threads:
+                thread.join()
+            dropped = [thread for thread in threads if not thread.installed]
+            if not dropped:
+                break
+            threads = []
+            hostup = len(dropped)
+            # The output is taken first, as at the start
+            position = 1 if any(thread.clientAddr[0] == "192.168.0.4" for thread in dropped) else 0
 
 
 def tests():
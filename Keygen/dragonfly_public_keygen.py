@@ -25,18 +25,16 @@ import base64
 import os, random, struct
 import subprocess
 from collections import namedtuple
-from Cryptodome.Cipher import AES
-from Cryptodome import Random
 from Cryptodome.Hash import SHA256
 from optparse import *
 import asn1tools
+import transfer
+import transport
+import keys
 
 #Compile asn1 file for cloud_key
 asn1_file = asn1tools.compile_files('declaration.asn')
 
-#create tcp/ip socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
 #retrieve local hostname
 local_hostname = socket.gethostname()
 
@@ -52,8 +50,8 @@ print ("Working on %s (%s) with %s" % (local_hostname, local_fqdn, ip_address))
 #bind socket to port
 server_address = ('192.168.0.3', 4380)
 print ("Starting up on %s port %s" % server_address)
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(server_address)
+# Peers are told apart by IP address, so tcp/ip only
+sock = transport.Listener(server_address, uds=False)
 
 logger = logging.getLogger('dragonfly')
 logger.setLevel(logging.INFO)
@@ -529,27 +527,6 @@ def encrypt(raw, PMK):
         cipher = AES.new(PMK, AES.MODE_CBC, iv)
         return base64.b64encode(iv + cipher.encrypt(raw))
 '''
-def encrypting(key, filename):
-        chunksize = 64*1024
-        outputFile = filename+".hacklab"
-        filesize = str(os.path.getsize(filename)).zfill(16)
-        IV = Random.new().read(16)
-
-        encryptor = AES.new(key, AES.MODE_CBC, IV)
-        with open(filename, 'rb') as infile:
-            with open(outputFile, 'wb') as outfile:
-                outfile.write(filesize.encode('utf-8'))
-                outfile.write(IV)
-                while True:
-                    chunk = infile.read(chunksize)
-                    if len(chunk) == 0:
-                        break
-                    elif len(chunk) % 16 != 0:
-                        chunk += b' ' * (16 - (len(chunk) % 16))
-                    outfile.write(encryptor.encrypt(chunk))
-
-        return outputFile
-    
 def handshake():
     #Own MAC address
     own_mac = (':'.join(re.findall('..', '%012x' % uuid.getnode())))
@@ -558,187 +535,179 @@ def handshake():
     own_mac_BER = asn1_file.encode('DataMac', {'data': own_mac})
 
     print ("My own MAC",own_mac)
-    ap = Peer('abc1238', own_mac, 'AP')
 
-    logger.info('Starting hunting and pecking to derive PE...\n')
+    # Encrypt the keys once, for the first session and any reconnect, see
+    # keys.py
+    encrypt_start = time.perf_counter()
+    content_key, encrypted = keys.prepare(["cloud.key", "nbit.key"])
+    encrypt_stop = time.perf_counter()
+    transmitEncryptTime = open('encryptTime.txt', 'a')
+    transmitEncryptTime.write('\nTotal Time Taken to encrypt keys: ')
+    transmitEncryptTime.write(str(round((encrypt_stop - encrypt_start), 3)))
+    transmitEncryptTime.close()
 
     # Connect to the cloud server
     while True:
         print("Waiting for cloud")
         dragonfly_start = time.perf_counter()
-        sock.listen(1)
         connection, client_address = sock.accept()
         if (client_address[0]) != '192.168.0.1':
             connection.close()
             continue
         else:
-            sock.close()
-            with connection:
-                print ("Connecting from", client_address)
-                raw_other_mac = connection.recv(1024)
+            try:
+                with connection:
+                    print ("Connecting from", client_address)
+                    ap = Peer('abc1238', own_mac, 'AP')
+
+                    logger.info('Starting hunting and pecking to derive PE...\n')
+                    raw_other_mac = transfer.recv_pdu(connection)
 
-                #decode BER and get MAC address
-                other_decode_mac = asn1_file.decode('DataMac', raw_other_mac)
-                other_mac = other_decode_mac.get('data')
+                    #decode BER and get MAC address
+                    other_decode_mac = asn1_file.decode('DataMac', raw_other_mac)
+                    other_mac = other_decode_mac.get('data')
 
-                #Send MAC address to peer
-                connection.send(own_mac_BER)
-                print ("Other MAC: ",other_mac)
+                    #Send MAC address to peer
+                    connection.send(own_mac_BER)
+                    print ("Other MAC: ",other_mac)
 
-                ap.initiate(other_mac)
+                    ap.initiate(other_mac)
 
-                print()
-                logger.info('Starting dragonfly commit exchange...\n')
+                    print()
+                    logger.info('Starting dragonfly commit exchange...\n')
 
-                scalar_ap, element_ap = ap.commit_exchange()
+                    scalar_ap, element_ap = ap.commit_exchange()
             
-                #BER encode scalar_ap / element_ap 
-                scalar_complete = ("\n".join([str(scalar_ap), str(element_ap)]))
-                scalar_element_BER = asn1_file.encode('DataScalarElement',{'data': scalar_complete})
-                
-                #Scalar / element send
-                print('Scalar / element data send', scalar_complete)
-
-                #Send Scalar / element ap data
-                connection.sendall(scalar_element_BER)
-                print()
-                logger.info('Computing shared secret...\n')
-
-                #Scalar / element BER encoded received and decoded
-                scalar_element_ap_encoded= connection.recv(1024)
-                scalar_element_ap_decoded = asn1_file.decode('DataScalarElement', scalar_element_ap_encoded)
-                scalar_element_ap = scalar_element_ap_decoded.get('data')
-
-                print('scalar element received', scalar_element_ap)
-
-                # scalar_element_ap = connection.recv(1024).decode()
-                data = scalar_element_ap.split('\n')
-                # print (data[0])
-                # print (data[1])
-                scalar_sta = data[0]
-                element_sta = data[1]
-                print()
-                print ('Scalar_sta received:',scalar_sta)
-                print()
-                print ('Element_sta received:',element_sta)
-                print ()
-                print ()
-                namedtuple_element_sta = eval(element_sta)
-                print(namedtuple_element_sta.y, namedtuple_element_sta.x)
-                print ()
-                print ()
-                ap_token = ap.compute_shared_secret(namedtuple_element_sta, int(scalar_sta), other_mac)
-                
-                #Encode ap_token to be BER and send to peer
-                apToken_encoded = asn1_file.encode('DataStaAp',{'data':ap_token})
-                connection.send(apToken_encoded)
+                    #BER encode scalar_ap / element_ap 
+                    scalar_complete = ("\n".join([str(scalar_ap), str(element_ap)]))
+                    scalar_element_BER = asn1_file.encode('DataScalarElement',{'data': scalar_complete})
                 
-                print("ap_token data being send over", ap_token)
-
-                print()
-                logger.info('Confirm Exchange...\n')
-
-                #Received BER encoded STA token and decode it
-                staToken_encoded = connection.recv(1024)
-                staToken_decoded = asn1_file.decode('DataStaAp', staToken_encoded)
-                sta_token = staToken_decoded.get('data')
-
-                print('received STA token', sta_token)
-
-                PMK_Key = ap.confirm_exchange(sta_token)
-                #print (PMK_Key)
-                dragonfly_stop = time.perf_counter()
-                #Writing time taken to generate PMK between keygen and cloud
-                keyExchangeTimingCloud = open('time.txt', 'a')
-                dragonfly_time_total = round((dragonfly_stop - dragonfly_start), 3)
-                keyExchangeTimingCloud.write('\nTotal Time Taken to Generate Shared Secret Temporal Key for' + str(connection) + ': ')
-                keyExchangeTimingCloud.write(str(dragonfly_time_total))
-                keyExchangeTimingCloud.close()
-                # First let us encrypt secret message
-                #encrypted = encrypt("This is a secret message", PMK_Key)
-                #print("Encrypted ciphertext: ", encrypted.decode('utf-8'))
-                #connection.send(encrypted)
-
-                # Running c++ Adder_alice to get the public key
-                print ("Getting keys...\n")
-                print("Printing cloud key...\n")
+                    #Scalar / element send
+                    print('Scalar / element data send', scalar_complete)
+
+                    #Send Scalar / element ap data
+                    connection.sendall(scalar_element_BER)
+                    print()
+                    logger.info('Computing shared secret...\n')
+
+                    #Scalar / element BER encoded received and decoded
+                    scalar_element_ap_encoded = transfer.recv_pdu(connection)
+                    scalar_element_ap_decoded = asn1_file.decode('DataScalarElement', scalar_element_ap_encoded)
+                    scalar_element_ap = scalar_element_ap_decoded.get('data')
+
+                    print('scalar element received', scalar_element_ap)
+
+                    # scalar_element_ap = connection.recv(1024).decode()
+                    data = scalar_element_ap.split('\n')
+                    # print (data[0])
+                    # print (data[1])
+                    scalar_sta = data[0]
+                    element_sta = data[1]
+                    print()
+                    print ('Scalar_sta received:',scalar_sta)
+                    print()
+                    print ('Element_sta received:',element_sta)
+                    print ()
+                    print ()
+                    namedtuple_element_sta = eval(element_sta)
+                    print(namedtuple_element_sta.y, namedtuple_element_sta.x)
+                    print ()
+                    print ()
+                    ap_token = ap.compute_shared_secret(namedtuple_element_sta, int(scalar_sta), other_mac)
                 
+                    #Encode ap_token to be BER and send to peer
+                    apToken_encoded = asn1_file.encode('DataStaAp',{'data':ap_token})
+                    connection.send(apToken_encoded)
                 
-                cloud_key = "cloud.key"
-                nbit_key = "nbit.key"
+                    print("ap_token data being send over", ap_token)
+
+                    print()
+                    logger.info('Confirm Exchange...\n')
+
+                    #Received BER encoded STA token and decode it
+                    staToken_encoded = transfer.recv_pdu(connection)
+                    staToken_decoded = asn1_file.decode('DataStaAp', staToken_encoded)
+                    sta_token = staToken_decoded.get('data')
+
+                    print('received STA token', sta_token)
+
+                    PMK_Key = ap.confirm_exchange(sta_token)
+                    #print (PMK_Key)
+                    dragonfly_stop = time.perf_counter()
+                    #Writing time taken to generate PMK between keygen and cloud
+                    keyExchangeTimingCloud = open('time.txt', 'a')
+                    dragonfly_time_total = round((dragonfly_stop - dragonfly_start), 3)
+                    keyExchangeTimingCloud.write('\nTotal Time Taken to Generate Shared Secret Temporal Key for' + str(connection) + ': ')
+                    keyExchangeTimingCloud.write(str(dragonfly_time_total))
+                    keyExchangeTimingCloud.close()
+                    # First let us encrypt secret message
+                    #encrypted = encrypt("This is a secret message", PMK_Key)
+                    #print("Encrypted ciphertext: ", encrypted.decode('utf-8'))
+                    #connection.send(encrypted)
+
+                    # Running c++ Adder_alice to get the public key
+                    print ("Getting keys...\n")
+                    print("Printing cloud key...\n")
                 
-                encrypt_start = time.perf_counter()
                 
-                transitionDelay = open('delay.txt', 'a')
-                delay_time_total = round((encrypt_start - dragonfly_stop), 3)
-                transitionDelay.write('\nTransition Delay between shared session and encryption' + str(connection) + ': ')
-                transitionDelay.write(str(delay_time_total))
-                transitionDelay.close()                
-
-                # encrypt cloudkey
-                cloudkey = encrypting(PMK_Key, cloud_key)
-                print("This file ", cloudkey, " is encrypted cloud key\n")
+                    cloud_key = "cloud.key"
+                    nbit_key = "nbit.key"
                 
-                # encrypt nbitkey
-                nbitkey = encrypting(PMK_Key, nbit_key)
-                print("This file ", nbitkey, " is encrypted nbit key\n")
+                    transmit_start = time.perf_counter()
                 
-                #end of encryption
-                encrypt_stop = time.perf_counter()
+                    transitionDelay = open('delay.txt', 'a')
+                    delay_time_total = round((transmit_start - dragonfly_stop), 3)
+                    transitionDelay.write('\nTransition Delay between shared session and sending of keys' + str(connection) + ': ')
+                    transitionDelay.write(str(delay_time_total))
+                    transitionDelay.close()                
+
+                    # The key files were encrypted once, only the content key is
+                    # wrapped with this session's PMK
+                    cloudkey, nbitkey = encrypted
+                    print("This file ", cloudkey, " is encrypted cloud key\n")
+                    print("This file ", nbitkey, " is encrypted nbit key\n")
                 
-                # Open the cloudkey file and read its content
-                s = open(cloudkey, "rb")
-                keycontent = s.read(8192)
-
-                # Open the nbitkey file and read its content
-                t = open(nbitkey, "rb")
-                nbitkeycontent = t.read(8192)
-
-                # BER encoded data of cloud.key and nbit.key, encode first 8192 bits
-                encoded_keys = asn1_file.encode('DataKey', {'key': keycontent, 'nbit': nbitkeycontent})
+                    # Send the content key and the encrypted keys to the cloud
+                    # server, continuing each file from the checkpoint the cloud
+                    # reports
+                    keys.send(connection, PMK_Key, content_key, encrypted)
                 
-                # Send the file to the cloud server
-                while (keycontent and nbitkeycontent):
-                    connection.send(encoded_keys)
-                    keycontent = s.read(8192)
-                    nbitkeycontent = t.read(8192)
-                    encoded_keys = asn1_file.encode('DataKey', {'key': keycontent, 'nbit': nbitkeycontent})
-                s.close()
-                t.close()
+                    #end of sending encrypted keys to peer
+                    transmission_encrypt_stop = time.perf_counter()
                 
-                #end of sending encrypted keys to peer
-                transmission_encrypt_stop = time.perf_counter()
-                
-                #writing time taken to generate shared key between keygen and client
-                transmitEncryptTime = open('encryptTime.txt', 'a')
-                encrypt_time_total = round((encrypt_stop - encrypt_start), 3)
-                transmit_total = round((transmission_encrypt_stop - encrypt_stop), 3)
-                transmitEncryptTime.write('\nTotal Time Taken to encrypt keys' + str(connection) + ': ')
-                transmitEncryptTime.write(str(encrypt_time_total))
-                transmitEncryptTime.write('\nTotal Time taken to send encrypted key to' + str(connection) + ': ')
-                transmitEncryptTime.write(str(transmit_total))
-                transmitEncryptTime.write(str('\n========================================'))
-                transmitEncryptTime.close()
+                    #writing time taken to send the keys between keygen and cloud
+                    transmitEncryptTime = open('encryptTime.txt', 'a')
+                    transmit_total = round((transmission_encrypt_stop - transmit_start), 3)
+                    transmitEncryptTime.write('\nTotal Time taken to send encrypted key to' + str(connection) + ': ')
+                    transmitEncryptTime.write(str(transmit_total))
+                    transmitEncryptTime.write(str('\n========================================'))
+                    transmitEncryptTime.close()
             
 
-                print('Original cloud file size: ', os.path.getsize(cloud_key))
-                print ('Encrypted cloud file size: ', os.path.getsize(cloudkey))
-                os.system("md5sum cloud.key")
+                    print('Original cloud file size: ', os.path.getsize(cloud_key))
+                    print ('Encrypted cloud file size: ', os.path.getsize(cloudkey))
 
-                print('Original nbit key file size: ', os.path.getsize(nbit_key))
-                print('Encrypted nbit key file size: ', os.path.getsize(nbitkey))
-                os.system("md5sum nbit.key")
+                    print('Original nbit key file size: ', os.path.getsize(nbit_key))
+                    print('Encrypted nbit key file size: ', os.path.getsize(nbitkey))
                 
-                #(Transition delay)
-                delay_time = time.perf_counter()
+                    #(Transition delay)
+                    delay_time = time.perf_counter()
             
-                transitionDelay2 = open('delay.txt', 'a')
-                delay_time_total2 = round((delay_time - transmission_encrypt_stop), 3)
-                transitionDelay2.write('\nTransition Delay between sending of encrypted keys and end of thread code for' + str(connection) + ': ')
-                transitionDelay2.write(str(delay_time_total2))
-                transitionDelay2.close()
-                
+                    transitionDelay2 = open('delay.txt', 'a')
+                    delay_time_total2 = round((delay_time - transmission_encrypt_stop), 3)
+                    transitionDelay2.write('\nTransition Delay between sending of encrypted keys and end of thread code for' + str(connection) + ': ')
+                    transitionDelay2.write(str(delay_time_total2))
+                    transitionDelay2.close()
+
+                    # The cloud reports back once it has decrypted the keys
+                    transfer.recv_ready(connection, 'keys installed')
+                    print("Keys installed on", client_address)
+            except (ConnectionError, socket.timeout) as conn_error:
+                # The cloud connects again and resumes its keys
+                print('Connection to the cloud lost, waiting for it to resume', conn_error)
+                continue
             break
+    sock.close()
 
 
 
@@ -10,6 +10,7 @@ import os, random, struct
 import subprocess
 import sys
 import asn1tools
+import transport
 from collections import namedtuple
 from Cryptodome.Cipher import AES
 from Cryptodome import Random
@@ -21,7 +22,6 @@ import logging
 
 def dragonfly():
 
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     output_address = ("192.168.0.4", 4380)
     
 
@@ -40,9 +40,10 @@ def dragonfly():
     print ('executing dragonfly code for CLOUD machine')
     os.system('python3 dragonfly_public_keygen.py')
     
-    time.sleep(10)
+    # Both scripts return once their peers have reported the keys installed,
+    # tell the OUTPUT right away
     try:
-        sock.connect(output_address)
+        sock = transport.wait_connect(output_address)
         logging.info('Sending finished message')
         message = "finished"
         sock.sendall(message.encode())
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+# Frame retransmission test for transfer.py.
+#
+# Frames go from send_frames() to recv_frames() through a relay that flips a
+# byte in the payload of some of them. The receiver has to find them by their
+# checksum and NACK them, and the sender has to send those frames again and
+# nothing else, ending with the file and the running hash of both sides the
+# same as the source. Runs with pytest or as "python3 test_frames.py" from any
+# directory.
+import hashlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+import zlib
+
+# transfer.py reads declaration.asn from the working directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+import transfer
+
+FRAME_SIZE = 64 * 1024
+FRAMES = 16
+FILE_SIZE = FRAME_SIZE * FRAMES
+TIMEOUT = 30
+
+
+class Relay(threading.Thread):
+    # Copies src to dst, flipping the byte at each of the stream positions in
+    # corrupt as it goes by
+    def __init__(self, src, dst, corrupt=()):
+        threading.Thread.__init__(self, daemon=True)
+        self.src = src
+        self.dst = dst
+        self.corrupt = set(corrupt)
+        self.position = 0
+
+    def run(self):
+        try:
+            while True:
+                data = bytearray(self.src.recv(64 * 1024))
+                if not data:
+                    break
+                for position in self.corrupt:
+                    if self.position <= position < self.position + len(data):
+                        data[position - self.position] ^= 0xff
+                self.dst.sendall(data)
+                self.position += len(data)
+        except OSError:
+            pass
+        self.dst.close()
+
+
+def payload_position(seq):
+    # Frames go out in order on the first pass, each behind its header
+    return seq * (transfer.FRAME_HEADER.size + FRAME_SIZE) + transfer.FRAME_HEADER.size + 100
+
+
+def transfer_frames(corrupt):
+    """Send a random file with the frames in corrupt damaged on their first
+    pass. Returns the sequence numbers sent, in order."""
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, 'source.data')
+    target = os.path.join(directory, 'target.data')
+    with open(source, 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+
+    sender, sender_relay = socket.socketpair()
+    receiver_relay, receiver = socket.socketpair()
+    for sock in (sender, receiver):
+        sock.settimeout(TIMEOUT)
+    Relay(sender_relay, receiver_relay, [payload_position(seq) for seq in corrupt]).start()
+    Relay(receiver_relay, sender_relay).start()
+
+    sent = []
+    send_frame = transfer.send_frame
+
+    def recording(connection, f, seq, offset, length, checksum):
+        sent.append(seq)
+        send_frame(connection, f, seq, offset, length, checksum)
+
+    received = hashlib.sha256()
+    result = {}
+
+    def receive():
+        with open(target, 'w+b', buffering=0) as f:
+            transfer.recv_frames(receiver, f, 0, FILE_SIZE, received, FRAME_SIZE, zlib.crc32)
+        result['received'] = True
+
+    receiving = threading.Thread(target=receive)
+    receiving.start()
+    digest = hashlib.sha256()
+    transfer.send_frame = recording
+    try:
+        with open(source, 'rb', buffering=0) as f:
+            transfer.send_frames(sender, f, 0, FILE_SIZE, digest, FRAME_SIZE, transfer.WINDOW_SIZE, zlib.crc32)
+    finally:
+        transfer.send_frame = send_frame
+    receiving.join(TIMEOUT)
+    sender.close()
+    receiver.close()
+
+    assert result.get('received'), 'the receiver did not get the whole file'
+    with open(source, 'rb') as s, open(target, 'rb') as t:
+        expected = hashlib.sha256(s.read()).digest()
+        assert hashlib.sha256(t.read()).digest() == expected, 'file differs'
+    assert digest.digest() == expected and received.digest() == expected, 'running hash differs'
+    for name in (source, target):
+        os.remove(name)
+    os.rmdir(directory)
+    return sent
+
+
+def test_clean_link():
+    assert transfer_frames([]) == list(range(FRAMES))
+
+
+def test_corrupt_frame():
+    sent = transfer_frames([5])
+    # Every frame once, then only the corrupt one again
+    assert sent == list(range(FRAMES)) + [5], sent
+
+
+def test_corrupt_first_and_last():
+    sent = transfer_frames([0, FRAMES - 1])
+    assert sent[:FRAMES] == list(range(FRAMES))
+    assert sorted(sent[FRAMES:]) == [0, FRAMES - 1], sent
+
+
+if __name__ == '__main__':
+    test_clean_link()
+    test_corrupt_frame()
+    test_corrupt_first_and_last()
+    print('Frame test passed')
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+# BER framing test for transfer.py.
+#
+# recv_pdu() has to hand out exactly one PDU, however the bytes arrive: one
+# at a time, in pieces that end in the middle of the length, or with the next
+# PDU right behind in the same read. Lengths of one, two and three bytes in
+# long form are decoded, indefinite lengths are refused. Runs with pytest or
+# as "python3 test_pdu.py" from any directory.
+import os
+import socket
+import sys
+import threading
+import time
+
+# transfer.py reads declaration.asn from the working directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+import transfer
+
+asn1_file = transfer.asn1_file
+# Payload sizes with a short length, and long lengths of 1, 2 and 3 bytes
+SIZES = [16, 200, 300, 70000]
+
+
+def content(size):
+    return asn1_file.encode('DataContent', {'data': os.urandom(size)})
+
+
+def send_pieces(connection, data, piece):
+    # Separate writes with a pause in between, so they arrive as separate reads
+    for start in range(0, len(data), piece):
+        connection.sendall(data[start:start + piece])
+        time.sleep(0.001)
+
+
+def test_length_forms():
+    # First length byte of the outer SEQUENCE: short form, then long forms
+    # giving the number of length bytes that follow
+    for size, form in zip(SIZES, [None, 0x81, 0x82, 0x83]):
+        data = os.urandom(size)
+        pdu = asn1_file.encode('DataContent', {'data': data})
+        if form is None:
+            assert pdu[1] < 0x80
+        else:
+            assert pdu[1] == form
+        decoder = transfer.BerDecoder()
+        decoder.feed(pdu)
+        assert decoder.boundary() == (len(pdu), 0)
+        assert asn1_file.decode('DataContent', next(decoder.pdus()))['data'] == data
+
+
+def test_decoder_byte_by_byte():
+    for size in SIZES:
+        pdu = content(size)
+        decoder = transfer.BerDecoder()
+        for i in range(len(pdu) - 1):
+            decoder.feed(pdu[i:i + 1])
+            assert list(decoder.pdus()) == [], 'PDU handed out before its last byte'
+        decoder.feed(pdu[-1:])
+        assert list(decoder.pdus()) == [pdu]
+        assert decoder.buffer == bytearray()
+
+
+def test_decoder_several_pdus():
+    pdus = [content(size) for size in SIZES]
+    decoder = transfer.BerDecoder()
+    # One read with every PDU and the first bytes of another
+    decoder.feed(b''.join(pdus) + pdus[0][:3])
+    assert list(decoder.pdus()) == pdus
+    assert decoder.buffer == bytearray(pdus[0][:3])
+
+
+def test_indefinite_length():
+    decoder = transfer.BerDecoder()
+    decoder.feed(b'\x30\x80\x04\x01\x00\x00\x00')
+    try:
+        list(decoder.pdus())
+    except ValueError:
+        return
+    assert False, 'indefinite length accepted'
+
+
+def test_recv_pdu_split():
+    for size, piece in [(200, 1), (300, 2), (70000, 4096)]:
+        first = content(size)
+        header = asn1_file.encode('DataTransfer', {'fsize': 1 << 40, 'offset': 12345, 'raw': False, 'frame': 65536})
+        a, b = socket.socketpair()
+        with a, b:
+            # The first PDU in pieces, the next two right behind it
+            writer = threading.Thread(target=send_pieces, args=(a, first + header + first, piece))
+            writer.start()
+            assert transfer.recv_pdu(b) == first
+            assert asn1_file.decode('DataTransfer', transfer.recv_pdu(b))['offset'] == 12345
+            assert transfer.recv_pdu(b) == first
+            writer.join()
+            # Nothing was read beyond the last PDU
+            a.sendall(b'success')
+            assert transfer.recv_status(b) == 'success'
+
+
+if __name__ == '__main__':
+    test_length_forms()
+    test_decoder_byte_by_byte()
+    test_decoder_several_pdus()
+    test_indefinite_length()
+    test_recv_pdu_split()
+    print('PDU test passed')
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+# Resume test for transfer.py.
+#
+# A file is sent through a proxy that cuts the connection after CUT bytes.
+# The receiver keeps what it has in its .part file, the sender connects again
+# and the transfer has to continue from the receiver's checkpoint instead of
+# from zero, ending with the same SHA-256 as the source. Runs in framed and in
+# raw mode, and for a key file sent with keys.py, where the second session has
+# a new session key. Runs with pytest or as "python3 test_resume.py" from any
+# directory.
+import hashlib
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+
+# transfer.py reads declaration.asn from the working directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+import transfer
+import keys
+
+FILE_SIZE = 8 * 1024 * 1024
+CUT = 3 * 1024 * 1024
+TIMEOUT = 30
+
+
+class Proxy(threading.Thread):
+    # Forwards one connection to address, closing both ends once cut bytes
+    # went from the sender to the receiver (never, if cut is None)
+    def __init__(self, address, cut=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.address = address
+        self.cut = cut
+        self.forwarded = 0
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self.listener.getsockname()[1]
+
+    def run(self):
+        client, address = self.listener.accept()
+        server = socket.create_connection(self.address)
+        back = threading.Thread(target=self.pump, args=(server, client, False), daemon=True)
+        back.start()
+        self.pump(client, server, True)
+        back.join()
+        self.listener.close()
+
+    def pump(self, src, dst, forward):
+        try:
+            while True:
+                data = src.recv(64 * 1024)
+                if not data:
+                    break
+                if forward and self.cut is not None:
+                    data = data[:self.cut - self.forwarded]
+                dst.sendall(data)
+                if forward:
+                    self.forwarded += len(data)
+                    if self.cut is not None and self.forwarded >= self.cut:
+                        break
+        except OSError:
+            pass
+        # Cut the link both ways, as a dropped connection would
+        for sock in (src, dst):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+def attempt(listener, send, recv, cut):
+    """One transfer with send(connection) and recv(connection) through a
+    proxy that cuts after cut bytes. Returns the bytes that went through and
+    whether it completed."""
+    proxy = Proxy(listener.getsockname(), cut)
+    proxy.start()
+    result = {}
+
+    def receive():
+        connection, address = listener.accept()
+        connection.settimeout(TIMEOUT)
+        try:
+            recv(connection)
+            result['received'] = True
+        except (ConnectionError, socket.timeout):
+            result['received'] = False
+        connection.close()
+
+    receiver = threading.Thread(target=receive)
+    receiver.start()
+    connection = socket.create_connection(('127.0.0.1', proxy.port))
+    connection.settimeout(TIMEOUT)
+    try:
+        send(connection)
+    except (ConnectionError, socket.timeout):
+        pass
+    connection.close()
+    receiver.join(TIMEOUT)
+    proxy.join(TIMEOUT)
+    return proxy.forwarded, result.get('received', False)
+
+
+def setup(raw):
+    """Temporary directory with a random file of FILE_SIZE bytes in it."""
+    transfer.RAW_TRANSFER = raw
+    transfer.LOCAL_HANDOFF = False
+    transfer.AUTOTUNE = False
+    directory = tempfile.mkdtemp()
+    transfer.TIMINGS_FILE = os.path.join(directory, 'timings.txt')
+    with open(os.path.join(directory, 'source.data'), 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+    return directory
+
+
+def sha256(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def cut_and_resume(sessions, target, size):
+    """Run the first session through a proxy that cuts it, then the second
+    one to the end. sessions(n) gives send and recv for session n."""
+    listener = socket.create_server(('127.0.0.1', 0))
+    forwarded, completed = attempt(listener, *sessions(0), CUT)
+    assert not completed, 'the proxy did not cut the transfer'
+    offset, digest = transfer.checkpoint(target)
+    print('Cut after', forwarded, 'bytes, checkpoint at', offset)
+    assert 0 < offset < size, 'nothing kept for the checkpoint'
+
+    forwarded, completed = attempt(listener, *sessions(1), None)
+    print('Resumed with', forwarded, 'bytes')
+    assert completed, 'the resumed transfer did not complete'
+    # Only the rest of the file went through, plus headers, acks and trailer
+    assert forwarded < size - offset + 64 * 1024, 'the transfer started over'
+    assert not os.path.exists(target + '.part')
+    listener.close()
+
+
+def resume(raw):
+    directory = setup(raw)
+    source = os.path.join(directory, 'source.data')
+    target = os.path.join(directory, 'target.data')
+
+    def sessions(n):
+        return (lambda connection: transfer.send_file(connection, source),
+                lambda connection: transfer.recv_file(connection, target))
+
+    cut_and_resume(sessions, target, FILE_SIZE)
+    assert sha256(source) == sha256(target), 'digest mismatch'
+    shutil.rmtree(directory)
+
+
+def test_resume_framed():
+    resume(False)
+
+
+def test_resume_raw():
+    resume(True)
+
+
+def test_resume_key():
+    # Every session has its own session key (a new Dragonfly exchange), the
+    # encrypted key file stays the same bytes
+    directory = setup(False)
+    source = os.path.join(directory, 'source.data')
+    os.mkdir(os.path.join(directory, 'peer'))
+    target = os.path.join(directory, 'peer', 'source.data' + keys.SUFFIX)
+    content_key, encrypted = keys.prepare([source])
+    session_keys = [os.urandom(32), os.urandom(32)]
+    received = {}
+
+    def sessions(n):
+        def recv(connection):
+            received['key'] = keys.recv(connection, session_keys[n], [target])
+        return (lambda connection: keys.send(connection, session_keys[n], content_key, encrypted), recv)
+
+    cut_and_resume(sessions, target, os.path.getsize(encrypted[0]))
+    assert received['key'] == content_key, 'content key not unwrapped'
+    assert sha256(keys.decrypt(received['key'], target)) == sha256(source), 'key file differs'
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    test_resume_framed()
+    test_resume_raw()
+    test_resume_key()
+    print('Resume test passed')
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+# Reads the index of ciphertext containers, see container.h for the format.
+#
+# A container is mapped rather than read, only the header and the sections
+# asked for are touched, whatever the size of the file.
+import mmap
+import struct
+
+MAGIC = b'TFHC'
+VERSION = 1
+SECTIONS = 11
+
+# magic, version, count, reserved, size, then SECTIONS entries of kind,
+# number, offset and length
+HEADER = struct.Struct('<4sIIIQ')
+ENTRY = struct.Struct('<IIQQ')
+HEADER_SIZE = HEADER.size + SECTIONS * ENTRY.size
+
+SIGN = 1
+WIDTH = 2
+LIMB = 3
+CARRY = 4
+
+
+def index(data, start=0):
+    """Size of the container at start of data and its sections, a dict of
+    (kind, number) -> (offset, length) with offsets from start. Raises
+    ValueError if there is no container there."""
+    if len(data) < start + HEADER_SIZE:
+        raise ValueError('not a ciphertext container')
+    magic, version, count, reserved, size = HEADER.unpack_from(data, start)
+    if magic != MAGIC or version != VERSION or count > SECTIONS or len(data) < start + size:
+        raise ValueError('not a ciphertext container')
+    sections = {}
+    for s in range(count):
+        kind, number, offset, length = ENTRY.unpack_from(data, start + HEADER.size + s * ENTRY.size)
+        if offset + length > size:
+            raise ValueError('section beyond the end of the container')
+        sections[(kind, number)] = (offset, length)
+    return size, sections
+
+
+def sections(filename):
+    """Sections of the container in filename, see index()."""
+    with open(filename, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            raise ValueError('not a ciphertext container')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return index(data)[1]
+
+
+def limbs(filename):
+    """Number of limbs of the value in filename."""
+    return len([kind for kind, number in sections(filename) if kind == LIMB])
+
+
+def failed(filename):
+    # ./cloud leaves out the limbs of a result it could not compute (Answer
+    # Bit Size is too large)
+    return limbs(filename) == 0
+
+
+def section(filename, kind, number=0):
+    """Bytes of one section of the container in filename."""
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset, length = index(data)[1][(kind, number)]
+            return data[offset:offset + length]
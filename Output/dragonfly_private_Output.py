@@ -24,17 +24,16 @@ import base64
 import os
 import subprocess
 from collections import namedtuple
-from Cryptodome.Cipher import AES
 from Cryptodome import Random
 import asn1tools
 import sys
+import transfer
+import transport
+import keys
 
 #Compile asn1 file for secret_key
 asn1_file = asn1tools.compile_files('declaration.asn')
 
-#create tcp/ip socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
 #retrieve local hostname
 local_hostname = socket.gethostname()
 
@@ -46,17 +45,7 @@ ip_address = socket.gethostbyname(local_hostname)
 
 #bind socket to port
 server_address = ('192.168.0.3', 4380)
-
-while True:
-	try:
-		sock.connect(server_address)
-		break
-	except ConnectionRefusedError as conn_error:
-		print("Attempting to connect to server...")
-		time.sleep(5)
-	except:
-		# print("Unexpected error", sys.exc_info()[0])
-		continue
+sock = transport.wait_connect(server_address)
 
 print ("Connecting to %s (%s) with %s" % (local_hostname, local_fqdn, ip_address))
 
@@ -524,26 +513,6 @@ class Peer:
 		return digest
 
 
-def decrypting(key, filename):
-	chunksize = 64 * 1024
-	outputFile = filename.split('.hacklab')[0]
-	
-	with open(filename, 'rb') as infile:
-		filesize = int(infile.read(16))
-		IV = infile.read(16)
-		decryptor = AES.new(key, AES.MODE_CBC, IV)
-		
-		with open(outputFile, 'wb') as outfile:
-			while True:
-				chunk = infile.read(chunksize)
-				if len(chunk) == 0:
-					break
-				outfile.write(decryptor.decrypt(chunk))
-			outfile.truncate(filesize)
-
-	return outputFile
-
-
 def handshake():
 	#Own mac address
 	own_mac = (':'.join(re.findall('..', '%012x' % uuid.getnode())))
@@ -556,7 +525,7 @@ def handshake():
 	logger.info('Starting hunting and pecking to derive PE...\n')
 
 	sock.send(own_mac_BER)
-	raw_other_mac = sock.recv(1024)
+	raw_other_mac = transfer.recv_pdu(sock)
 
 	#decode BER and get mac address
 	other_decode_mac = asn1_file.decode('DataMac', raw_other_mac)
@@ -581,7 +550,7 @@ def handshake():
 
 
 	#receive BER encoded scalar / element ap
-	scalar_element_ap_BER = sock.recv(1024)
+	scalar_element_ap_BER = transfer.recv_pdu(sock)
 	scalar_element_ap_decoded = asn1_file.decode('DataScalarElement', scalar_element_ap_BER)
 	scalar_element_ap = scalar_element_ap_decoded.get('data')
 
@@ -616,7 +585,7 @@ def handshake():
 	logger.info('Confirm Exchange...\n')
 
 	#Receive BER encoded AP Token and decode it
-	apToken_encoded = sock.recv(1024)
+	apToken_encoded = transfer.recv_pdu(sock)
 	apToken_decoded = asn1_file.decode('DataStaAp', apToken_encoded)
 	ap_token = apToken_decoded.get('data')
 
@@ -632,39 +601,23 @@ def handshake():
 	#decrypted = decrypt(encrypted, PMK_Key)
 	#print (decrypted.decode())
 
-	# Open the received secret file from the key generator
-	with open('secret.key.hacklab', 'wb') as s, open('nbit.key.hacklab', 'wb') as t:
-		print ('File opened...\n')
-		while True:
-			# print ('Receiving data...\n')
-			keys_BER = sock.recv(16396, socket.MSG_WAITALL)
-			if (len(keys_BER) > 10):
-				keys_decoded = asn1_file.decode('DataKey', keys_BER)
-				secret_key = keys_decoded.get('key')
-				nbit_key = keys_decoded.get('nbit')
-				time.sleep(0.001)
-			else:
-				break
-			if not (secret_key or nbit_key):
-				break
-			s.write(secret_key)
-			t.write(nbit_key)
-
-		s.close()
-		t.close()
-		print ('Successfully got the file\n')
+	# Receive the encrypted keys from the key generator
+	# and the content key they are encrypted with, see keys.py
+	content_key = keys.recv(sock, PMK_Key, ['secret.key.hacklab', 'nbit.key.hacklab'])
+	print ('Successfully got the file\n')
 
 	print ('Encrypted secret file size: ', os.path.getsize('secret.key.hacklab'))
 	print ('Encrypted nbit file size: ', os.path.getsize('nbit.key.hacklab'))
 	print ('Decrypting the files...\n')
 
-	decrypted_secret_key = decrypting(PMK_Key, 'secret.key.hacklab')
+	decrypted_secret_key = keys.decrypt(content_key, 'secret.key.hacklab')
 	print('Acquired original secret key file size: ', os.path.getsize(decrypted_secret_key))
-	os.system("md5sum secret.key")
 
-	decrypted_nbit_key = decrypting(PMK_Key, 'nbit.key.hacklab')
+	decrypted_nbit_key = keys.decrypt(content_key, 'nbit.key.hacklab')
 	print('Acquired original nbit key file size: ', os.path.getsize(decrypted_nbit_key))
-	os.system("md5sum nbit.key")
+
+	# Let the key generator know the keys are in place
+	transfer.send_ready(sock, 'keys installed')
 	
 		
 def tests():
@@ -688,4 +641,13 @@ def tests():
 
 if __name__ == '__main__':
 	#tests()
-	handshake()
+	while True:
+		try:
+			handshake()
+			break
+		except (ConnectionError, socket.timeout) as conn_error:
+			# Connect again for a new session, the key files continue from
+			# what their .part files hold
+			print('Connection lost during transfer, resuming', conn_error)
+			sock.close()
+			sock = transport.wait_connect(server_address)
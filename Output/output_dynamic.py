@@ -18,6 +18,12 @@ from optparse import *
 import sys
 from ipaddress import ip_address, IPv6Address
 import select
+import threading
+import transfer
+import mux
+import handoff
+import transport
+import container
 
 # THE PURPOSE OF THIS FILE IS TO HANDLE USER INPUT AND REQUEST FOR DRAGONFLY KEY EXCHANGE TO BE COMPLETED
 
@@ -42,9 +48,11 @@ def dragonfly():
     # Request Keygen to initiate Dragonfly SAE
     print("Starting Dragonfly Key Exchange ")
 
-    # Wait
+    # Listen for the Keygen's finished message before the exchange starts,
+    # so it is taken as soon as the Keygen sends it
+    sock_message = transport.Listener(own_address_kg)
+
     print('Executing dragonfly code for Private key')
-    time.sleep(1)
 
     #Executing Dragonfly code for private key
     subprocess.run('./dragonfly_private_Output.py')
@@ -53,8 +61,6 @@ def dragonfly():
 
     print("Waiting for dragonfly to finish...")
 
-    sock_message.bind(own_address_kg)
-    sock_message.listen(1)
     connection, output_address = sock_message.accept()
     with connection:
         print ("Connecting from", output_address)
@@ -63,7 +69,7 @@ def dragonfly():
         print(message)
     if (message == "finished"):
         sock_message.close()
-        handshake("client1", "client2", "client3", "client4", "opcode1", "opcode2", "opcode3", "postfix",start)
+        handshake("postfix", start)
     else:
         None
 
@@ -643,7 +649,49 @@ def encrypting(key, filename):
 
     return outputFile
 
-def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POSTFIX, start):
+def verify(query, answer_data):
+    # ./verif reads answer.data and the last operation of the postfix
+    # expression from operator.txt
+    print('Answer to', queries[query]['expr'])
+    handoff.remove('answer.data')
+    os.replace(handoff.path(answer_data), handoff.path('answer.data'))
+    print('Answer data file size: ', os.path.getsize(handoff.path('answer.data')))
+
+    # If only negativity and bitsize exists in answer.data
+    if container.failed(handoff.path('answer.data')):
+        print('Computation failure: Answer Bit Size is too large')
+    else:
+        o = open(handoff.path("operator.txt"), "w")
+        o.write(queries[query]['operations'][-1])
+        o.close()
+        handoff.run('./verif')
+
+def recv_job_status(connection):
+    status = asn1_file.decode('DataJobStatus', transfer.recv_pdu(connection))
+    if status['state'] == 'queued':
+        print('Job', status['id'], 'queued behind', status['position'], 'other jobs')
+    elif status['state'] != 'busy':
+        print('Job', status['id'], status['state'])
+    return status
+
+class StatusThread(threading.Thread):
+    # Prints the state of the job as the CLOUD reports it, until the
+    # connection closes
+    def __init__(self, cloud_mux):
+        threading.Thread.__init__(self, daemon=True)
+        self.connection = cloud_mux.stream(mux.CONTROL)
+        self.state = None
+
+    def run(self):
+        try:
+            while True:
+                self.state = recv_job_status(self.connection)['state']
+        except (ConnectionError, socket.timeout, OSError):
+            pass
+        except:
+            print("An error occured", sys.exc_info()[0])
+
+def handshake(POSTFIX, start):
     #Own mac address
     own_mac = (':'.join(re.findall('..', '%012x' % uuid.getnode())))
 
@@ -658,15 +706,16 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
     
     own_ipaddr = "192.168.0.4"
     own_address = (own_ipaddr, 4381)
-    own_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    own_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    own_sock.bind(own_address)
-    own_sock.listen(1)
+    own_sock = transport.Listener(own_address, profile='bulk')
     connection, output_address = own_sock.accept()
     with connection:
+        # Handshake, query and answer share this connection as separate
+        # streams, the mux keeps its own descriptor open after this block
+        cloud_mux = mux.Mux(connection.dup())
+        connection = cloud_mux.stream(mux.CONTROL)
         dragonfly_start = time.perf_counter()
         print ("Connecting from", output_address)
-        raw_other_mac = connection.recv(1024)
+        raw_other_mac = transfer.recv_pdu(connection)
 
         #decode BER and get MAC address
         other_decode_mac = asn1_file.decode('DataMac', raw_other_mac)
@@ -697,7 +746,7 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
         logger.info('Computing shared secret...\n')
 
         #recevied BER encode scalar / element and decoded
-        scalar_element_ap_encoded= connection.recv(1024)
+        scalar_element_ap_encoded = transfer.recv_pdu(connection)
         scalar_element_ap_decoded = asn1_file.decode('DataScalarElement', scalar_element_ap_encoded)
         scalar_element_ap = scalar_element_ap_decoded.get('data')
 
@@ -726,7 +775,7 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
         logger.info('Confirm Exchange...\n')
 
         #Received BER encoded STA token and decode it
-        staToken_encoded = connection.recv(1024)
+        staToken_encoded = transfer.recv_pdu(connection)
         staToken_decoded = asn1_file.decode('DataStaAp', staToken_encoded)
         sta_token = staToken_decoded.get('data')
 
@@ -750,106 +799,46 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
         # Start measuring final section of user input processing time
         usr_input_final_start = time.perf_counter()
 
-        cl_ip = []
-        cl_op = []
-
-        ip_ber_dict = {}
-        op_ber_dict = {}
-        postfix_dict = {}
-
-        # Write client1_ipaddr to client1 file
-        c1 = open("client1", "w")
-        c1.write(client1_ipaddr)
-        c1.close()
-        output_client1 = encrypting(PMK_Key, CLIENT1)
-        c1 = open("client1.hacklab", "rb")
-        client1_ipaddr_read = c1.read()
-        cl_ip.append(client1_ipaddr_read)
-
-        # Write client2_ipaddr to client2 file
-        c2 = open("client2", "w")
-        c2.write(client2_ipaddr)
-        c2.close()
-        output_client2 = encrypting(PMK_Key, CLIENT2)
-        c2 = open("client2.hacklab", "rb")
-        client2_ipaddr_read = c2.read()
-        cl_ip.append(client2_ipaddr_read)
-
-        if 'client3_ipaddr' in globals():
-            # Write client3_ipaddr to client3 file
-            c3 = open("client3", "w")
-            c3.write(client3_ipaddr)
-            c3.close()
-            output_client3 = encrypting(PMK_Key, CLIENT3)
-            c3 = open("client3.hacklab", "rb")
-            client3_ipaddr_read = c3.read()
-            cl_ip.append(client3_ipaddr_read)
-        else:
-            None
-
-        if 'client4_ipaddr' in globals():
-            # Write client4_ipaddr to client3 file
-            c4 = open("client4", "w")
-            c4.write(client4_ipaddr)
-            c4.close()
-            output_client4 = encrypting(PMK_Key, CLIENT4)
-            c4 = open("client4.hacklab", "rb")
-            client4_ipaddr_read = c4.read()
-            cl_ip.append(client4_ipaddr_read)
-        else:
-            None
-
-        # Write OPERATION 1 to operation file
-        o1 = open("opcode1", "w")
-        o1.write(OPERATION1)
-        o1.close()
-        output_operator1 = encrypting(PMK_Key, OPCODE1)
-        o1 = open("opcode1.hacklab", "rb")
-        operator1_read = o1.read()
-        cl_op.append(operator1_read)
-        o = open("operator.txt", "w")
-        o.write(OPERATION1)
-        o.close()
-        
-        if 'OPERATION2' in globals():
-            # Write OPERATION 2 to operation file
-            o2 = open("opcode2", "w")
-            o2.write(OPERATION2)
-            o2.close()
-            output_operator2 = encrypting(PMK_Key, OPCODE2)
-            o2 = open("opcode2.hacklab", "rb")
-            operator2_read = o2.read()
-            cl_op.append(operator2_read)
-            o = open("operator.txt", "w")
-            o.write(OPERATION2)
-            o.close()
-        else:
-            None
-
-        if 'OPERATION3' in globals():
-            # Write OPERATION 3 to operation file
-            o3 = open("opcode3", "w")
-            o3.write(OPERATION3)
-            o3.close()
-            output_operator3 = encrypting(PMK_Key, OPCODE3)
-            o3 = open("opcode3.hacklab", "rb")
-            operator3_read = o3.read()
-            cl_op.append(operator3_read)
-            o = open("operator.txt", "w")
-            o.write(OPERATION3)
-            o.close()
-        else:
-            None
-
-        # Write postfix_expr to postfix file
-        p = open("postfix", "w")
-        p.write(postfix_expr)
-        p.close()
-        output_postfix = encrypting(PMK_Key, POSTFIX)
-        p = open("postfix.hacklab", "rb")
-        postfix_read = p.read()
-        postfix_dict['postfix'] = postfix_read
-        
+        # One plan per query of the batch
+        plans = []
+        for query in queries:
+            cl_ip = []
+            cl_op = []
+
+            # Write the address of every operand's client to client<i>, encrypt it
+            for i in range(len(query['clients'])):
+                client = "client{0}".format(i+1)
+                c = open(client, "w")
+                c.write(query['clients'][i])
+                c.close()
+                encrypting(PMK_Key, client)
+                c = open(client + ".hacklab", "rb")
+                cl_ip.append(c.read())
+                c.close()
+
+            # Write every operation code to opcode<j>, encrypt it
+            for j in range(len(query['operations'])):
+                opcode = "opcode{0}".format(j+1)
+                o = open(opcode, "w")
+                o.write(query['operations'][j])
+                o.close()
+                encrypting(PMK_Key, opcode)
+                o = open(opcode + ".hacklab", "rb")
+                cl_op.append(o.read())
+                o.close()
+
+            # Write postfix_expr to postfix file
+            p = open("postfix", "w")
+            p.write(query['postfix'])
+            p.close()
+            output_postfix = encrypting(PMK_Key, POSTFIX)
+            p = open("postfix.hacklab", "rb")
+            postfix_read = p.read()
+            p.close()
+
+            # One client and one operation code per entry, as many as the
+            # expression has
+            plans.append({'postfix':postfix_read,'operands':cl_ip,'operations':cl_op})
 
         usr_input_final_stop = time.perf_counter()
         usr_input_time_total = usr_input_final_stop - usr_input_final_start
@@ -864,33 +853,45 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
 
 
 
-        for i in range(len(cl_ip)):
-            ip_ber_dict["ipaddress{0}".format(i+1)] = cl_ip[i]
-        for i in range(len(cl_op)):
-            op_ber_dict["operation{0}".format(i+1)] = cl_op[i]
-        
-        input_encoded = asn1_file.encode('DataUserInput',{'ipaddress':ip_ber_dict,'operation':op_ber_dict,'postfix':postfix_dict})
+        # All queries go to the cloud under this one Dragonfly session
+        input_encoded = asn1_file.encode('DataBatch',{'queries':plans})
 
         print(input_encoded)
         print("LENGTH OF INPUT BER", len(input_encoded))
 
 #####
-        while True:
-            #Send user input data to cloud
-            connection.sendall(input_encoded)
-
-            #Receive msg
-            encoded_msg = connection.recv(1024)
-            msg = encoded_msg.decode()
-
-            #If success
-            if (msg == "success"):
-                #connection.shutdown(socket.SHUT_RDWR)
-                #connection.close()
+        rejected = False
+        try:
+            while True:
+                #Send user input data to cloud
+                connection.sendall(input_encoded)
+
+                #Receive msg
+                msg = transfer.recv_status(connection)
+
+                #If fails, resend
+                if (msg != "success"):
+                    continue
+
+                # The CLOUD queues the batch as a job, or is too busy to take
+                # it and asks for it again later. A plan it cannot compute is
+                # failed right away
+                status = recv_job_status(connection)
+                if status['state'] == 'busy':
+                    print("CLOUD is busy, sending the batch again in", status['retry'], "s")
+                    time.sleep(status['retry'])
+                    continue
+                rejected = status['state'] == 'failed'
                 break
-            #If fails, resend
-            else:
-                continue
+        except (ConnectionError, socket.timeout) as conn_error:
+            # The CLOUD closes the session after rejecting the batch
+            print('CLOUD closed the session', conn_error)
+            rejected = True
+        if rejected:
+            print('CLOUD rejected the batch, no answers will come')
+            cloud_mux.close()
+            os.system('python3 reset.py')
+            return
 #####
         print("Sending your input to CLOUD\n")
 
@@ -903,141 +904,39 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
     #own_sock.listen(1)
 
 #######
-    connection, output_address = own_sock.accept()
-    with connection:
-
     #Wait for CLOUD response#
-    #Answer data size
-        print("Waiting for CLOUD to return computed answer")
-        with open ("answer.data", "wb") as a:
-            print("answer.data file opened...\n")
-            
-            while True:
-                try:
-                    msg = connection.recv(1024)
-
-                    ans_size_decoded = asn1_file.decode('DataAnsSize', msg)
-                    ans_size = int(ans_size_decoded.get('data'))
-                    print("Answer.data size", ans_size)
-
-                    #Send success msg to cloud
-                    msg = "success"
-                    connection.send(msg.encode())
-
-                    #Break out of while loop
-                    break
-
-                except:
-
-                    #Print error msg
-                    print(sys.exc_info()[0])
-
-                    #Empty out error msg
-                    read_con = [connection]
-                    while True:
-                        r, w, e = select.select(read_con, [], [], 0.0)
-                        if len(r) == 0:
-                            break
-                        else:
-                            for data in r:
-                                data.recv(1024)
-
-                    #send fail msg to output
-                    msg = "fail"
-                    connection.send(msg.encode())
-
-                    #Testing phase
-                    # buffer_size_t = int(input("size of buffer?"))
-                    continue
-            # time.sleep(5)
-            gans_size = 0
-
-            buffer_size = 1040
-            # buffer_size = 50
-            while True:
-                try:
-                    while True:
-                        print ('Receiving data...\n')
-
-                        #BER receiving data & decode
-                        answer_data = connection.recv(buffer_size)
-
-                        #TESTING phase
-                        # buffer_size -= 10
-
-                        print("Received length data from server", len(answer_data))
-                        print(answer_data)
-                        answer_data_decoded_dict = asn1_file.decode('DataAnswer', answer_data)
-                        answer_data_decoded_raw = answer_data_decoded_dict.get('data')
-                        
-                        #Writing data
-                        a.write(answer_data_decoded_raw)
-
-                        #Send success message to cloud
-                        msg = "success"
-                        connection.send(msg.encode())
-
-                        #Break occur if all data is received
-                        print("gans size",gans_size)
-                        
-                        gans_size += len(answer_data_decoded_raw)
-                        if gans_size >= ans_size:
-                            print('Breaking from file write')
-                            break
-
-                except:
-                    #Print error message
-                    print("An error occured:", sys.exc_info()[0])
-
-                    #empty out data from socket
-                    read_con = [connection]
-                    while True:
-                        # own_sock.setblocking(0)
-                        r, w, e = select.select(read_con, [], [], 0.0)
-                        if len(r) == 0:
-                            break
-                        else:
-                            for data in r:
-                                data.recv(1024)
-
-                    #TESTING phase
-                    # buffer_size = int(input("size of buffer size?\n"))
-
-                    #Send fail message to cloud
-                    msg = "fail"
-                    connection.send(msg.encode())
-                    continue
-                
-                else:
-                    #Breaking out of while loop
-                    if gans_size >= ans_size:
-                        break
-                    # own_sock.shutdown(socket.SHUT_RDWR)
-                    # own_sock.close()
+    # Receive the computed answers on the answer stream, each behind the id
+    # of its query, in the order the CLOUD finishes them. If the link drops
+    # mid-transfer, accept the reconnect from the CLOUD and resume from what
+    # answer<id>.data.part holds
+    print("Waiting for CLOUD to return computed answers")
+    watcher = StatusThread(cloud_mux)
+    watcher.start()
+    received = set()
+    while len(received) < len(queries):
+        try:
+            answer_stream = cloud_mux.stream(mux.ANSWER)
+            query = asn1_file.decode('DataQueryId', transfer.recv_pdu(answer_stream)).get('id')
+            answer_data = 'answer{0}.data'.format(query)
+            transfer.recv_file(answer_stream, handoff.path(answer_data))
+        except (ConnectionError, socket.timeout) as conn_error:
+            # A failed job closes the connection without its answers
+            cloud_mux.close()
+            watcher.join()
+            if watcher.state == 'failed':
+                print('CLOUD could not compute the batch')
+                break
+            print('Connection lost during transfer, resuming', conn_error)
+            connection, output_address = own_sock.accept()
+            cloud_mux = mux.Mux(connection)
+            watcher = StatusThread(cloud_mux)
+            watcher.start()
+            continue
+        if query not in received:
+            received.add(query)
+            verify(query, answer_data)
+    cloud_mux.close()
 #####
-    print('Answer data file size: ', os.path.getsize('answer.data'))
-
-    os.system('md5sum answer.data')
-    
-    # If only negativity and bitsize exists in answer.data
-    if ((os.path.getsize('answer.data')) <= 162304):
-        print('Computation failure: Answer Bit Size is too large')
-    else:
-        secret_key = 'secret.key'
-        answer_data = 'answer.data'
-        subprocess.call('./verif')
-        #if(int(LASTOP) == 1):
-            #print("multiverif32")
-            #subprocess.call('./multi_verif32')
-        #elif(int(LASTOP) == 2):
-            #print("multiverif32")
-            #subprocess.call('./multi_verif32')
-        #elif(int(LASTOP) == 3):
-            #print("multiverif32")
-            #subprocess.call('./multi_verif32')
-        #elif(int(LASTOP) == 4):
-            #print("div_verif")
-            #subprocess.call('./Div_verif')
 
     stop = time.perf_counter()
     time_elapsed1 = round((stop - dragonfly_time), 3)
@@ -1045,6 +944,7 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
     print('Total time elapsed excluding Dragonfly Key Exchange:', time_elapsed1, 's')
     print('Total time elapsed for Dragonfly Key Exchange:', time_elapsed, 's')
     print('Total time elapsed including Dragonfly Key Exchange:', time_elapsed2, 's')
+    handoff.remove('answer.data', 'operator.txt')
     os.system('python3 reset.py')
 
 
@@ -1052,206 +952,69 @@ def handshake(CLIENT1, CLIENT2, CLIENT3, CLIENT4, OPCODE1, OPCODE2, OPCODE3, POS
 
 #############################################
 
-# Create TCP/IP Socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock_message = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+# Operation codes sent to the cloud for each operator
+OPERATION_CODES = {'+': "1", '-': "2", '*': "4", '/': "4"}
 
 #bind to own ip address for keygen message
 own_ipaddr = '192.168.0.4'
 own_address_kg = (own_ipaddr, 4380)
 
-print("Hello!")
-x = 1
-while (x != 0):
-    expr = input("Enter an expression using letters (A, B, C) for clients and symbols ( +, -, *) for operators. [E.g. A + B * C]: ")
-
-    usr_input_time = time.perf_counter()
+def read_query(expr, addresses):
+    # Postfix, clients and operation codes of one expression, None if it
+    # cannot be computed. addresses holds the client of every letter entered
+    # so far, each letter is asked for once
     infix = InfixConverter()
-    global postfix_expr
     postfix_expr = str(infix.toPostfix(expr))
     print('Postfix Expression: ',postfix_expr)
-    
+
     # varList is a list of letters filtered from the postfix_expression
     varList = re.findall("[a-zA-Z]", postfix_expr)
     varNum = len(varList)
 
-
     # opList is a list of operators (-,+,*,/) filtered from the postfix_expression
     opList = re.findall("[-,+,*,/]", postfix_expr)
     print(opList)
     opNum = len(opList)
-    
-    # Filter user expression here
-    if opList.count("+") == 1 and opList.count("*") == 1:
-        print("This addition and multiplication operation cannot be processed")
-        sys.exit()
-    elif opList.count("*") == 2:
-        print("This double multiplication operation cannot be processed")
-        sys.exit()
-   
-    global LASTOP
-
-
-    # Check for number of letters (clients)
+
+    # Check for number of letters (clients) and operators
     if (varNum < 2):
         print("Please enter at least 2 letters (A-Z) that represent clients, and 1 operator")
-        x = 1
-    elif (varNum == 2) and (opNum == 1):
-        while True:
-            client1_ipaddr = input("Enter the IPv4 Address for "+varList[0]+": ")
-            check = validateIP(client1_ipaddr)
-            HOSTUP = True if os.system("ping -c 2 " + client1_ipaddr + " >/dev/null 2>&1") == 0 else False
-            # HOSTUP = True if os.system("ping -c 2 " + client1_ipaddr.strip(";") + " | tee /proc/sys/vm/drop_caches >/dev/null 2>&1") == 0 else False
-            if check == "IPv4" and HOSTUP:
-            # if check == "IPv4":
-                break
-            else:
-                print("\nPlease enter a valid and working IPv4 Address")
-        while True:
-            client2_ipaddr = input("Enter the IPv4 Address for "+varList[1]+": ")
-            check = validateIP(client2_ipaddr)
-            HOSTUP = True if os.system("ping -c 2 " + client2_ipaddr + " >/dev/null 2>&1") == 0 else False
-            # HOSTUP = True if os.system("ping -c 2 " + client1_ipaddr.strip(";") + " | tee /proc/sys/vm/drop_caches >/dev/null 2>&1") == 0 else False
-            if check == "IPv4" and HOSTUP:
-                break
-            else:
-                print("Please enter a valid and working IPv4 Address")
-        OPERATION1 = opList[0]    
-        if (OPERATION1 == '+'):
-            OPERATION1 = "1"    
-        elif (OPERATION1 == '-'):
-            OPERATION1 = "2"
-        elif (OPERATION1 == '*'):
-            OPERATION1 = "4"
-        elif (OPERATION1 == '/'):
-            OPERATION1 = "4"
-        else:
-            None
-        LASTOP = OPERATION1
-        x = 0
-
-    elif (varNum == 3) and (opNum == 2):
-        while True:
-            client1_ipaddr = input("Enter the IPv4 Address for "+varList[0]+": ")
-            check = validateIP(client1_ipaddr)
-            if check == "IPv4":
-                break
-            else:
-                print("Please enter a valid IPv4 Address")
-        while True:
-            client2_ipaddr = input("Enter the IPv4 Address for "+varList[1]+": ")
-            check = validateIP(client2_ipaddr)
-            if check == "IPv4":
-                break
-            else:
-                print("Please enter a valid IPv4 Address")
-        while True:
-            client3_ipaddr = input("Enter the IPv4 Address for "+varList[2]+": ")
-            check = validateIP(client3_ipaddr)
-            if check == "IPv4":
-                break
-            else:
-                print("Please enter a valid IPv4 Address")
-        OPERATION1 = opList[0]
-        OPERATION2 = opList[1]
-        if (OPERATION1 == '+'):
-            OPERATION1 = "1"
-        elif (OPERATION1 == '-'):
-            OPERATION1 = "2"
-        elif (OPERATION1 == '*'):
-            OPERATION1 = "4"
-        elif (OPERATION1 == '/'):
-            OPERATION1 = "4"
-        else:
-            None
-        if (OPERATION2 == '+'):
-            OPERATION2 = "1"
-        elif (OPERATION2 == '-'):
-            OPERATION2 = "2"
-        elif (OPERATION2 == '*'):
-            OPERATION2 = "4"
-        elif (OPERATION2 == '/'):
-            OPERATION2 = "4"
-        else:
-            None
-        
-        LASTOP = OPERATION2
-        x = 0
-    elif (varNum == 4) and (opNum == 3):
-        while True:
-            client1_ipaddr = input("Enter the IPv4 Address for "+varList[0]+": ")
-            check = validateIP(client1_ipaddr)
-            if check == "IPv4":
-                break
-            else:
-                print("Please enter a valid IPv4 Address")
-        while True:
-            client2_ipaddr = input("Enter the IPv4 Address for "+varList[1]+": ")
-            check = validateIP(client2_ipaddr)
-            if check == "IPv4":
-                break
-            else:
-                print("Please enter a valid IPv4 Address")
-        while True:
-            client3_ipaddr = input("Enter the IPv4 Address for "+varList[2]+": ")
-            check = validateIP(client3_ipaddr)
-            if check == "IPv4":
-                break
-            else:
-                print("Please enter a valid IPv4 Address")
-        while True:
-            client4_ipaddr = input("Enter the IPv4 Address for "+varList[3]+": ")
-            check = validateIP(client4_ipaddr)
+        return None
+    elif (opNum != varNum - 1):
+        print("Please enter a proper expression")
+        return None
+
+    # One client per letter, in postfix order
+    for var in varList:
+        while var not in addresses:
+            client_ipaddr = input("Enter the IPv4 Address for "+var+": ")
+            check = validateIP(client_ipaddr)
             if check == "IPv4":
-                break
+                addresses[var] = client_ipaddr
             else:
                 print("Please enter a valid IPv4 Address")
-        OPERATION1 = opList[0]
-        OPERATION2 = opList[1]
-        OPERATION3 = opList[2]
-        if (OPERATION1 == '+'):
-            OPERATION1 = "1"
-        elif (OPERATION1 == '-'):
-            OPERATION1 = "2"
-        elif (OPERATION1 == '*'):
-            OPERATION1 = "4"
-        elif (OPERATION1 == '/'):
-            OPERATION1 = "4"
-        else:
-            None
-        if (OPERATION2 == '+'):
-            OPERATION2 = "1"
-        elif (OPERATION2 == '-'):
-            OPERATION2 = "2"
-        elif (OPERATION2 == '*'):
-            OPERATION2 = "4"
-        elif (OPERATION2 == '/'):
-            OPERATION2 = "4"
-        else:
-            None
-        if (OPERATION3 == '+'):
-            OPERATION3 = "1"
-        elif (OPERATION3 == '-'):
-            OPERATION3 = "2"
-        elif (OPERATION3 == '*'):
-            OPERATION3 = "4"
-        elif (OPERATION3 == '/'):
-            OPERATION3 = "4"
-        else:
-            None
+    return {'expr': expr.strip(), 'postfix': postfix_expr, 'clients': [addresses[var] for var in varList],
+            'operations': [OPERATION_CODES[op] for op in opList]}
 
-        LASTOP = OPERATION3
-        x = 0
-    elif (varNum > 4) or (opNum > 3):
-        print("Please do not enter more than 4 letters and 3 operators")
-        x = 1
-    else:
-        print("Please enter a proper expression")
-        x = 1
+print("Hello!")
+# Expressions of one batch, computed under one Dragonfly session
+queries = []
+while not queries:
+    line = input("Enter an expression using letters (A, B, C) for clients and symbols ( +, -, *) for operators. [E.g. A + B * C]. Separate several expressions with ';' to compute them as one batch: ")
+
+    usr_input_time = time.perf_counter()
+    addresses = {}
+    for expr in line.split(';'):
+        query = read_query(expr, addresses)
+        if query is None:
+            queries = []
+            break
+        queries.append(query)
 
     usr_input_time_stop = time.perf_counter()
-    global usr_input_time1
     usr_input_time1 = int(usr_input_time_stop - usr_input_time)
 
 
+# Keep answer.data and operator.txt on tmpfs for ./verif
+handoff.setup(['secret.key', 'nbit.key'])
 dragonfly()
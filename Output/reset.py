@@ -1,44 +1,11 @@
+import glob
 import os
-try:
-    os.remove("client1")
-except:
-    None
-try:
-    os.remove("client1.hacklab")
-except:
-    None
-try:
-    os.remove("client2")
-except:
-    None
-try:
-    os.remove("client2.hacklab")
-except:
-    None
-try:
-    os.remove("client3")
-except:
-    None
-try:
-    os.remove("client3.hacklab")
-except:
-    None
-try:
-    os.remove("opcode1")
-except:
-    None
-try:
-    os.remove("opcode1.hacklab")
-except:
-    None
-try:
-    os.remove("opcode2")
-except:
-    None
-try:
-    os.remove("opcode2.hacklab")
-except:
-    None
+# One client<i> and opcode<j> file for every operand and operation
+for name in glob.glob("client[0-9]*") + glob.glob("opcode[0-9]*"):
+    try:
+        os.remove(name)
+    except:
+        None
 try:
     os.remove("postfix")
 except:
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# Connections between nodes, over TCP or, when both ends are on the same
+# host, over a Unix domain socket.
+#
+# Every listener binds its TCP address as before and also a Unix domain
+# socket named after that address. connect() to an address that belongs to
+# this host uses the Unix domain socket when it exists, and TCP otherwise, so
+# a node does not need to know whether its peer runs on the same machine.
+# The sockets live in a directory only this user can enter (uds_dir()), nodes
+# run by another user are reached over TCP.
+#
+# Bulk files between co-located nodes do not go through the socket at all:
+# transfer.py sends the path of the file and the receiver copies it from the
+# page cache (see transfer.copy_local).
+#
+# Socket options come from one place, PROFILES, and are set on every socket
+# connect() and Listener hand out. "control" is for the Dragonfly exchanges
+# and the small request/ack messages, "bulk" for links that carry ciphertexts.
+# "plain" leaves the system defaults and is only there for bench_transport.py.
+import os
+import select
+import socket
+import stat
+import time
+
+USE_UDS = True
+# Directory of the Unix domain sockets, by default ie-ache-<uid> under
+# $XDG_RUNTIME_DIR or /tmp
+UDS_DIR = None
+
+# nodelay:          disable Nagle, the acks and BER headers are tiny writes
+# sndbuf, rcvbuf:   socket buffer sizes in bytes, 0 keeps the system default
+# keepalive:        seconds idle before the first keepalive probe, 0 is off
+# connect_timeout:  seconds to wait for connect(), None waits forever
+# timeout:          seconds a read or write may block once connected, None
+#                   waits forever (the Output waits out the whole computation)
+PROFILES = {
+    'control': {'nodelay': True, 'sndbuf': 0, 'rcvbuf': 0, 'keepalive': 30,
+                'connect_timeout': 10, 'timeout': None},
+    'bulk': {'nodelay': True, 'sndbuf': 4 * 1024 * 1024, 'rcvbuf': 4 * 1024 * 1024,
+             'keepalive': 30, 'connect_timeout': 10, 'timeout': None},
+    'plain': {'nodelay': False, 'sndbuf': 0, 'rcvbuf': 0, 'keepalive': 0,
+              'connect_timeout': None, 'timeout': None},
+}
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+
+# wait_connect(): first and longest pause (seconds) between connection attempts
+RETRY_MIN = 0.05
+RETRY_MAX = 1.0
+
+# Host addresses already checked: host -> whether it is one of ours
+local_hosts = {}
+
+
+def uds_dir():
+    """This user's socket directory, created with mode 0700. None when it is
+    not private (another user made it first), the sockets are not used
+    then."""
+    path = UDS_DIR or os.path.join(os.environ.get('XDG_RUNTIME_DIR') or '/tmp', 'ie-ache-%d' % os.getuid())
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        print('Not using', path, 'for sockets, it is not private to this user')
+        return None
+    return path
+
+
+def uds_path(address):
+    """Unix domain socket of address, None if there is no private directory
+    for it."""
+    directory = uds_dir()
+    if directory is None:
+        return None
+    return os.path.join(directory, '%s-%d.sock' % address)
+
+
+def is_local_host(host):
+    """Whether host is an address of this machine."""
+    if host not in local_hosts:
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            # Only addresses assigned to this host can be bound
+            probe.bind((host, 0))
+            local_hosts[host] = True
+        except OSError:
+            local_hosts[host] = False
+        finally:
+            probe.close()
+    return local_hosts[host]
+
+
+def is_local(connection):
+    """Whether the peer of connection runs on this host."""
+    if connection.family == socket.AF_UNIX:
+        return True
+    return is_local_host(connection.getpeername()[0])
+
+
+def set_buffers(sock, profile):
+    # Before connect()/listen(), so the TCP window scale covers them
+    options = PROFILES[profile]
+    if options['sndbuf']:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, options['sndbuf'])
+    if options['rcvbuf']:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, options['rcvbuf'])
+
+
+def configure(sock, profile):
+    """Apply the options of profile to a connected socket."""
+    options = PROFILES[profile]
+    set_buffers(sock, profile)
+    if sock.family != socket.AF_UNIX:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(options['nodelay']))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(bool(options['keepalive'])))
+        if options['keepalive'] and hasattr(socket, 'TCP_KEEPIDLE'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, options['keepalive'])
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+    sock.settimeout(options['timeout'])
+    return sock
+
+
+def connect(address, profile='control'):
+    """Connected socket to address, set up for profile. Raises
+    ConnectionRefusedError like socket.connect() when nothing is listening,
+    socket.timeout when the host does not answer within connect_timeout."""
+    path = uds_path(address) if USE_UDS else None
+    if path is not None and is_local_host(address[0]) and os.path.exists(path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            return configure(sock, profile)
+        except (ConnectionRefusedError, FileNotFoundError, PermissionError):
+            # Stale socket file, the listener is gone or only on TCP
+            sock.close()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    set_buffers(sock, profile)
+    sock.settimeout(PROFILES[profile]['connect_timeout'])
+    try:
+        sock.connect(address)
+    except:
+        sock.close()
+        raise
+    return configure(sock, profile)
+
+
+def wait_connect(address, profile='control'):
+    """Connect to address as soon as something listens there. Attempts are
+    retried after a pause that starts at RETRY_MIN and doubles up to
+    RETRY_MAX, so a peer that comes up is reached within RETRY_MAX seconds."""
+    delay = RETRY_MIN
+    waiting = False
+    while True:
+        try:
+            return connect(address, profile)
+        except (ConnectionError, socket.timeout) as conn_error:
+            if not waiting:
+                print('Waiting for %s port %s to listen:' % address, conn_error)
+                waiting = True
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX)
+
+
+class Listener:
+    """Accepts connections to address over TCP and over its Unix domain
+    socket. Listeners that tell peers apart by IP address pass uds=False,
+    a peer on the Unix domain socket has none."""
+
+    def __init__(self, address, backlog=5, uds=True, profile='control'):
+        self.address = address
+        self.profile = profile
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        set_buffers(self.sock, profile)
+        self.sock.bind(address)
+        self.sock.listen(backlog)
+        self.listeners = [self.sock]
+
+        self.uds = None
+        self.uds_path = uds_path(address) if USE_UDS and uds else None
+        if self.uds_path is not None:
+            if os.path.lexists(self.uds_path):
+                os.remove(self.uds_path)
+            self.uds = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            set_buffers(self.uds, profile)
+            self.uds.bind(self.uds_path)
+            self.uds.listen(backlog)
+            self.listeners.append(self.uds)
+
+    def accept(self):
+        r, w, e = select.select(self.listeners, [], [])
+        if self.uds in r:
+            connection, address = self.uds.accept()
+            # Report a local peer the way a TCP connection from this host to
+            # our own address would show up
+            return configure(connection, self.profile), (self.address[0], 0)
+        connection, address = self.sock.accept()
+        return configure(connection, self.profile), address
+
+    def close(self):
+        self.sock.close()
+        if self.uds is not None:
+            self.uds.close()
+            try:
+                os.remove(self.uds_path)
+            except FileNotFoundError:
+                pass
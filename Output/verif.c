@@ -1,5 +1,6 @@
 #include <tfhe/tfhe.h>
 #include <tfhe/tfhe_io.h>
+#include "container.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <bitset>
@@ -42,13 +43,14 @@ int main() {
     LweSample* negative = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
     LweSample* bit = new_gate_bootstrapping_ciphertext_array(32, nbitparams);
     
+    // answer.data is a container, the limbs are read once the bit size says
+    // how many there are
     FILE* answer_data = fopen("answer.data","rb");
-    for (int i=0; i<32; i++) 
-        import_gate_bootstrapping_ciphertext_fromFile(answer_data, &negative[i], nbitparams);
-    
-
-    for (int i=0; i<32; i++) 
-        import_gate_bootstrapping_ciphertext_fromFile(answer_data, &bit[i], nbitparams);
+    Container answer;
+    if (container_open(&answer, answer_data) != 0)
+        return 1;
+    container_read(&answer, SECTION_SIGN, 0, negative, 32, nbitparams);
+    container_read(&answer, SECTION_WIDTH, 0, bit, 32, nbitparams);
 
     
     //decrypt and rebuild the answer
@@ -83,8 +85,7 @@ int main() {
     	if (int_bit == 32){
     	    LweSample* result = new_gate_bootstrapping_ciphertext_array(32, params);
 	
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    	fclose(answer_data);
 	  
 	   		// decrypt and rebuild the answer
@@ -201,11 +202,9 @@ int main() {
 	    
 	    	// export the 64 ciphertexts to a file (for the cloud)
 	  
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, result2, 32, params);
 	
 	    	fclose(answer_data);
 	    
@@ -334,17 +333,13 @@ int main() {
 	   
 	   		// export the 64 ciphertexts to a file (for the cloud)
 	   
-	   		for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	   		container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, result2, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result3[i], params);
+			container_read(&answer, SECTION_LIMB, 2, result3, 32, params);
 
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result4[i], params);
+			container_read(&answer, SECTION_LIMB, 3, result4, 32, params);
 
 	    	fclose(answer_data);
 	    
@@ -493,29 +488,21 @@ int main() {
 	  
 	    	// export the 64 ciphertexts to a file (for the cloud)
 	
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, result2, 32, params);
 
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result3[i], params);
+			container_read(&answer, SECTION_LIMB, 2, result3, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result4[i], params);
+			container_read(&answer, SECTION_LIMB, 3, result4, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result5[i], params);
+			container_read(&answer, SECTION_LIMB, 4, result5, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result6[i], params);
+			container_read(&answer, SECTION_LIMB, 5, result6, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result7[i], params);
+			container_read(&answer, SECTION_LIMB, 6, result7, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result8[i], params);
+			container_read(&answer, SECTION_LIMB, 7, result8, 32, params);
 	    	fclose(answer_data);
 
 	    	// decrypt and rebuild the answer
@@ -698,8 +685,7 @@ int main() {
     	
     	if (int_bit == 32){
     	    LweSample* result = new_gate_bootstrapping_ciphertext_array(32, params);
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    	fclose(answer_data);
 
 	    	// decrypt and rebuild the answer
@@ -811,11 +797,9 @@ int main() {
 
 	    	// export the 64 ciphertexts to a file (for the cloud)
 	
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, result2, 32, params);
 	
 	    	fclose(answer_data);
 
@@ -941,17 +925,13 @@ int main() {
 
 	    	// export the 64 ciphertexts to a file (for the cloud)
 	   
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, result2, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result3[i], params);
+			container_read(&answer, SECTION_LIMB, 2, result3, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result4[i], params);
+			container_read(&answer, SECTION_LIMB, 3, result4, 32, params);
 	
 	    	fclose(answer_data);
 	
@@ -1100,29 +1080,21 @@ int main() {
 
 	    	// export the 64 ciphertexts to a file (for the cloud)
 	   
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, result, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, result2, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result3[i], params);
+			container_read(&answer, SECTION_LIMB, 2, result3, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result4[i], params);
+			container_read(&answer, SECTION_LIMB, 3, result4, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result5[i], params);
+			container_read(&answer, SECTION_LIMB, 4, result5, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result6[i], params);
+			container_read(&answer, SECTION_LIMB, 5, result6, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result7[i], params);
+			container_read(&answer, SECTION_LIMB, 6, result7, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &result8[i], params);
+			container_read(&answer, SECTION_LIMB, 7, result8, 32, params);
 	    	fclose(answer_data);
 
 	    	// decrypt and rebuild the answer
@@ -1309,29 +1281,21 @@ int main() {
 	    
 	    	//export the 32 ciphertexts to a file (for the cloud)
 	    
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult1[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, finalresult1, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, finalresult2, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult3[i], params);
+			container_read(&answer, SECTION_LIMB, 2, finalresult3, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult4[i], params);
+			container_read(&answer, SECTION_LIMB, 3, finalresult4, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult5[i], params);
+			container_read(&answer, SECTION_LIMB, 4, finalresult5, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult6[i], params);
+			container_read(&answer, SECTION_LIMB, 5, finalresult6, 32, params);
 	    
-			for (int i=0; i<32; i++)	
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult7[i], params);
+			container_read(&answer, SECTION_LIMB, 6, finalresult7, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult8[i], params);
+			container_read(&answer, SECTION_LIMB, 7, finalresult8, 32, params);
 	    	fclose(answer_data);
 	       
 	    	//decrypt and rebuild the answer
@@ -1466,17 +1430,13 @@ int main() {
 	    
 	   		//export the 32 ciphertexts to a file (for the cloud)
 	   
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, finalresult, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, finalresult2, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult3[i], params);
+			container_read(&answer, SECTION_LIMB, 2, finalresult3, 32, params);
 	
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult4[i], params);
+			container_read(&answer, SECTION_LIMB, 3, finalresult4, 32, params);
 	
 	    	fclose(answer_data);
 
@@ -1573,11 +1533,9 @@ int main() {
 	    
 	    	//export the 32 ciphertexts to a file (for the cloud)
 	  
-	    	for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult[i], params);
+	    	container_read(&answer, SECTION_LIMB, 0, finalresult, 32, params);
 	    
-			for (int i=0; i<32; i++)
-			import_gate_bootstrapping_ciphertext_fromFile(answer_data, &finalresult2[i], params);
+			container_read(&answer, SECTION_LIMB, 1, finalresult2, 32, params);
 	
 	    	fclose(answer_data);
 	       
@@ -4,6 +4,19 @@ import os
 import sys
 import glob
 
+
+def compile_files(files):
+    for filename in files:
+        print(f"\nCompiling {filename}")
+        filestriped = filename[:-2]
+        # files are "<dir>/<name>.c". cloud.c runs each operation on two
+        # OpenMP threads, which worker.py counts on when sizing its workers
+        if os.path.basename(filename) == "cloud.c":
+            os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma -fopenmp")
+        else:
+            os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma")
+
+
 qn = str(input("Is BOOST Library installed? (yes/no) ")).lower()
 if qn == "no":
     opsystem  = str(input("Are you on Linux or macOS? (linux/macos) ")).lower()
@@ -15,14 +28,7 @@ if qn == "no":
             print("No c files found!")
             sys.exit()
 
-            for filename in files:
-                if filename == "cloud.c":
-                    filestriped = filename[:-2]
-                    os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma -fopenmp")
-                filestriped = filename[:-2]
-                os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma")
-
-                print(f"\nCompiling {filename}")
+        compile_files(files)
 
         os.system("chmod u+x */*")
         print(f"\n{len(files)} files compiled. Please check for errors in compliation.")
@@ -35,14 +41,7 @@ if qn == "no":
             print("No c files found!")
             sys.exit()
 
-        for filename in files:
-            if filename == "cloud.c":
-                filestriped = filename[:-2]
-                os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma -fopenmp")
-            filestriped = filename[:-2]
-            os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma")
-
-            print(f"\nCompiling {filename}")
+        compile_files(files)
 
         os.system("chmod u+x */*")
         print(f"\n{len(files)} files compiled. Please check for errors in compliation.")
@@ -57,14 +56,7 @@ elif qn == "yes":
         print("No c files found!")
         sys.exit()
 
-    for filename in files:
-        if filename == "cloud.c":
-            filestriped = filename[:-2]
-            os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma -fopenmp")
-        filestriped = filename[:-2]
-        os.system(f"g++ {filename} -o {filestriped} -ltfhe-spqlios-fma")
-
-        print(f"\nCompiling {filename}")
+    compile_files(files)
 
 
     os.system("chmod u+x */*")